@@ -1,2 +1,3 @@
 
-from .camera import OpenCVCamera, CameraDeviceNotification
+from .camera import CameraDevice, OpenCVCamera, DebugCameraDevice, CameraDeviceNotification, CaptureStatistics
+from .recording import FrameRecorder
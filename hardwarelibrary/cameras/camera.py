@@ -1,9 +1,12 @@
 import time
 from abc import abstractmethod
 from enum import Enum
-from hardwarelibrary.physicaldevice import PhysicalDevice
+from hardwarelibrary.physicaldevice import PhysicalDevice, debugClassIdVendor
 from notificationcenter import NotificationCenter, Notification
-from threading import Thread, RLock
+from hardwarelibrary.notificationdispatch import postIfObserved
+from hardwarelibrary.ringbuffer import RingBuffer, OverflowPolicy
+from threading import Thread, Lock, RLock
+from typing import NamedTuple
 import re
 
 class CameraDeviceNotification(Enum):
@@ -12,28 +15,65 @@ class CameraDeviceNotification(Enum):
     willStopCapture     = "willStopCapture"
     didStopCapture      = "didStopCapture"
     imageCaptured       = "imageCaptured"
+    imageProcessed      = "imageProcessed"
+
+class CaptureStatistics(NamedTuple):
+    captured: int = 0   # frames written in the frame buffer
+    delivered: int = 0  # frames returned by nextFrame() or latestFrame()
+    dropped: int = 0    # frames overwritten or skipped before being delivered
+    queued: int = 0     # frames captured and not delivered yet
 
 class CameraDevice(PhysicalDevice):
+    """ A camera. start() captures frames on a thread, directly into a
+    RingBuffer of `bufferCapacity` preallocated frames (sized from the first
+    frame). nextFrame() and latestFrame() return a Frame (index, timestamp,
+    data), whose data is a view on the buffer, valid until the next call or
+    releaseFrame(): copy it to keep it. When the consumer falls behind,
+    OverflowPolicy.dropOldest (the default) overwrites the oldest frames and
+    counts them as dropped; OverflowPolicy.block pauses the capture.
+
+    CameraDeviceNotification.imageCaptured is still posted with each frame, as
+    a copy, when someone observes it. A slow observer slows down the capture:
+    use a ThrottledObserver or the frame buffer instead.
+
+    startRecording() attaches a FrameRecorder: the capture thread copies each
+    frame in it, and the recorder writes them to disk on its own thread.
+    """
     def __init__(self, serialNumber:str = None, idProduct:int = None, idVendor:int = None):
         super().__init__(serialNumber, idProduct, idVendor)
         self.version = ""
         self.quitLoop = False
         self.lock = RLock()
         self.mainLoop = None
+        self.bufferCapacity = 3
+        self.overflowPolicy = OverflowPolicy.dropOldest
+        self.frameBuffer = None
+        self.frameBufferLock = Lock()   # publishing and closing the frame buffer
+        self.recorder = None
+        self.recorderLock = Lock()      # never self.lock: see recordFrame()
+        self.processor = None
 
     def doInitializeDevice(self):
         pass # nothing to do, but incuded by symmetry with doShutdown
 
     def doShutdownDevice(self):
-        with self.lock:
-            if self.isCapturing:
-                self.stop()
+        # Not under self.lock: stop() waits for the capture thread
+        if self.isCapturing:
+            self.stop()
 
     # Hardware hook a driver must implement to return one frame.
     @abstractmethod
     def doCaptureFrame(self):
         ...
 
+    # Hardware hook to capture one frame into a preallocated array of the
+    # shape and dtype of the frames. Drivers that can read into a buffer
+    # override it to avoid the copy.
+    def doCaptureFrameInto(self, frame):
+        import numpy as np
+
+        np.copyto(frame, self.doCaptureFrame(), casting='unsafe')
+
     def livePreview(self):
         NotificationCenter().post_notification(notification_name=CameraDeviceNotification.willStartCapture,
                                               notifying_object=self)
@@ -43,7 +83,8 @@ class CameraDevice(PhysicalDevice):
         with self.lock:
             if not self.isCapturing:
                 self.quitLoop = False
-                self.mainLoop = Thread(target=self.captureLoop, name="Camera-CaptureLoop")
+                self.frameBuffer = None
+                self.mainLoop = Thread(target=self.captureLoopThread, name="Camera-CaptureLoop")
                 NotificationCenter().post_notification(notification_name=CameraDeviceNotification.willStartCapture, notifying_object=self)
                 self.mainLoop.start()
             else:
@@ -55,9 +96,13 @@ class CameraDevice(PhysicalDevice):
 
     def stop(self):
         if self.isCapturing:
+            self.stopProcessing()
             NotificationCenter().post_notification(CameraDeviceNotification.willStopCapture, notifying_object=self)
-            with self.lock:
+            # Not self.lock: the caller may hold it while we wait for the thread
+            with self.frameBufferLock:
                 self.quitLoop = True
+                if self.frameBuffer is not None:
+                    self.frameBuffer.close()
             self.mainLoop.join()
             self.mainLoop = None
             NotificationCenter().post_notification(CameraDeviceNotification.didStopCapture, notifying_object=self)
@@ -72,7 +117,7 @@ class CameraDevice(PhysicalDevice):
                                               notifying_object=self)
         while (True):
             frame = self.doCaptureFrame()
-            NotificationCenter().post_notification(CameraDeviceNotification.imageCaptured, self, frame)
+            postIfObserved(CameraDeviceNotification.imageCaptured, self, frame)
 
             cv2.imshow('Preview (Q to quit)', frame)
             if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -83,21 +128,156 @@ class CameraDevice(PhysicalDevice):
         NotificationCenter().post_notification(CameraDeviceNotification.didStopCapture, notifying_object=self)
 
     def captureFrames(self, n=1):
-        frames = []
-        for i in range(n):
-            frames.append(self.doCaptureFrame())
+        """ n consecutive frames in one contiguous array of shape (n, h, w, c).
+        While capturing, they are taken from the frame buffer. """
+        import numpy as np
+
+        if self.isCapturing:
+            frames = None
+            for i in range(n):
+                frame = self.nextFrame()
+                if frame is None:
+                    raise RuntimeError("Capture stopped after {0} frames".format(i))
+                if frames is None:
+                    frames = np.empty((n, *frame.data.shape), dtype=frame.data.dtype)
+                np.copyto(frames[i], frame.data)
+            self.releaseFrame()
+            return frames
+
+        first = np.asarray(self.doCaptureFrame())
+        frames = np.empty((n, *first.shape), dtype=first.dtype)
+        frames[0] = first
+        for i in range(1, n):
+            self.doCaptureFrameInto(frames[i])
         return frames
 
+    def nextFrame(self, timeout=None):
+        """ The next frame captured, in order, or None when the capture stops
+        or timeout elapses. The previous frame is released. """
+        frameBuffer = self.waitForFrameBuffer(timeout)
+        if frameBuffer is None:
+            return None
+        return frameBuffer.get(timeout)
+
+    def latestFrame(self, timeout=None):
+        """ The most recent frame, skipping older ones (counted as dropped). """
+        frameBuffer = self.waitForFrameBuffer(timeout)
+        if frameBuffer is None:
+            return None
+        return frameBuffer.latest(timeout)
+
+    def releaseFrame(self):
+        """ Give the frame last returned back to the capture thread. """
+        if self.frameBuffer is not None:
+            self.frameBuffer.release()
+
+    def frames(self):
+        """ Every frame, in order, until the capture stops. """
+        while True:
+            frame = self.nextFrame()
+            if frame is None:
+                return
+            yield frame
+
+    def startRecording(self, path=None, recorder=None, **kwargs):
+        """ Record every frame captured from now on, with a FrameRecorder on
+        path (keyword arguments go to it) or the ArrayRecorder given. """
+        if recorder is None:
+            from hardwarelibrary.cameras.recording import FrameRecorder
+            recorder = FrameRecorder(path, camera=self, **kwargs)
+        with self.recorderLock:
+            if self.recorder is not None:
+                raise RuntimeError("Already recording")
+            self.recorder = recorder
+        return recorder
+
+    def stopRecording(self):
+        """ Detach the recorder and close it once everything is written. """
+        with self.recorderLock:
+            recorder = self.recorder
+            self.recorder = None
+        if recorder is not None:
+            recorder.close()
+        return recorder
+
+    def startProcessing(self, stages, workers=0, **kwargs):
+        """ Process every frame captured with a FramePipeline of the stages
+        given, on a FrameProcessor thread (keyword arguments go to it). The
+        processed frames are read from the processor, or observed with
+        CameraDeviceNotification.imageProcessed. """
+        from hardwarelibrary.cameras.processing import FramePipeline, FrameProcessor
+
+        if self.processor is not None:
+            raise RuntimeError("Already processing")
+        self.processor = FrameProcessor(self, FramePipeline(stages, workers=workers), **kwargs)
+        self.processor.start()
+        return self.processor
+
+    def stopProcessing(self):
+        processor = self.processor
+        self.processor = None
+        if processor is not None:
+            processor.stop()
+        return processor
+
+    def captureStatistics(self):
+        if self.frameBuffer is None:
+            return CaptureStatistics()
+        statistics = self.frameBuffer.statistics()
+        return CaptureStatistics(captured=statistics.written, delivered=statistics.consumed,
+                                 dropped=statistics.dropped, queued=statistics.queued)
+
+    def waitForFrameBuffer(self, timeout=None):
+        # The frame buffer is created by the capture thread from its first frame
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.frameBuffer is None:
+            if not self.isCapturing or (deadline is not None and time.monotonic() > deadline):
+                return None
+            time.sleep(0.001)
+        return self.frameBuffer
+
     def captureLoopThread(self):
-        frame = None
+        import numpy as np
+
         NotificationCenter().post_notification(notification_name=CameraDeviceNotification.didStartCapture,
                                               notifying_object=self)
-        while (True):
-            frame = self.doCaptureFrame()
-            NotificationCenter().post_notification(CameraDeviceNotification.imageCaptured, self, frame)
-
+        first = np.asarray(self.doCaptureFrame())
+        frameBuffer = RingBuffer(shape=first.shape, dtype=first.dtype,
+                                 capacity=self.bufferCapacity, policy=self.overflowPolicy)
+        with self.frameBufferLock:
             if self.quitLoop:
                 return
+            self.frameBuffer = frameBuffer
+        timestamp = time.time()
+        self.recordFrame(first, timestamp)
+        frameBuffer.write(first, timestamp)
+        postIfObserved(CameraDeviceNotification.imageCaptured, self, makeUserInfo=first.copy)
+
+        try:
+            while not self.quitLoop:
+                slot = frameBuffer.acquireSlot()
+                if slot is None:
+                    return   # closed by stop()
+                frame = frameBuffer.slot(slot)
+                try:
+                    self.doCaptureFrameInto(frame)
+                except Exception:
+                    frameBuffer.abandonSlot(slot)
+                    raise
+                timestamp = time.time()
+                self.recordFrame(frame, timestamp)
+                frameBuffer.commitSlot(slot, timestamp)
+                postIfObserved(CameraDeviceNotification.imageCaptured, self, makeUserInfo=frame.copy)
+        finally:
+            frameBuffer.close()
+
+    def recordFrame(self, frame, timestamp):
+        # Only a copy into the recorder's chunk: the disk is written on its
+        # thread. append() may wait for the disk (dropWhenBehind=False), so the
+        # recorder has its own lock: stopRecording() waits, nothing else does.
+        with self.recorderLock:
+            if self.recorder is not None:
+                self.recorder.append(frame, timestamp)
 
 class OpenCVCamera(CameraDevice):
 
@@ -162,6 +342,13 @@ class OpenCVCamera(CameraDevice):
             ret, frame = self.cameraHandler.read()
             return frame
 
+    def doCaptureFrameInto(self, frame):
+        with self.lock:
+            # OpenCV decodes directly into the array it is given
+            ret, image = self.cameraHandler.read(image=frame)
+            if image is not frame and image is not None:
+                frame[...] = image
+
     @classmethod
     def availableCameras(cls):
         return 0
@@ -179,6 +366,107 @@ class OpenCVCamera(CameraDevice):
 
         return numberOfCameras
 
+class DebugCameraDevice(CameraDevice):
+    """ A camera without hardware, to test and benchmark capture, processing
+    and recording. Frames of height x width x channels pixels are a diagonal
+    pattern scrolling by one pixel per frame, plus noise. Both are precomputed:
+    a frame is one addition of two views, written directly into the frame
+    buffer. With frameRate, frames come at that rate (as fast as possible
+    otherwise). doCaptureFrame() returns the same array every time with
+    reuseBuffers, a new one otherwise. """
+    classIdProduct = 0xFFF5
+    classIdVendor = debugClassIdVendor
+
+    def __init__(self, serialNumber:str = "debug", width:int = 640, height:int = 480, channels:int = 3,
+                 dtype = "uint8", frameRate:float = None, noise:int = 16, reuseBuffers:bool = True,
+                 seed:int = None):
+        import numpy as np
+
+        super().__init__(serialNumber, DebugCameraDevice.classIdProduct, DebugCameraDevice.classIdVendor)
+        if np.dtype(dtype).kind not in "ui":
+            raise ValueError("DebugCameraDevice generates integer pixels only")
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.frameRate = frameRate
+        self.noise = noise
+        self.reuseBuffers = reuseBuffers
+        self.seed = seed
+        self.framesGenerated = 0
+        self.nextFrameTime = None
+        self.buffer = None
+        self.pattern = None
+        self.noiseFrames = None
+
+    @property
+    def shape(self):
+        if self.channels > 1:
+            return (self.height, self.width, self.channels)
+        return (self.height, self.width)
+
+    def doInitializeDevice(self):
+        self.preparePattern()
+
+    def doShutdownDevice(self):
+        super().doShutdownDevice()
+        self.buffer = None
+
+    def preparePattern(self):
+        import numpy as np
+
+        # The pattern stays below maxValue - noise so that adding the noise
+        # (0 to noise) cannot overflow
+        span = np.iinfo(self.dtype).max - self.noise
+        y = np.arange(self.height)[:, None]
+        x = np.arange(2*self.width)[None, :]
+        pattern = ((x + y) % 256)/255*span
+        if self.channels > 1:
+            pattern = pattern[:, :, None] * np.linspace(1, 0.5, self.channels)[None, None, :]
+        self.pattern = pattern.astype(self.dtype)
+
+        random = np.random.default_rng(self.seed)
+        noiseShape = (4, self.height, 2*self.width, *self.shape[2:])
+        self.noiseFrames = random.integers(0, self.noise + 1, size=noiseShape).astype(self.dtype)
+        self.nextFrameTime = None
+
+    def render(self, frame):
+        import numpy as np
+
+        if self.pattern is None:
+            self.preparePattern()
+        k = self.framesGenerated
+        offset = k % self.width
+        noiseOffset = (k * 7919) % self.width
+        np.add(self.pattern[:, offset:offset + self.width],
+               self.noiseFrames[k % 4, :, noiseOffset:noiseOffset + self.width], out=frame, casting='unsafe')
+        self.framesGenerated += 1
+        return frame
+
+    def waitForNextFrame(self):
+        if self.frameRate is None:
+            return
+        now = time.perf_counter()
+        if self.nextFrameTime is None or now > self.nextFrameTime + 1/self.frameRate:
+            self.nextFrameTime = now      # first frame, or too late: restart the clock
+        elif self.nextFrameTime > now:
+            time.sleep(self.nextFrameTime - now)
+        self.nextFrameTime += 1/self.frameRate
+
+    def doCaptureFrame(self):
+        import numpy as np
+
+        self.waitForNextFrame()
+        if not self.reuseBuffers:
+            return self.render(np.empty(self.shape, dtype=self.dtype))
+        if self.buffer is None:
+            self.buffer = np.empty(self.shape, dtype=self.dtype)
+        return self.render(self.buffer)
+
+    def doCaptureFrameInto(self, frame):
+        self.waitForNextFrame()
+        self.render(frame)
+
 if __name__ == "__main__":
     print(OpenCVCamera.availableCameras())
     cam = OpenCVCamera()
@@ -0,0 +1,41 @@
+"""Recording camera streams without disk I/O on the capture thread.
+
+A FrameRecorder is an ArrayRecorder for frames: the capture thread only copies
+each frame into a preallocated chunk, and the recorder's writer thread writes
+full chunks to disk, as raw .npy (memory-mapped on reading) or compressed with
+zlib. Each frame is recorded with its capture timestamp.
+
+    recorder = camera.startRecording("movie", compression="zlib")
+    ...
+    camera.stopRecording()
+
+    recording = ArrayRecording("movie")
+    recording.data[100], recording.timestamps[100]
+
+By default a FrameRecorder drops frames when the disk falls behind (at most
+maxPendingChunks chunks wait to be written), so the capture rate does not
+depend on the disk: statistics() counts them, and shows the pending chunks and
+the bandwidth of the disk.
+"""
+
+from hardwarelibrary.recording import ArrayRecorder
+
+__all__ = ["FrameRecorder"]
+
+
+class FrameRecorder(ArrayRecorder):
+    def __init__(self, path, camera=None, metadata=None, chunkSize=32, dropWhenBehind=True, **kwargs):
+        """Frames are large: chunks hold 32 frames by default."""
+        allMetadata = {} if camera is None else self.cameraMetadata(camera)
+        allMetadata.update(metadata or {})
+        super().__init__(path, metadata=allMetadata, chunkSize=chunkSize,
+                         dropWhenBehind=dropWhenBehind, **kwargs)
+
+    @staticmethod
+    def cameraMetadata(camera):
+        return {"model": type(camera).__name__,
+                "serialNumber": camera.serialNumber}
+
+    def appendFrame(self, frame):
+        """Record a Frame from CameraDevice.nextFrame() with its timestamp."""
+        return self.append(frame.data, frame.timestamp)
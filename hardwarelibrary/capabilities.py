@@ -22,7 +22,26 @@ class Capability(ABC):
     # super().__init__() after consuming the device-identity arguments), so a
     # mixin that holds per-instance state may define __init__ as long as it
     # takes no required arguments and forwards with super().__init__().
-    pass
+
+    # Getters go through the device's StatusCache (see
+    # hardwarelibrary.statuscache) when there is one: maxAge is the age in
+    # seconds of a cached value still good enough to skip the I/O.
+    def readStatusField(self, field, getter, maxAge=None):
+        statusCache = getattr(self, "statusCache", None)
+        if statusCache is None:
+            return getter()
+        return statusCache.read(field, getter, maxAge)
+
+    # Setters invalidate the fields they change and ask for a status update
+    # right away (PhysicalDevice.pollSoon), so that polling backed off by an
+    # AdaptivePollPolicy sees the change without waiting for its long interval.
+    def invalidateStatusFields(self, *fields):
+        statusCache = getattr(self, "statusCache", None)
+        if statusCache is not None:
+            statusCache.invalidate(*fields)
+        pollSoon = getattr(self, "pollSoon", None)
+        if pollSoon is not None:
+            pollSoon()
 
 
 # ---------------------------------------------------------------------------
@@ -30,14 +49,20 @@ class Capability(ABC):
 # ---------------------------------------------------------------------------
 
 class OnOffCapability(Capability):
-    def isLaserOn(self) -> bool:
-        return self.doGetOnOffState()
+    def isLaserOn(self, maxAge=None) -> bool:
+        return self.readStatusField("isLaserOn", self.doGetOnOffState, maxAge)
 
     def turnOn(self):
-        self.doTurnOn()
+        try:
+            self.doTurnOn()
+        finally:
+            self.invalidateStatusFields("isLaserOn", "power")
 
     def turnOff(self):
-        self.doTurnOff()
+        try:
+            self.doTurnOff()
+        finally:
+            self.invalidateStatusFields("isLaserOn", "power")
 
     # Advisory availability flag for callers/UIs; a driver overrides it when an
     # external condition (e.g. Cobolt autostart) forbids manual turn-on. The
@@ -61,14 +86,20 @@ class OnOffCapability(Capability):
 class ShutterCapability(Capability):
     # Distinct from OnOffCapability: the shutter is a mechanical block in front of
     # the output, so it can be opened or closed while the laser stays on.
-    def isShutterOpen(self) -> bool:
-        return self.doGetShutterState()
+    def isShutterOpen(self, maxAge=None) -> bool:
+        return self.readStatusField("isShutterOpen", self.doGetShutterState, maxAge)
 
     def openShutter(self):
-        self.doOpenShutter()
+        try:
+            self.doOpenShutter()
+        finally:
+            self.invalidateStatusFields("isShutterOpen")
 
     def closeShutter(self):
-        self.doCloseShutter()
+        try:
+            self.doCloseShutter()
+        finally:
+            self.invalidateStatusFields("isShutterOpen")
 
     @abstractmethod
     def doOpenShutter(self):
@@ -89,10 +120,13 @@ class PowerCapability(Capability):
     isWritable = True
 
     def setPower(self, power: float):
-        return self.doSetPower(power)
+        try:
+            return self.doSetPower(power)
+        finally:
+            self.invalidateStatusFields("power")
 
-    def power(self) -> float:
-        return self.doGetPower()
+    def power(self, maxAge=None) -> float:
+        return self.readStatusField("power", self.doGetPower, maxAge)
 
     @abstractmethod
     def doSetPower(self, power: float):
@@ -107,8 +141,8 @@ class InterlockCapability(Capability):
     isReadable = True
     isWritable = False
 
-    def interlock(self) -> bool:
-        return self.doGetInterlockState()
+    def interlock(self, maxAge=None) -> bool:
+        return self.readStatusField("interlock", self.doGetInterlockState, maxAge)
 
     @abstractmethod
     def doGetInterlockState(self) -> bool:
@@ -144,10 +178,13 @@ class WavelengthCapability(Capability):
     isWritable = True
 
     def setWavelength(self, wavelength: float):
-        return self.doSetWavelength(wavelength)
+        try:
+            return self.doSetWavelength(wavelength)
+        finally:
+            self.invalidateStatusFields("wavelength")
 
-    def wavelength(self) -> float:
-        return self.doGetWavelength()
+    def wavelength(self, maxAge=None) -> float:
+        return self.readStatusField("wavelength", self.doGetWavelength, maxAge)
 
     def wavelengthRange(self) -> tuple:
         return self.doGetWavelengthRange()
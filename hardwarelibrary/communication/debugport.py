@@ -45,13 +45,11 @@ class DebugPort(CommunicationPort):
             if self.delay > 0:
                 time.sleep(self.delay * random.random())
 
-            data = bytearray()
-            for i in range(length):
-                if len(self.outputBuffers[endPointIndex]) > 0:
-                    byte = self.outputBuffers[endPointIndex].pop(0)
-                    data.append(byte)
-                else:
-                    raise CommunicationReadTimeout("Unable to read {0} bytes, only {1} available".format(length, len(data)))
+            outputBuffer = self.outputBuffers[endPointIndex]
+            data = outputBuffer[:length]
+            del outputBuffer[:length]
+            if len(data) < length:
+                raise CommunicationReadTimeout("Unable to read {0} bytes, only {1} available".format(length, len(data)))
 
         return data
 
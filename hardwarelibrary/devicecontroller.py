@@ -19,8 +19,22 @@ no races and ordering is preserved. It reports everything through the existing
 NotificationCenter, so any front-end (Tk/mytk, Qt, a CLI, a test) just observes
 notifications; marshalling them onto a UI thread is the front-end's job.
 
+Work is served by priority rather than strictly first-come: interactive
+commands (the default) go before scripted ones, and status polls only run when
+no command is waiting (unless a poll is overdue by a full interval). The status
+poll that follows commands is coalesced: a burst of commands is followed by a
+single poll. Setters submitted with a coalesceKey are last-value-wins: a
+dragged slider calling ``submit(lambda d: d.setPower(p), coalesceKey="power")``
+only sends the latest value still waiting in the queue.
+
+For asyncio front-ends (e.g. a web dashboard), submitAsync(), connectAsync()
+and disconnectAsync() are coroutines, and statusSnapshots() is an async
+iterator over status dicts. Results are handed to the event loop with
+call_soon_threadsafe, so any number of awaiting clients costs no extra thread.
+
 It is deliberately decoupled from any toolkit: this module imports only the
-standard library and NotificationCenter.
+standard library, NotificationCenter and hardwarelibrary's notification
+helpers.
 
 Example::
 
@@ -43,15 +57,20 @@ Example::
     controller.stop()
 """
 
+import asyncio
+import itertools
 import queue
 import time
-from concurrent.futures import Future
-from enum import Enum
+from concurrent.futures import Future, InvalidStateError
+from enum import Enum, IntEnum
 from threading import Event, RLock, Thread
 
 from notificationcenter import NotificationCenter
 
+from hardwarelibrary.notificationdispatch import postIfObserved
+
 __all__ = [
+    "CommandPriority",
     "DeviceController",
     "DeviceControllerNotification",
     "connectionErrorReason",
@@ -77,6 +96,13 @@ class DeviceControllerNotification(Enum):
     commandFailed = "commandFailed"
 
 
+class CommandPriority(IntEnum):
+    """Order in which queued work is served (lower values first). Status
+    polls are not queued: they run once no command is waiting."""
+    interactive = 0
+    scripted = 1
+
+
 def connectionErrorReason(error):
     """Classify a connection exception as 'busy'/'permission'/'missing'/None.
 
@@ -110,23 +136,38 @@ class DeviceController:
     Args:
         device: any PhysicalDevice instance.
         pollInterval: seconds between status polls while connected. The poll
-            calls device.doGetStatusUserInfo(); if the device has none (returns
+            calls device.getStatusUserInfo(); if the device has none (returns
             None), polling is disabled automatically.
         reconnectInterval: seconds between reconnection attempts while
             disconnected-but-wanted.
         autoReconnect: when True, an unexpected drop (or a connect that fails
             because the device is not yet present) is retried until it succeeds
             or disconnect() is called. When False, a single failure gives up.
+        pollPolicy: an optional hardwarelibrary.pollpolicy.AdaptivePollPolicy.
+            When given, it replaces pollInterval: polls back off while the
+            status is unchanged, return to the fastest rate after a command or
+            a change, and a status notification is only posted on a change.
+        scheduler: an optional hardwarelibrary.scheduler.DeviceScheduler. When
+            given, the controller creates no thread: each step of its loop is a
+            task of the scheduler, scheduled when work arrives or falls due,
+            and never concurrent with another step of the same controller.
     """
 
     def __init__(self, device, pollInterval=1.0, reconnectInterval=2.0,
-                 autoReconnect=True):
+                 autoReconnect=True, scheduler=None, pollPolicy=None):
         self.device = device
         self.pollInterval = pollInterval
+        self.pollPolicy = pollPolicy
         self.reconnectInterval = reconnectInterval
         self.autoReconnect = autoReconnect
-
-        self.commandQueue = queue.Queue()
+        self.scheduler = scheduler
+        self.serviceTask = None      # next scheduled step, scheduler mode only
+        self.isServiced = False      # scheduler mode: started and not stopped
+        self.stoppedEvent = Event()
+
+        self.commandQueue = queue.PriorityQueue()
+        self.sequence = itertools.count()  # FIFO among equal priorities
+        self.pendingByKey = {}  # coalesceKey -> Future still in the queue
         self.stopEvent = Event()
         self.lock = RLock()
         self.thread = Thread(target=self.runLoop, name="DeviceController",
@@ -136,44 +177,134 @@ class DeviceController:
         self.wantConnected = False
         self.supportsStatus = True   # set False if doGetStatusUserInfo()->None
         self.nextPoll = 0.0
+        self.pollRequested = False  # a command asked for a fresh status
         self.nextReconnect = 0.0
         self.lastFailureSignature = None
 
     # -- public API (any thread) --
 
     def start(self):
-        """Start the worker thread."""
-        self.thread.start()
+        """Start the worker thread (or register with the scheduler)."""
+        if self.scheduler is not None:
+            with self.lock:
+                self.isServiced = True
+            self.scheduleService(0.0)
+        else:
+            self.thread.start()
+
+    def enqueue(self, priority, task):
+        self.commandQueue.put((priority, next(self.sequence), task))
+        if self.scheduler is not None:
+            self.scheduleService(0.0)
 
     def connect(self):
-        """Request connection (and, with autoReconnect, keep it connected)."""
-        self.commandQueue.put(("connect", None))
+        """Request connection (and, with autoReconnect, keep it connected).
+
+        Returns a Future resolved with True once connected, or False if the
+        first attempt failed (a connectionFailed notification tells why; with
+        autoReconnect, attempts continue in the background).
+        """
+        future = Future()
+        # Ahead of any command submitted after it
+        self.enqueue(CommandPriority.interactive, ("connect", future))
+        return future
 
     def disconnect(self):
-        """Request disconnection; clears the reconnect intent."""
-        self.commandQueue.put(("disconnect", None))
+        """Request disconnection; clears the reconnect intent. Returns a
+        Future resolved with None once disconnected."""
+        future = Future()
+        # Same priority as connect(): lifecycle requests run in the order made
+        self.enqueue(CommandPriority.interactive, ("disconnect", future))
+        return future
 
-    def submit(self, action, name=None):
+    def submit(self, action, name=None, priority=CommandPriority.interactive,
+               coalesceKey=None):
         """Run ``action(device)`` on the worker thread; return a Future.
 
         The Future resolves with the action's return value (so query-style
         devices can read a measurement back: ``controller.submit(lambda d:
         d.power()).result()``) or with its exception. On failure a commandFailed
         notification is also posted, for observers that don't hold the Future.
-        A status poll is forced after a successful command so observers see the
-        new state promptly. Do not block on ``.result()`` from a UI thread.
+        A status poll follows successful commands (one per burst) so observers
+        see the new state promptly. Do not block on ``.result()`` from a UI
+        thread.
+
+        priority is a CommandPriority: long scripted sequences should use
+        CommandPriority.scripted so that user actions are not stuck behind
+        them. With a coalesceKey, a command still waiting in the queue with
+        the same key is cancelled (its Future reports cancelled): only the
+        latest value of a setter is sent.
         """
         future = Future()
-        self.commandQueue.put(("command", (action, name, future)))
+        if coalesceKey is not None:
+            with self.lock:
+                superseded = self.pendingByKey.get(coalesceKey)
+                self.pendingByKey[coalesceKey] = future
+            if superseded is not None:
+                superseded.cancel()  # no effect if it is already running
+        self.enqueue(priority, ("command", (action, name, future, coalesceKey)))
         return future
 
     def stop(self):
         """Stop the worker thread and shut the device down."""
         self.stopEvent.set()
-        self.commandQueue.put(("disconnect", None))
-        if self.thread.is_alive():
+        self.enqueue(CommandPriority.interactive, ("disconnect", None))
+        if self.scheduler is not None:
+            if self.isRunning:
+                self.stoppedEvent.wait(timeout=5.0)
+        elif self.thread.is_alive():
             self.thread.join(timeout=5.0)
 
+    # -- asyncio API (from a coroutine running in an event loop) --
+
+    async def submitAsync(self, action, name=None, priority=CommandPriority.interactive,
+                          coalesceKey=None):
+        """Await the result of ``action(device)`` run on the worker thread."""
+        future = self.submit(action, name=name, priority=priority, coalesceKey=coalesceKey)
+        return await asyncio.wrap_future(future)
+
+    async def connectAsync(self):
+        """Await the first connection attempt; True if connected."""
+        return await asyncio.wrap_future(self.connect())
+
+    async def disconnectAsync(self):
+        await asyncio.wrap_future(self.disconnect())
+
+    def statusSnapshots(self, maxsize=1):
+        """Iterate asynchronously over the status dicts posted by the controller.
+
+        At most maxsize snapshots are kept for a slow consumer: older ones are
+        dropped, so a client always receives the most recent status. The
+        observer is removed when the iteration stops (break, cancellation or
+        aclose()). Raises ValueError right away if maxsize is less than 1.
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1, not {0}".format(maxsize))
+        return self.iterateStatusSnapshots(maxsize)
+
+    async def iterateStatusSnapshots(self, maxsize):
+        loop = asyncio.get_running_loop()
+        snapshots = asyncio.Queue()
+        token = object()  # a distinct observer for each iterator
+
+        def enqueue(info):
+            while snapshots.qsize() >= maxsize:
+                snapshots.get_nowait()
+            snapshots.put_nowait(info)
+
+        def handleStatus(notification):
+            # On the worker thread: hand over to the event loop
+            loop.call_soon_threadsafe(enqueue, notification.user_info)
+
+        NotificationCenter().add_observer(token, handleStatus,
+                                          DeviceControllerNotification.status,
+                                          observed_object=self)
+        try:
+            while True:
+                yield await snapshots.get()
+        finally:
+            NotificationCenter().remove_observer(token)
+
     @property
     def isConnected(self):
         with self.lock:
@@ -181,37 +312,98 @@ class DeviceController:
 
     @property
     def isRunning(self):
+        if self.scheduler is not None:
+            with self.lock:
+                return self.isServiced
         return self.thread.is_alive()
 
     # -- worker thread --
 
     def post(self, name, user_info=None):
-        NotificationCenter().post_notification(name, notifying_object=self,
-                                              user_info=user_info)
+        postIfObserved(name, self, user_info)
 
     def runLoop(self):
         while not self.stopEvent.is_set():
             try:
-                task = self.commandQueue.get(timeout=self.secondsUntilDue())
+                priority, sequence, task = self.commandQueue.get(timeout=self.secondsUntilDue())
             except queue.Empty:
                 task = None
 
-            if task is not None:
-                self.handleTask(task)
-
-            now = time.monotonic()
-            if self.connected and self.supportsStatus and now >= self.nextPoll:
-                self.nextPoll = now + self.pollInterval
-                self.poll()
-            elif (not self.connected and self.wantConnected
-                  and now >= self.nextReconnect):
-                self.nextReconnect = now + self.reconnectInterval
-                self.attemptConnect()
+            self.step(task)
 
         self.teardown()
 
+    def service(self):
+        # Scheduler mode: one non-blocking iteration of runLoop, then
+        # schedule the next one when something is due.
+        with self.lock:
+            self.serviceTask = None  # this step is running, no longer pending
+        if self.stopEvent.is_set():
+            with self.lock:
+                if not self.isServiced:
+                    return
+                self.isServiced = False
+            self.teardown()
+            self.stoppedEvent.set()
+            return
+
+        try:
+            priority, sequence, task = self.commandQueue.get_nowait()
+        except queue.Empty:
+            task = None
+        self.step(task)
+
+        if self.commandQueue.empty():
+            delay = self.secondsUntilDue()
+            if delay is not None:
+                self.scheduleService(delay)
+        else:
+            self.scheduleService(0.0)
+
+    def scheduleService(self, delay):
+        with self.lock:
+            if not self.isServiced:
+                return
+            if self.serviceTask is not None:
+                if delay >= self.serviceTask.dueTime - time.monotonic() and not self.serviceTask.isCancelled:
+                    return  # an earlier step is already scheduled
+                self.serviceTask.cancel()
+            self.serviceTask = self.scheduler.schedule(self, self.service, delay)
+
+    def step(self, task):
+        if task is not None:
+            self.handleTask(task)
+
+        now = time.monotonic()
+        if self.connected and self.supportsStatus and self.isPollAllowed(now):
+            self.pollRequested = False
+            self.poll()
+            # After the poll, which may have adapted the interval
+            self.nextPoll = now + self.currentPollInterval
+        elif (not self.connected and self.wantConnected
+              and now >= self.nextReconnect):
+            self.nextReconnect = now + self.reconnectInterval
+            self.attemptConnect()
+
+    @property
+    def currentPollInterval(self):
+        """The interval until the next poll, adapted by the pollPolicy if any."""
+        if self.pollPolicy is not None:
+            return self.pollPolicy.effectiveInterval
+        return self.pollInterval
+
+    def isPollAllowed(self, now):
+        # Polls have the lowest priority: they wait for the queue to drain,
+        # unless overdue by a full interval so that a constant stream of
+        # commands cannot starve the status.
+        if self.pollRequested or now >= self.nextPoll:
+            return self.commandQueue.empty() or now >= self.nextPoll + self.currentPollInterval
+        return False
+
     def secondsUntilDue(self):
         now = time.monotonic()
+        if self.connected and self.pollRequested and self.supportsStatus:
+            return 0.0
         if self.connected:
             target = self.nextPoll if self.supportsStatus else now + 0.5
         elif self.wantConnected:
@@ -226,12 +418,22 @@ class DeviceController:
             self.wantConnected = True
             self.nextReconnect = 0.0
             self.attemptConnect()
+            self.resolve(payload, self.isConnected)
         elif kind == "disconnect":
             self.wantConnected = False
             self.doDisconnect()
+            self.resolve(payload, None)
         elif kind == "command":
             self.doCommand(*payload)
 
+    def resolve(self, future, result):
+        if future is None:
+            return
+        try:
+            future.set_result(result)
+        except InvalidStateError:
+            pass  # the caller cancelled it: the request was carried out anyway
+
     def attemptConnect(self):
         with self.lock:
             if self.connected:
@@ -250,12 +452,14 @@ class DeviceController:
             self.connected = True
         self.supportsStatus = True
         self.nextPoll = time.monotonic()  # poll immediately
+        if self.pollPolicy is not None:
+            self.pollPolicy.reset(forgetStatus=True)
         self.lastFailureSignature = None
         self.post(DeviceControllerNotification.didConnect, user_info=self.device)
 
     def poll(self):
         try:
-            info = self.device.doGetStatusUserInfo()
+            info = self.device.getStatusUserInfo()
         except Exception as error:
             self.handleConnectionLost(error)
             return
@@ -263,9 +467,15 @@ class DeviceController:
             # Device exposes no status snapshot; stop polling for it.
             self.supportsStatus = False
             return
+        if self.pollPolicy is not None and not self.pollPolicy.update(info):
+            return  # unchanged: nothing to tell observers
         self.post(DeviceControllerNotification.status, user_info=info)
 
-    def doCommand(self, action, name, future):
+    def doCommand(self, action, name, future, coalesceKey=None):
+        if coalesceKey is not None:
+            with self.lock:
+                if self.pendingByKey.get(coalesceKey) is future:
+                    del self.pendingByKey[coalesceKey]
         if not future.set_running_or_notify_cancel():
             return  # the caller cancelled the Future before it ran
         if not self.isConnected:
@@ -280,13 +490,17 @@ class DeviceController:
             # A failed command may mean the link dropped; verify with a poll.
             self.post(DeviceControllerNotification.commandFailed, user_info=error)
             future.set_exception(error)
-            self.poll()
+            self.requestPoll()
             return
         future.set_result(result)
-        # Reflect the new state promptly.
-        if self.supportsStatus:
-            self.nextPoll = time.monotonic()
-            self.poll()
+        # Reflect the new state promptly, once the burst of commands is over.
+        self.requestPoll()
+
+    def requestPoll(self):
+        self.pollRequested = True
+        if self.pollPolicy is not None:
+            # The state is likely to change now: follow it closely
+            self.pollPolicy.reset()
 
     def handleConnectionLost(self, error):
         wasConnected = self.connected
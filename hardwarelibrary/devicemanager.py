@@ -3,6 +3,7 @@ import re
 from enum import Enum
 from typing import NamedTuple
 from threading import Thread, RLock
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from notificationcenter import NotificationCenter, Notification
 from hardwarelibrary.physicaldevice import PhysicalDevice, DeviceState, debugClassIdVendor
 from hardwarelibrary.motion import DebugLinearMotionDevice, LinearMotionDevice, SutterDevice
@@ -26,6 +27,16 @@ class DeviceManagerNotification(Enum):
     usbDeviceDidConnect = "usbDeviceDidConnect"
     usbDeviceDidDisconnect = "usbDeviceDidDisconnect"
 
+class DeviceLifecycleResult(NamedTuple):
+    device: PhysicalDevice
+    duration: float = 0.0
+    error: Exception = None
+    skipped: bool = False
+
+    @property
+    def succeeded(self):
+        return self.error is None and not self.skipped
+
 class DebugPhysicalDevice(PhysicalDevice):
     classIdVendor = debugClassIdVendor
     classIdProduct = 0xfffe
@@ -109,6 +120,15 @@ class DeviceManager:
     def __init__(self):
         if not hasattr(self, 'devices'):
             self.devices = set()
+        if not hasattr(self, 'inventory'):
+            # Indexes maintained by addDevice/removeDevice so that queries do
+            # not scan every device. The inventory maps each device to its
+            # serial number at the time it was added; the other dicts (with
+            # None values) are used as insertion-ordered sets.
+            self.inventory = {}
+            self.devicesByClass = {}
+            self.devicesByCapability = {}
+            self.devicesBySerialNumber = {}
         if not hasattr(self, 'quitMonitoring'):
             self.quitMonitoring = False
         if not hasattr(self, 'lock'):
@@ -119,6 +139,10 @@ class DeviceManager:
             self.usbDevices = []
         if not hasattr(self, 'usbDeviceDescriptors'):
             self.usbDeviceDescriptors = []
+        if not hasattr(self, 'dependencies'):
+            self.dependencies = {} # device -> prerequisites, see addDependency
+        if not hasattr(self, 'probeCache'):
+            self.probeCache = None # opt-in ProbeCache, see hardwarelibrary.probecache
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
@@ -223,20 +247,48 @@ class DeviceManager:
         if descriptor not in self.usbDeviceDescriptors:
             self.usbDeviceDescriptors.append(descriptor)
 
-        candidates = self.candidateClassesForAutoDiscovery(descriptor.idVendor, descriptor.idProduct)
+        candidates = self.orderedCandidateClasses(descriptor)
+        cachedClassName = None
+        if self.probeCache is not None:
+            cachedClassName = self.probeCache.driverClassName(descriptor.idVendor, descriptor.idProduct, descriptor.serialNumber)
+
+        isRecorded = False
         for candidateClass in candidates:
-            # This may throw if incompat:
-            #                 deviceInstanceible
+            # This may throw if incompatible
             try:
                 deviceInstance = candidateClass(serialNumber=descriptor.serialNumber,
                                             idProduct=descriptor.idProduct,
                                             idVendor=descriptor.idVendor)
+                deviceInstance.probeCache = self.probeCache
                 deviceInstance.initializeDevice()
                 deviceInstance.shutdownDevice()
                 self.addDevice(deviceInstance)
+                if self.probeCache is not None and not isRecorded:
+                    self.probeCache.update(descriptor.idVendor, descriptor.idProduct, descriptor.serialNumber,
+                                           driverClass=candidateClass)
+                    isRecorded = True
+                    if cachedClassName is not None:
+                        # The cached driver recognized the device: no need
+                        # to probe the other candidates.
+                        break
             except Exception as err:
-                pass
-                
+                if self.probeCache is not None and cachedClassName == self.probeCache.className(candidateClass):
+                    # The cached driver no longer recognizes this device
+                    self.probeCache.invalidate(descriptor.idVendor, descriptor.idProduct, descriptor.serialNumber)
+                    cachedClassName = None
+
+    def orderedCandidateClasses(self, descriptor):
+        """The candidate classes for a connected device, with the driver that
+        recognized it last time (according to the probeCache) tried first."""
+        candidates = self.candidateClassesForAutoDiscovery(descriptor.idVendor, descriptor.idProduct)
+        if self.probeCache is None:
+            return candidates
+
+        cachedClassName = self.probeCache.driverClassName(descriptor.idVendor, descriptor.idProduct, descriptor.serialNumber)
+        cached = [aClass for aClass in candidates if self.probeCache.className(aClass) == cachedClassName]
+        others = [aClass for aClass in candidates if aClass not in cached]
+        return cached + others
+
     def usbDeviceDisconnected(self, usbDevice):
         descriptor = None
         for aDescriptor in self.usbDeviceDescriptors:
@@ -257,6 +309,7 @@ class DeviceManager:
         with self.lock:
             NotificationCenter().post_notification(DeviceManagerNotification.willAddDevice, notifying_object=self, user_info=device)
             self.devices.add(device)
+            self.indexDevice(device)
             NotificationCenter().post_notification(DeviceManagerNotification.didAddDevice, notifying_object=self, user_info=device)
 
     def removeAllDevices(self):
@@ -274,52 +327,223 @@ class DeviceManager:
             NotificationCenter().post_notification(DeviceManagerNotification.willRemoveDevice, notifying_object=self,
                                                   user_info=device)
             self.devices.remove(device)
+            self.unindexDevice(device)
+            # Forget its dependencies, as a device and as a prerequisite
+            self.dependencies.pop(device, None)
+            for prerequisites in self.dependencies.values():
+                prerequisites.pop(device, None)
             NotificationCenter().post_notification(DeviceManagerNotification.didRemoveDevice, notifying_object=self, user_info=device)
 
+    def addDependency(self, device, prerequisite):
+        """Declare that device needs prerequisite: initializeAll() initializes
+        prerequisite first (and skips device if it fails), shutdownAll() shuts
+        device down first. Typically a power strip is the prerequisite of
+        the instruments it feeds."""
+        with self.lock:
+            self.dependencies.setdefault(device, {})[prerequisite] = None
+
+    def removeDependency(self, device, prerequisite):
+        with self.lock:
+            self.dependencies.get(device, {}).pop(prerequisite, None)
+
+    def sharedResourceKey(self, device):
+        """Devices with the same key cannot be opened concurrently: they share
+        a serial port or a generic converter (e.g. several GPIB instruments
+        behind one Prologix adaptor). None means the device shares nothing."""
+        portPath = getattr(device, "portPath", None)
+        if portPath is None and device.port is not None:
+            portPath = getattr(device.port, "portPath", None)
+        if portPath is not None and portPath != "debug":
+            return portPath
+        if device.usesGenericSerialConverter:
+            return (device.idVendor, device.idProduct)
+        return None
+
+    def initializeAll(self, devices=None, maxWorkers=None):
+        """Initialize devices (all managed devices by default) concurrently.
+
+        Devices sharing a resource (see sharedResourceKey) are initialized one
+        after the other, and a device is only started once its prerequisites
+        (see addDependency) are Ready; if one failed, the device is skipped.
+        Returns a DeviceLifecycleResult per device, in completion order.
+        Raises ValueError if the dependencies contain a cycle.
+        """
+        return self.runLifecycle(devices, lambda device: device.initializeDevice(),
+                                 reverse=False, maxWorkers=maxWorkers)
+
+    def shutdownAll(self, devices=None, maxWorkers=None):
+        """Shut devices down concurrently, dependents before their
+        prerequisites. A failure does not prevent the prerequisites from
+        being shut down."""
+        return self.runLifecycle(devices, lambda device: device.shutdownDevice(),
+                                 reverse=True, maxWorkers=maxWorkers)
+
+    def runLifecycle(self, devices, action, reverse, maxWorkers=None):
+        with self.lock:
+            if devices is None:
+                devices = list(self.inventory)
+            devices = list(dict.fromkeys(devices))
+            waitsFor = {device: [] for device in devices}
+            for device in devices:
+                for prerequisite in self.dependencies.get(device, ()):
+                    if prerequisite in waitsFor:
+                        if reverse:
+                            waitsFor[prerequisite].append(device)
+                        else:
+                            waitsFor[device].append(prerequisite)
+            resources = {device: self.sharedResourceKey(device) for device in devices}
+
+        order = self.topologicalOrder(waitsFor)
+        results = []
+        if len(order) == 0:
+            return results
+
+        def timedAction(device):
+            startTime = time.perf_counter()
+            try:
+                action(device)
+                error = None
+            except Exception as err:
+                error = err
+            return DeviceLifecycleResult(device, time.perf_counter() - startTime, error)
+
+        pending = list(order)
+        finished = {}
+        busyResources = set()
+        running = {}
+        if maxWorkers is None:
+            maxWorkers = min(32, len(order))
+        with ThreadPoolExecutor(max_workers=maxWorkers, thread_name_prefix="DeviceManager-Lifecycle") as executor:
+            while len(pending) > 0 or len(running) > 0:
+                for device in list(pending):
+                    if not all(other in finished for other in waitsFor[device]):
+                        continue
+                    if not reverse and not all(finished[other].succeeded for other in waitsFor[device]):
+                        pending.remove(device)
+                        error = PhysicalDevice.UnableToInitialize("A prerequisite of {0} failed to initialize".format(device))
+                        finished[device] = DeviceLifecycleResult(device, error=error, skipped=True)
+                        results.append(finished[device])
+                        continue
+                    resource = resources[device]
+                    if resource is not None and resource in busyResources:
+                        continue
+                    pending.remove(device)
+                    if resource is not None:
+                        busyResources.add(resource)
+                    running[executor.submit(timedAction, device)] = device
+
+                if len(running) == 0:
+                    # Skipping a device may have unblocked others
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    device = running.pop(future)
+                    busyResources.discard(resources[device])
+                    finished[device] = future.result()
+                    results.append(finished[device])
+
+        return results
+
+    @classmethod
+    def topologicalOrder(cls, waitsFor):
+        """The devices ordered so that each comes after those it waits for,
+        otherwise preserving the original order."""
+        order = []
+        remaining = dict(waitsFor)
+        while len(remaining) > 0:
+            ready = [device for device, others in remaining.items()
+                     if all(other not in remaining for other in others)]
+            if len(ready) == 0:
+                raise ValueError("Circular dependency between {0}".format(list(remaining)))
+            for device in ready:
+                order.append(device)
+                del remaining[device]
+        return order
+
+    def indexDevice(self, device):
+        for aClass in type(device).__mro__:
+            self.devicesByClass.setdefault(aClass, {})[device] = None
+        for capability in device.capabilities():
+            self.devicesByCapability.setdefault(capability, {})[device] = None
+        # The serial number is remembered with the device: it may be
+        # modified later and must still be found to be unindexed.
+        self.inventory[device] = device.serialNumber
+        self.devicesBySerialNumber.setdefault(device.serialNumber, {})[device] = None
+
+    def unindexDevice(self, device):
+        serialNumber = self.inventory.pop(device, None)
+        for index, keys in ((self.devicesByClass, type(device).__mro__),
+                            (self.devicesByCapability, device.capabilities()),
+                            (self.devicesBySerialNumber, [serialNumber])):
+            for key in keys:
+                devices = index.get(key)
+                if devices is not None:
+                    devices.pop(device, None)
+                    if len(devices) == 0:
+                        del index[key]
+
     def matchPhysicalDevicesOfType(self, deviceClass, serialNumber=None):
         with self.lock:
-            matched = []
-            for device in self.devices:
-                if issubclass(type(device), deviceClass):
-                    if serialNumber is not None:
-                        regexSerialNumber = serialNumber
-                        regMatch = re.match(regexSerialNumber, device.serialNumber, re.IGNORECASE)
-                        if regMatch is not None:
-                            matched.append(device)
-                    else:
-                        matched.append(device)
-            return matched
+            candidates = list(self.devicesByClass.get(deviceClass, ()))
+            if serialNumber is None:
+                return candidates
+
+            return [device for device in candidates
+                    if re.match(serialNumber, device.serialNumber, re.IGNORECASE) is not None]
+
+    def devicesWithCapability(self, capabilityClass):
+        with self.lock:
+            return list(self.devicesByCapability.get(capabilityClass, ()))
+
+    def anyDeviceWithCapability(self, capabilityClass):
+        with self.lock:
+            return next(iter(self.devicesByCapability.get(capabilityClass, ())), None)
+
+    def devicesWithSerialNumber(self, serialNumber):
+        """Devices whose serial number is exactly serialNumber (no regular
+        expression, see matchPhysicalDevicesOfType for that)."""
+        with self.lock:
+            return list(self.devicesBySerialNumber.get(serialNumber, ()))
+
+    def anyDeviceOfType(self, deviceClass):
+        with self.lock:
+            return next(iter(self.devicesByClass.get(deviceClass, ())), None)
 
     def linearMotionDevices(self):
         return self.matchPhysicalDevicesOfType(deviceClass=LinearMotionDevice)
 
     def anyLinearMotionDevice(self):
-        devices = self.linearMotionDevices()
-        if len(devices) == 0:
-            return None
-        return devices[0]
+        return self.anyDeviceOfType(LinearMotionDevice)
 
     def spectrometerDevices(self):
         return self.matchPhysicalDevicesOfType(deviceClass=Spectrometer)
 
     def anySpectrometerDevice(self):
-        devices = self.spectrometerDevices()
-        if len(devices) == 0:
-            return None
-        return devices[0]
+        return self.anyDeviceOfType(Spectrometer)
 
     def powerMeterDevices(self):
         return self.matchPhysicalDevicesOfType(deviceClass=PowerMeterDevice)
 
     def anyPowerMeterDevice(self):
-        devices = self.powerMeterDevices()
-        if len(devices) == 0:
-            return None
-        return devices[0]
+        return self.anyDeviceOfType(PowerMeterDevice)
 
     def sendCommand(self, commandName, deviceIdentifier=0):
-        DeviceManager().updateConnectedDevices()
-        device = list(self.devices)[deviceIdentifier]
+        """Send a named command to a device already known to the manager.
+
+        deviceIdentifier is either a position in the order devices were added
+        or an exact serial number. The USB bus is not rescanned: call
+        updateConnectedDevices() (or startMonitoring()) to refresh the
+        inventory.
+        """
+        with self.lock:
+            if isinstance(deviceIdentifier, str):
+                devices = self.devicesWithSerialNumber(deviceIdentifier)
+                if len(devices) == 0:
+                    raise KeyError("No device with serial number {0}".format(deviceIdentifier))
+                device = devices[0]
+            else:
+                device = list(self.inventory)[deviceIdentifier]
 
         if device.state == DeviceState.Ready:
             command = device.commands[commandName]
@@ -327,4 +551,3 @@ class DeviceManager:
             return (commandName, command.text_format, command.matchGroups)
         else:
             print("Device {0} is not Ready: call initializeDevice()".format(device))
-
@@ -3,6 +3,7 @@ from enum import Enum
 
 from hardwarelibrary.physicaldevice import *
 from notificationcenter import NotificationCenter, Notification
+from hardwarelibrary.notificationdispatch import postIfObserved
 
 
 class LinearMotionNotification(Enum):
@@ -49,48 +50,24 @@ class LinearMotionDevice(PhysicalDevice):
         ...
 
     def moveTo(self, position):
-        NotificationCenter().post_notification(
-            LinearMotionNotification.willMove,
-            notifying_object=self,
-            user_info=position,
-        )
+        postIfObserved(LinearMotionNotification.willMove, self, position)
         self.doMoveTo(position)
-        NotificationCenter().post_notification(
-            LinearMotionNotification.didMove,
-            notifying_object=self,
-            user_info=position,
-        )
+        postIfObserved(LinearMotionNotification.didMove, self, position)
 
     def moveBy(self, displacement):
-        NotificationCenter().post_notification(
-            LinearMotionNotification.willMove,
-            notifying_object=self,
-            user_info=displacement,
-        )
+        postIfObserved(LinearMotionNotification.willMove, self, displacement)
         self.doMoveBy(displacement)
-        NotificationCenter().post_notification(
-            LinearMotionNotification.didMove,
-            notifying_object=self,
-            user_info=displacement,
-        )
+        postIfObserved(LinearMotionNotification.didMove, self, displacement)
 
     def position(self) -> ():
         position = self.doGetPosition()
-        NotificationCenter().post_notification(
-            LinearMotionNotification.didGetPosition,
-            notifying_object=self,
-            user_info=position,
-        )
+        postIfObserved(LinearMotionNotification.didGetPosition, self, position)
         return position
 
     def home(self) -> ():
-        NotificationCenter().post_notification(
-            LinearMotionNotification.willMove, notifying_object=self
-        )
+        postIfObserved(LinearMotionNotification.willMove, self)
         self.doHome()
-        NotificationCenter().post_notification(
-            LinearMotionNotification.didMove, notifying_object=self
-        )
+        postIfObserved(LinearMotionNotification.didMove, self)
 
     def moveInMicronsTo(self, position):
         nativePosition = [x * self.nativeStepsPerMicrons for x in position]
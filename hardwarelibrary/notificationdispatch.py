@@ -0,0 +1,201 @@
+"""Cheaper posting and paced delivery of high-rate notifications.
+
+Some sources post a NotificationCenter notification per event: a camera per
+frame (CameraDeviceNotification.imageCaptured), a stage twice per move during
+a mapPositions scan, a device per status poll. Two problems follow:
+
+  * posting is not free (a lock, a Notification object, often a user_info
+    dict) and is paid even when nobody listens. postIfObserved() checks first
+    whether the name has any observer and otherwise returns immediately; a
+    user_info that is expensive to build can be given as a function
+    (makeUserInfo) that is only called when someone observes.
+
+  * an observer that updates a GUI cannot keep up with every event. A
+    ThrottledObserver receives the notifications on the posting thread, only
+    queues them (cheaply), and delivers them later to the real callback:
+    either the latest notification per (name, object) pair (coalesce) or all of
+    them as a list (batch), at most once every minInterval seconds. Delivery
+    happens when the GUI thread calls deliverPending() from its own timer
+    (nothing crosses threads), or on a delivery thread started with start().
+
+Example::
+
+    observer = ThrottledObserver(self.showFrame, policy=DeliveryPolicy.coalesce,
+                                 minInterval=1/30)
+    observer.observe(CameraDeviceNotification.imageCaptured, camera)
+    ...
+    # In a GUI timer callback:
+    observer.deliverPending()
+    ...
+    observer.remove()
+"""
+
+import time
+from enum import Enum
+from threading import Condition, RLock, Thread
+from typing import NamedTuple
+
+from notificationcenter import NotificationCenter
+
+__all__ = ["isObserved", "postIfObserved", "DeliveryPolicy", "ThrottledObserver",
+           "DeliveryStatistics"]
+
+
+def isObserved(name):
+    """True if at least one observer is registered for the notification name.
+
+    Lock-free: a registration made concurrently may be missed by a post that
+    races with it, just as it could have been posted a moment earlier."""
+    observers = NotificationCenter().observers.get(name)
+    return observers is not None and len(observers) > 0
+
+
+def postIfObserved(name, notifyingObject, userInfo=None, makeUserInfo=None):
+    """Post the notification only if someone observes its name. makeUserInfo,
+    if given, is called to build the user_info only in that case. Returns
+    True if the notification was posted."""
+    if not isObserved(name):
+        return False
+    if makeUserInfo is not None:
+        userInfo = makeUserInfo()
+    NotificationCenter().post_notification(name, notifying_object=notifyingObject, user_info=userInfo)
+    return True
+
+
+class DeliveryPolicy(Enum):
+    coalesce = "coalesce"  # latest notification per (name, object) only
+    batch = "batch"        # every notification, delivered as one list
+
+
+class DeliveryStatistics(NamedTuple):
+    received: int = 0
+    delivered: int = 0     # notifications handed to the callback
+    dropped: int = 0       # superseded before delivery (coalesce only)
+    deliveries: int = 0    # number of callback invocations
+
+
+class ThrottledObserver:
+    """Forward notifications to method, coalesced or batched, at most every
+    minInterval seconds.
+
+    With DeliveryPolicy.coalesce, method(notification) is called once per
+    (name, object) pair that posted since the last delivery. With
+    DeliveryPolicy.batch, method(notifications) is called with the list of
+    every notification received since the last delivery.
+    """
+
+    def __init__(self, method, policy=DeliveryPolicy.coalesce, minInterval=0.0):
+        self.method = method
+        self.policy = policy
+        self.minInterval = minInterval
+        self.lock = RLock()
+        self.condition = Condition(self.lock)
+        self.pending = {} if policy == DeliveryPolicy.coalesce else []
+        self.lastDelivery = None
+        self.deliveryThread = None
+        self.quitDelivering = False
+
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.deliveries = 0
+
+    def observe(self, name, observedObject=None):
+        NotificationCenter().add_observer(self, self.receive, name, observed_object=observedObject)
+
+    def remove(self):
+        """Stop observing everything and stop the delivery thread, if any."""
+        NotificationCenter().remove_observer(self)
+        self.stop()
+
+    def receive(self, notification):
+        # On the posting thread, under the NotificationCenter lock: queue only.
+        with self.lock:
+            self.received += 1
+            if self.policy == DeliveryPolicy.coalesce:
+                key = (notification.name, id(notification.object))
+                if key in self.pending:
+                    self.dropped += 1
+                self.pending[key] = notification
+            else:
+                self.pending.append(notification)
+            self.condition.notify()
+
+    @property
+    def pendingCount(self):
+        with self.lock:
+            return len(self.pending)
+
+    def statistics(self):
+        with self.lock:
+            return DeliveryStatistics(received=self.received, delivered=self.delivered,
+                                      dropped=self.dropped, deliveries=self.deliveries)
+
+    def secondsUntilAllowed(self):
+        with self.lock:
+            if self.lastDelivery is None:
+                return 0.0
+            return max(0.0, self.lastDelivery + self.minInterval - time.monotonic())
+
+    def deliverPending(self):
+        """Deliver what is pending on the calling thread, unless the previous
+        delivery was less than minInterval ago. Returns the number of
+        notifications delivered."""
+        with self.lock:
+            if len(self.pending) == 0 or self.secondsUntilAllowed() > 0:
+                return 0
+            if self.policy == DeliveryPolicy.coalesce:
+                notifications = list(self.pending.values())
+                self.pending = {}
+            else:
+                notifications = self.pending
+                self.pending = []
+            self.lastDelivery = time.monotonic()
+            self.delivered += len(notifications)
+
+        # The callback runs without the lock, so posting is never blocked by it
+        if self.policy == DeliveryPolicy.coalesce:
+            for notification in notifications:
+                self.method(notification)
+            with self.lock:
+                self.deliveries += len(notifications)
+        else:
+            self.method(notifications)
+            with self.lock:
+                self.deliveries += 1
+        return len(notifications)
+
+    def start(self):
+        """Deliver on a dedicated thread instead of through deliverPending()."""
+        with self.lock:
+            if self.deliveryThread is not None:
+                raise RuntimeError("Delivery thread already running")
+            self.quitDelivering = False
+            self.deliveryThread = Thread(target=self.deliveryLoop, name="ThrottledObserver-Delivery",
+                                         daemon=True)
+            self.deliveryThread.start()
+
+    def stop(self):
+        with self.lock:
+            thread = self.deliveryThread
+            if thread is None:
+                return
+            self.quitDelivering = True
+            self.condition.notify_all()
+        thread.join()
+        with self.lock:
+            self.deliveryThread = None
+
+    def deliveryLoop(self):
+        while True:
+            with self.lock:
+                while not self.quitDelivering and len(self.pending) == 0:
+                    self.condition.wait()
+                if self.quitDelivering:
+                    return
+                delay = self.secondsUntilAllowed()
+                if delay > 0:
+                    # Let more notifications accumulate until delivery is allowed
+                    self.condition.wait(delay)
+                    continue
+            self.deliverPending()
@@ -1,3 +1,5 @@
 #__all__ = ["sutterdevice"]
 
-from .oscilloscopedevice import OscilloscopeDevice, Channels, TektronikException
+from .oscilloscopedevice import (OscilloscopeDevice, Channels, TektronikException, ErrorCheckPolicy, Waveform,
+                                 WaveformPreamble)
+from .acquisition import WaveformAcquisition, AcquisitionStatistics
@@ -0,0 +1,163 @@
+"""Continuous waveform capture on a dedicated reader thread.
+
+getWaveform() and captureWaveforms() capture once, when called. A
+WaveformAcquisition captures the channels over and over on its reader thread,
+directly into the preallocated (channels, points) slots of a RingBuffer, each
+with the time.time() at which its first curve was requested. The consumer
+takes the captures at its own pace:
+
+    acquisition = WaveformAcquisition(scope, channels=[Channels.CH1, Channels.CH2])
+    acquisition.start()
+    for frame in acquisition.frames():
+        ch1, ch2 = frame.data       # volts; frame.index, frame.timestamp
+    ...
+    acquisition.stop()
+
+acquisition.time gives the time axis of the captures, read in start().
+get() and frames() return every capture in order, latest() only the most
+recent one. The queue holds `capacity` captures: when the consumer falls
+behind, OverflowPolicy.dropOldest (the default) overwrites the oldest captures
+not consumed yet and counts them as dropped; OverflowPolicy.block pauses the
+reader instead. A frame's data is a view on a buffer slot that is reused after
+the next get(): copy it to keep it.
+
+The preambles are read once in start() (errors are raised there), so each
+capture only switches DATA:SOURCE and transfers the curves. A failed capture
+is counted in statistics().errors and retried; after maxConsecutiveErrors in a
+row the reader stops, and failure holds the last error (it is None after
+stop()). Do not send other commands to the scope while an acquisition is
+running.
+"""
+
+import time
+from threading import Thread
+from typing import NamedTuple
+
+from hardwarelibrary.ringbuffer import RingBuffer, OverflowPolicy
+from hardwarelibrary.oscilloscope.oscilloscopedevice import Channels
+
+__all__ = ["WaveformAcquisition", "AcquisitionStatistics"]
+
+
+class AcquisitionStatistics(NamedTuple):
+    acquired: int = 0       # captures read from the scope
+    consumed: int = 0       # captures returned to the consumer
+    dropped: int = 0        # captures overwritten or skipped before being consumed
+    errors: int = 0         # failed captures (retried)
+    rate: float = 0.0       # captures per second since start()
+
+
+class WaveformAcquisition:
+    def __init__(self, scope, channels=None, capacity=8, policy=OverflowPolicy.dropOldest,
+                 maxConsecutiveErrors=10):
+        if channels is None:
+            channels = [Channels.CH1, Channels.CH2]
+        self.scope = scope
+        self.channels = [Channels(channel) for channel in channels]
+        self.capacity = capacity
+        self.policy = policy
+        self.maxConsecutiveErrors = maxConsecutiveErrors
+        self.ring = None
+        self.timeAxis = None
+        self.thread = None
+        self.quitAcquiring = False
+        self.startTime = None
+        self.errors = 0
+        self.lastError = None
+        self.failure = None
+
+    @property
+    def isRunning(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    @property
+    def time(self):
+        """The time axis of the captures (of the first channel)."""
+        return self.timeAxis
+
+    def start(self):
+        if self.thread is not None:
+            raise RuntimeError("Acquisition already started")
+
+        self.quitAcquiring = False
+        self.errors = 0
+        self.lastError = None
+        self.failure = None
+        self.startTime = time.monotonic()
+        first = self.scope.captureWaveforms(self.channels)
+        # Kept here: the consumer must not talk to the scope while the reader does
+        self.timeAxis = self.scope.getPreamble(self.channels[0]).time(first.shape[-1])
+        self.ring = RingBuffer(shape=first.shape, dtype=first.dtype,
+                               capacity=self.capacity, policy=self.policy)
+        self.ring.write(first, time.time())
+
+        self.thread = Thread(target=self.acquisitionLoop, name="WaveformAcquisition", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the reader thread. Captures already acquired can still be read."""
+        if self.thread is None:
+            return
+        self.quitAcquiring = True
+        self.ring.close()
+        self.thread.join()
+        self.thread = None
+
+    def get(self, timeout=None):
+        """The next capture as a Frame, or None after stop() or timeout."""
+        return self.ring.get(timeout)
+
+    def latest(self, timeout=None):
+        """The most recent capture as a Frame, skipping older ones."""
+        return self.ring.latest(timeout)
+
+    def release(self):
+        self.ring.release()
+
+    def frames(self):
+        """Every capture, in order, until stop()."""
+        return iter(self.ring)
+
+    def statistics(self):
+        if self.ring is None:
+            return AcquisitionStatistics(errors=self.errors)
+        ringStatistics = self.ring.statistics()
+        elapsed = time.monotonic() - self.startTime
+        rate = ringStatistics.written / elapsed if elapsed > 0 else 0.0
+        return AcquisitionStatistics(acquired=ringStatistics.written,
+                                     consumed=ringStatistics.consumed,
+                                     dropped=ringStatistics.dropped,
+                                     errors=self.errors, rate=rate)
+
+    # -- reader thread --
+
+    def acquisitionLoop(self):
+        consecutiveErrors = 0
+        try:
+            while not self.quitAcquiring:
+                slot = self.ring.acquireSlot()
+                if slot is None:
+                    break   # closed
+                timestamp = time.time()
+                try:
+                    self.scope.captureWaveforms(self.channels, out=self.ring.slot(slot))
+                    consecutiveErrors = 0
+                except Exception as err:
+                    self.ring.abandonSlot(slot)
+                    self.errors += 1
+                    self.lastError = err
+                    consecutiveErrors += 1
+                    if consecutiveErrors >= self.maxConsecutiveErrors:
+                        self.failure = err
+                        break
+                    # Drop what is left of a partial curve before the next capture
+                    try:
+                        self.scope.port.flush()
+                    except Exception:
+                        pass
+                    time.sleep(0.02)
+                    continue
+
+                self.ring.commitSlot(slot, timestamp)
+        finally:
+            self.ring.close()
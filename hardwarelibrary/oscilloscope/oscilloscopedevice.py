@@ -1,7 +1,12 @@
 import time
+import re
+from collections import Counter, deque
+from contextlib import contextmanager
 from enum import Enum
-import struct
+from typing import NamedTuple
 from hardwarelibrary.communication.serialport import SerialPort
+from hardwarelibrary.communication.commands import TextCommand
+from hardwarelibrary.communication.debugport import TableDrivenDebugPort
 from hardwarelibrary.physicaldevice import *
 from notificationcenter import NotificationCenter, Notification
 
@@ -12,27 +17,189 @@ class Channels(Enum):
     REFA    = "REFA"
     REFB    = "REFB"
 
+class ErrorCheckPolicy(Enum):
+    immediate = "immediate"   # after every command
+    batch = "batch"           # once per commandBatch(), after every command outside of one
+    onDemand = "onDemand"     # only in checkErrors()
+
 class TektronikException(Exception):
-    def __init__(self, code, msg, esr, stb, underlyingErrors=None):
+    def __init__(self, code, msg, esr, stb, underlyingErrors=None, commands=None):
         self.code = code
         self.msg = msg
         self.esr = esr
         self.stb = stb
         self.underlyingErrors = underlyingErrors
+        self.commands = commands  # sent since the previous error check, one of them failed
         
         super().__init__(msg)
 
+class WaveformPreamble(NamedTuple):
+    """The fields of a WFMPRE? reply, in the order the scope sends them."""
+    bytesPerPoint: int = 1
+    bitsPerPoint: int = 8
+    encoding: str = "BIN"
+    binaryFormat: str = "RI"
+    byteOrder: str = "MSB"
+    points: int = 2500
+    waveformId: str = ""
+    pointFormat: str = "Y"
+    xIncrement: float = 1.0
+    pointOffset: float = 0.0
+    xZero: float = 0.0
+    xUnit: str = "s"
+    yMultiplier: float = 1.0
+    yZero: float = 0.0
+    yOffset: float = 0.0
+    yUnit: str = "Volts"
+
+    @classmethod
+    def fromReply(cls, reply):
+        # Fields are separated by ';' and, with HEADER ON, prefixed by their name
+        fields = [re.sub(r'^:?[A-Z][A-Z0-9_:]*\s+', '', field.strip()).strip('"')
+                  for field in re.findall(r'"[^"]*"|[^;]+', reply.strip())]
+        if len(fields) < len(cls._fields):
+            raise ValueError("Incomplete waveform preamble (is the channel displayed?): '{0}'".format(reply.strip()))
+
+        values = []
+        for (name, fieldType), field in zip(cls.__annotations__.items(), fields):
+            values.append(fieldType(float(field)) if fieldType is int else fieldType(field))
+        return cls(*values)
+
+    @property
+    def dtype(self):
+        """The NumPy dtype of the CURVE? data (e.g. 'b' or '>i2')."""
+        order = '>' if self.byteOrder.upper().startswith("MSB") else '<'
+        kind = 'u' if self.binaryFormat.upper().startswith("RP") else 'i'
+        return "{0}{1}{2}".format(order, kind, self.bytesPerPoint)
+
+    def voltage(self, values, out=None):
+        import numpy as np
+        if out is None:
+            out = np.empty(len(values), dtype=np.float64)
+        np.subtract(values, self.yOffset, out=out)
+        np.multiply(out, self.yMultiplier, out=out)
+        np.add(out, self.yZero, out=out)
+        return out
+
+    def time(self, count=None):
+        import numpy as np
+        if count is None:
+            count = self.points
+        return self.xZero + self.xIncrement*(np.arange(count, dtype=np.float64) - self.pointOffset)
+
+class Waveform:
+    """A captured waveform: voltage is a NumPy array (in yUnit, usually
+    volts), time is computed from the preamble the first time it is used.
+    Iterating gives (time, voltage) pairs."""
+
+    def __init__(self, channel, preamble, voltage, timestamp=None):
+        self.channel = channel
+        self.preamble = preamble
+        self.voltage = voltage
+        self.timestamp = timestamp
+        self._time = None
+
+    @property
+    def time(self):
+        if self._time is None:
+            self._time = self.preamble.time(len(self.voltage))
+        return self._time
+
+    def __len__(self):
+        return len(self.voltage)
+
+    def __iter__(self):
+        return zip(self.time, self.voltage)
+
 class OscilloscopeDevice(PhysicalDevice):
     classIdVendor = 0x0403
     classIdProduct = 0x6001
     usesGenericSerialConverter = True
 
-    def __init__(self, serialNumber:str = None, idProduct = 0x6001, idVendor = 0x0403):
+    # Command, execution, device-dependent and query errors in *ESR?
+    errorStatusBits = 0x3C
+    # Commands kept to attribute errors to, the most recent ones
+    maxUncheckedCommands = 32
+
+    commands = {
+        "GET_STATUS_BYTE": TextCommand(name="GET_STATUS_BYTE",
+            requestEncoder="*STB?\n",
+            requestDecoder=r"\*STB\?\n",
+            replyDecoder=r"(\d.*)$",
+            replyEncoder="{stb}\n"),
+        "GET_EVENT_STATUS": TextCommand(name="GET_EVENT_STATUS",
+            requestEncoder="*ESR?\n",
+            requestDecoder=r"\*ESR\?\n",
+            replyDecoder=r"(\d.*)$",
+            replyEncoder="{esr}\n"),
+        "GET_EVENT_QUANTITY": TextCommand(name="GET_EVENT_QUANTITY",
+            requestEncoder="EVQTY?\n",
+            requestDecoder=r"EVQTY\?\n",
+            replyDecoder=r"(\d.*)$",
+            replyEncoder="{quantity}\n"),
+        "GET_ALL_EVENTS": TextCommand(name="GET_ALL_EVENTS",
+            requestEncoder="ALLEV?\n",
+            requestDecoder=r"ALLEV\?\n"),
+        "SELECT_CHANNEL": TextCommand(name="SELECT_CHANNEL",
+            requestEncoder="SELECT:{channel} {state}\n",
+            requestDecoder=r"SELECT:(?P<channel>\w+) (?P<state>ON|OFF)\n"),
+        "SET_DATA_SOURCE": TextCommand(name="SET_DATA_SOURCE",
+            requestEncoder="DATA:SOURCE {channel}\n",
+            requestDecoder=r"DATA:SOURCE (?P<channel>\w+)\n"),
+        "GET_PREAMBLE": TextCommand(name="GET_PREAMBLE",
+            requestEncoder="WFMPRE?\n",
+            requestDecoder=r"WFMPRE\?\n",
+            replyDecoder=r"(.+;.+)"),
+        "SET_DATA_WIDTH": TextCommand(name="SET_DATA_WIDTH",
+            requestEncoder="DATA:WIDTH {width}\n",
+            requestDecoder=r"DATA:WIDTH (?P<width>[12])\n"),
+        "GET_CURVE": TextCommand(name="GET_CURVE",
+            requestEncoder="CURVE?\n",
+            requestDecoder=r"CURVE\?\n"),
+        "GET_VERTICAL_SCALE": TextCommand(name="GET_VERTICAL_SCALE",
+            requestEncoder="{channel}:VOLTS?\n",
+            requestDecoder=r"(?P<channel>\w+):VOLTS\?\n",
+            replyDecoder=r"(\d.*)$",
+            replyEncoder="{value:.1E}\n"),
+        "SET_VERTICAL_SCALE": TextCommand(name="SET_VERTICAL_SCALE",
+            requestEncoder="{channel}:VOLTS {value:g}\n",
+            requestDecoder=r"(?P<channel>\w+):VOLTS (?P<value>\S+)\n"),
+        "SET_VERTICAL_POSITION": TextCommand(name="SET_VERTICAL_POSITION",
+            requestEncoder="{channel}:POSITION {value:g}\n",
+            requestDecoder=r"(?P<channel>\w+):POSITION (?P<value>\S+)\n"),
+        "GET_HORIZONTAL_SCALE": TextCommand(name="GET_HORIZONTAL_SCALE",
+            requestEncoder="HORIZONTAL:MAIN:SCALE?\n",
+            requestDecoder=r"HORIZONTAL:MAIN:SCALE\?\n",
+            replyDecoder=r"(\d.*)$",
+            replyEncoder="{value:.1E}\n"),
+        "SET_HORIZONTAL_SCALE": TextCommand(name="SET_HORIZONTAL_SCALE",
+            requestEncoder="HORIZONTAL:MAIN:SCALE {value:g}\n",
+            requestDecoder=r"HORIZONTAL:MAIN:SCALE (?P<value>\S+)\n"),
+        "SET_HORIZONTAL_POSITION": TextCommand(name="SET_HORIZONTAL_POSITION",
+            requestEncoder="HORIZONTAL:MAIN:POSITION {value:g}\n",
+            requestDecoder=r"HORIZONTAL:MAIN:POSITION (?P<value>\S+)\n"),
+    }
+
+    def __init__(self, serialNumber:str = None, idProduct = 0x6001, idVendor = 0x0403, portPath=None,
+                 errorCheckPolicy=ErrorCheckPolicy.batch):
         super().__init__(serialNumber, idProduct=self.classIdProduct, idVendor=self.classIdVendor)
 
-        self.port = SerialPort(idVendor=self.classIdVendor, idProduct=self.classIdProduct)
+        self.portPath = portPath
+        if self.portPath == "debug":
+            self.port = self.DebugSerialPort()
+        else:
+            self.port = SerialPort(idVendor=self.classIdVendor, idProduct=self.classIdProduct)
         self.delay = None
 
+        self.errorCheckPolicy = errorCheckPolicy
+        self.batchDepth = 0
+        self.uncheckedCommands = deque(maxlen=self.maxUncheckedCommands)
+
+        # What we know of the scope settings, valid until we change them
+        self.preambles = {}
+        self.dataSource = None
+        self.displayedChannels = set()
+
     def displayWaveforms(self, channels=None):
         import matplotlib.pyplot as plt
 
@@ -41,38 +208,189 @@ class OscilloscopeDevice(PhysicalDevice):
 
         plt.style.use('https://raw.githubusercontent.com/dccote/Enseignement/master/SRC/dccote-errorbars.mplstyle')
 
-        for channel in channels:
-            waveform = self.getWaveform(channel)
-            x,y = zip(*waveform)
+        voltages = self.captureWaveforms(channels)
+        for channel, voltage in zip(channels, voltages):
             if channel == Channels.CH1:
                 marker = 'k-'
             else:
                 marker = 'k--'
-            plt.plot(x,y,marker)
-        
+            plt.plot(self.getPreamble(channel).time(len(voltage)), voltage, marker)
+
         plt.ylabel("Voltage [V]")
         plt.xlabel("Time [s]")
         plt.show()
 
     def getWaveform(self, channel):
-        self.doSendCommand("SELECT:{0} ON\n".format(channel.value))
-        self.doSendCommand("DATA:SOURCE {0}\n".format(channel.value))
+        """The current waveform of channel (a Channels or its name) as a
+        Waveform. The preamble of each channel is queried once and kept until
+        one of our setters changes the acquisition settings: repeated
+        captures of a channel only transfer the CURVE? data. Call
+        invalidatePreambles() after changing settings on the front panel."""
+        channel = Channels(channel)
+        preamble = self.getPreamble(channel)
+        self.doSelectDataSource(channel)
+
+        timestamp = time.time()
+        self.wait()
+        self.port.writeString("CURVE?\n")
+        values = self.doReadBinaryBlock(dtype=preamble.dtype)
 
-        xIncr = self.doSendFloatQuery("WFMPRE:XINCR?\n")
-        ptOffset = self.doSendFloatQuery("WFMPRE:PT_OFF?\n")
-        xZero = self.doSendFloatQuery("WFMPRE:XZERO?\n")
-        yMul = self.doSendFloatQuery("WFMPRE:YMUL?\n")
-        yOffset = self.doSendFloatQuery("WFMPRE:YOFF?\n")
-        yZero = self.doSendFloatQuery("WFMPRE:YZERO?\n")
+        return Waveform(channel, preamble, preamble.voltage(values), timestamp)
 
-        self.port.writeString("CURVE?\n")
-        values = self.doReadBinaryBlock()
+    def captureWaveforms(self, channels=None, out=None):
+        """The voltages of channels (default CH1 and CH2) in one
+        (channels, points) array, out if given. Preambles are cached as with
+        getWaveform(): a capture only switches DATA:SOURCE and transfers each
+        CURVE?, in one commandBatch(). While the scope is running, each curve is the latest one at
+        the time it is read: stop the acquisition (ACQUIRE:STATE STOP) to read
+        the channels of a single trigger."""
+        import numpy as np
 
-        return [(xZero + xIncr*(i-ptOffset), yZero + (value-yOffset)*yMul ) for i,value in enumerate(values) ]
+        if channels is None:
+            channels = [Channels.CH1, Channels.CH2]
+        channels = [Channels(channel) for channel in channels]
+        with self.commandBatch():
+            preambles = [self.getPreamble(channel) for channel in channels]
+
+        points = max(preamble.points for preamble in preambles)
+        if out is None:
+            out = np.empty((len(channels), points), dtype=np.float64)
+        elif out.shape != (len(channels), points):
+            raise ValueError("out has shape {0}, expected {1}".format(out.shape, (len(channels), points)))
+
+        with self.commandBatch():
+            for i, (channel, preamble) in enumerate(zip(channels, preambles)):
+                self.doSelectDataSource(channel)
+                self.wait()
+                self.port.writeString("CURVE?\n")
+                values = self.doReadBinaryBlock(dtype=preamble.dtype)
+                if len(values) != points:
+                    raise ValueError("{0} points received from {1}, expected {2}".format(len(values), channel.value, points))
+                preamble.voltage(values, out=out[i])
+        return out
+
+    def getPreamble(self, channel):
+        channel = Channels(channel)
+        preamble = self.preambles.get(channel)
+        if preamble is None:
+            with self.commandBatch():
+                self.doSelectDataSource(channel)
+                reply, groups = self.doSendQuery("WFMPRE?\n", r"(.+;.+)")
+            preamble = WaveformPreamble.fromReply(groups[0])
+            self.preambles[channel] = preamble
+        return preamble
+
+    def invalidatePreambles(self, channel=None):
+        """Forget the preamble of channel, or everything known about the scope
+        settings (preambles, data source, displayed channels) when channel
+        is None."""
+        if channel is None:
+            self.preambles = {}
+            self.dataSource = None
+            self.displayedChannels = set()
+        else:
+            self.preambles.pop(Channels(channel), None)
+
+    def setDataWidth(self, width):
+        """Transfer 1 (the default) or 2 bytes per point in CURVE?. Every
+        preamble is read again after a change."""
+        if width not in (1, 2):
+            raise ValueError("Data width must be 1 or 2 bytes")
+        self.preambles = {}
+        self.doSendCommand("DATA:WIDTH {0}\n".format(width))
+
+    def getVerticalScale(self, channel):
+        channel = Channels(channel)
+        return self.doSendFloatQuery("{0}:VOLTS?\n".format(channel.value))
+
+    def setVerticalScale(self, channel, voltsPerDivision):
+        channel = Channels(channel)
+        self.invalidatePreambles(channel)
+        self.invalidatePreambles(Channels.MATH)
+        self.doSendCommand("{0}:VOLTS {1:g}\n".format(channel.value, voltsPerDivision))
+
+    def setVerticalPosition(self, channel, divisions):
+        channel = Channels(channel)
+        self.invalidatePreambles(channel)
+        self.invalidatePreambles(Channels.MATH)
+        self.doSendCommand("{0}:POSITION {1:g}\n".format(channel.value, divisions))
+
+    def getHorizontalScale(self):
+        return self.doSendFloatQuery("HORIZONTAL:MAIN:SCALE?\n")
+
+    def setHorizontalScale(self, secondsPerDivision):
+        self.preambles = {}
+        self.doSendCommand("HORIZONTAL:MAIN:SCALE {0:g}\n".format(secondsPerDivision))
+
+    def setHorizontalPosition(self, seconds):
+        self.preambles = {}
+        self.doSendCommand("HORIZONTAL:MAIN:POSITION {0:g}\n".format(seconds))
+
+    @contextmanager
+    def commandBatch(self):
+        """Send a group of commands and check for errors once, at the end,
+        with the batch policy (the default):
+
+            with scope.commandBatch():
+                scope.setVerticalScale(Channels.CH1, 0.5)
+                scope.setHorizontalScale(1e-3)
+
+        An error raises a TektronikException whose commands are those of the
+        batch. With the immediate policy each command is still checked, with
+        onDemand none is. Batches can be nested."""
+        self.batchDepth += 1
+        try:
+            yield self
+        except Exception as err:
+            if self.batchDepth == 1 and self.errorCheckPolicy == ErrorCheckPolicy.batch:
+                self.checkErrors(underlyingError=err)
+            raise
+        finally:
+            self.batchDepth -= 1
+
+        if self.batchDepth == 0 and self.errorCheckPolicy == ErrorCheckPolicy.batch and len(self.uncheckedCommands) > 0:
+            self.checkErrors()
+
+    @property
+    def isCheckingEachCommand(self):
+        if self.errorCheckPolicy == ErrorCheckPolicy.batch:
+            return self.batchDepth == 0
+        return self.errorCheckPolicy == ErrorCheckPolicy.immediate
+
+    def checkErrors(self, underlyingError=None):
+        """Raise the first error the scope reported since the last check, with
+        the commands sent since then (the last maxUncheckedCommands). It costs a single *ESR? query when there
+        is no error."""
+        commands = list(self.uncheckedCommands)
+        self.uncheckedCommands.clear()
+        errors = self.doGetTektronikErrors()
+        if len(errors) == 0:
+            return
+
+        # Commands may have failed after we recorded their effect
+        self.invalidatePreambles()
+        for error in errors:
+            error.commands = commands
+        if underlyingError is not None:
+            # The error of the command first, then the one reading the status, if any
+            errors[0].underlyingErrors = [underlyingError] + (errors[0].underlyingErrors or [])
+        raise errors[0]
+
+    def doSelectDataSource(self, channel):
+        if channel not in self.displayedChannels:
+            self.doSendCommand("SELECT:{0} ON\n".format(channel.value))
+            self.displayedChannels.add(channel)
+        if self.dataSource != channel:
+            self.doSendCommand("DATA:SOURCE {0}\n".format(channel.value))
+            self.dataSource = channel
 
     def doInitializeDevice(self):
+        self.invalidatePreambles()
         if self.port is not None:
-            self.port.open(baudRate=9600, timeout=5.0, rtscts=True)
+            if self.portPath == "debug":
+                self.port.open()
+            else:
+                self.port.open(baudRate=9600, timeout=5.0, rtscts=True)
             self.doGetTektronikStatus()
             # self.model = self.doSendQuery("ID?\n", "ID (TEK.*?),.+")
 
@@ -91,11 +409,9 @@ class OscilloscopeDevice(PhysicalDevice):
             self.wait()
             return self.port.readMatchingGroups(replyPattern)
         except Exception as err:
-            tekError = self.doGetTektronikError()
-            if tekError is not None:
-                raise tekError
-            else:
-                raise err
+            if self.isCheckingEachCommand:
+                self.checkErrors(underlyingError=err)
+            raise err
 
     def doSendFloatQuery(self, query):
         reply, groups = self.doSendQuery(query, r"(\d.*)$")
@@ -108,29 +424,28 @@ class OscilloscopeDevice(PhysicalDevice):
     def doSendCommand(self, command):
         self.wait()
         self.port.writeString(string=command)
-        tekError = self.doGetTektronikError()
-        if tekError is not None:
-            raise tekError
+        self.uncheckedCommands.append(command.strip())
+        if self.isCheckingEachCommand:
+            self.checkErrors()
+
+    def doReadBinaryBlock(self, dtype='b'):
+        import numpy as np
 
-    def doReadBinaryBlock(self):
         self.wait()
         try:
             blockDelimiter = self.port.readData(length=1)
             if blockDelimiter != b'#':
                 raise ValueError("Bad block delimiter {0}".format(blockDelimiter))
             nDigits = int(self.port.readData(length=1).decode('utf-8'))
-            nValues = int(self.port.readData(length=nDigits).decode('utf-8'))
+            nBytes = int(self.port.readData(length=nDigits).decode('utf-8'))
 
-            data = self.port.readData(nValues) 
+            data = self.port.readData(nBytes)
             self.port.readData(1) # drop newline
-            values = struct.unpack("{0}b".format(nValues), data)
+            values = np.frombuffer(data, dtype=dtype)
         except Exception as err:
-            tekError = self.doGetTektronikError()
-            if tekError is not None:
-                tekError.underlyingErrors = [err]
-                raise tekError
-            else:
-                raise err
+            if self.isCheckingEachCommand:
+                self.checkErrors(underlyingError=err)
+            raise err
 
         return values
 
@@ -165,6 +480,27 @@ class OscilloscopeDevice(PhysicalDevice):
         return len(errors) != 0, stb, esr, errors
 
 
+    def doGetTektronikErrors(self):
+        # *ESR? has an error bit set when the event queue holds errors: the
+        # queue is only read then.
+        try:
+            reply, groups = self.port.writeStringReadMatchingGroups("*ESR?\n", r"(\d+)")
+            esr = int(groups[0])
+        except Exception as err:
+            self.port.flush()
+            return [TektronikException(code=None, msg="Unable to read oscilloscope status",
+                                       esr=None, stb=None, underlyingErrors=[err])]
+
+        if esr & self.errorStatusBits == 0:
+            return []
+
+        hasError, stb, _, errors = self.doGetTektronikStatus()
+        if not hasError:
+            errors = [TektronikException(code=None, msg="Error reported by *ESR? ({0})".format(esr), esr=esr, stb=stb)]
+        for error in errors:
+            error.esr = esr
+        return errors
+
     def doGetStatusUserInfo(self):
         return self.doGetTektronikStatus()
 
@@ -174,6 +510,119 @@ class OscilloscopeDevice(PhysicalDevice):
             return errors[0]
         return None
 
+    class DebugSerialPort(TableDrivenDebugPort):
+        """A TDS-1002 answering the commands of OscilloscopeDevice, with a sine
+        on CH1 and a square wave on CH2. received counts the commands by
+        name. Unknown commands and out of range values are queued as events
+        and flagged in *ESR?, like the scope does."""
+        def __init__(self):
+            super().__init__(commands=OscilloscopeDevice.commands)
+            self.verticalScale = {channel: 1.0 for channel in Channels}
+            self.verticalPosition = {channel: 0.0 for channel in Channels}
+            self.horizontalScale = 5e-4
+            self.horizontalPosition = 0.0
+            self.points = 2500
+            self.frequency = 1000.0
+            self.dataSource = Channels.CH1
+            self.displayedChannels = {Channels.CH1}
+            self.dataWidth = 1
+            self.received = Counter()
+            self.esr = 0
+            self.events = []
+
+        def addEvent(self, code, message, esrBit):
+            self.events.append((code, message))
+            self.esr |= esrBit
+
+        def processInputBuffers(self, endPointIndex):
+            inputBytes = self.inputBuffers[endPointIndex]
+            if len(inputBytes) > 0 and not any(command.matches(inputBytes) for command in self.commands.values()):
+                self.inputBuffers[endPointIndex] = bytearray()
+                self.addEvent(113, "Undefined header; unrecognized command - {0}".format(inputBytes.decode().strip()), 0x20)
+                return
+            super().processInputBuffers(endPointIndex)
+
+        def preamble(self, channel):
+            # 25 levels per division, of 256 sub-levels in 16 bits
+            levelsPerDivision = 25*256**(self.dataWidth - 1)
+            yMultiplier = self.verticalScale[channel]/levelsPerDivision
+            yOffset = -self.verticalPosition[channel]*levelsPerDivision
+            xIncrement = 10*self.horizontalScale/self.points
+            xZero = self.horizontalPosition - 5*self.horizontalScale
+            return WaveformPreamble(bytesPerPoint=self.dataWidth, bitsPerPoint=8*self.dataWidth, points=self.points,
+                                    waveformId="{0}, DC coupling, {1:.1E} V/div, {2:.1E} s/div, {3} points, Sample mode".format(
+                                        channel.value, self.verticalScale[channel], self.horizontalScale, self.points),
+                                    xIncrement=xIncrement, xZero=xZero,
+                                    yMultiplier=yMultiplier, yOffset=yOffset)
+
+        def signal(self, channel, t):
+            import numpy as np
+            if channel == Channels.CH1:
+                return 1.5*np.sin(2*np.pi*self.frequency*t)
+            elif channel == Channels.CH2:
+                return 0.5*np.sign(np.sin(2*np.pi*self.frequency*t))
+            elif channel == Channels.MATH:
+                return self.signal(Channels.CH1, t) - self.signal(Channels.CH2, t)
+            return np.zeros_like(t)
+
+        def curve(self):
+            import numpy as np
+            preamble = self.preamble(self.dataSource)
+            levels = self.signal(self.dataSource, preamble.time())/preamble.yMultiplier + preamble.yOffset
+            limits = np.iinfo(np.dtype(preamble.dtype))
+            values = np.clip(np.round(levels), limits.min, limits.max).astype(preamble.dtype)
+            data = values.tobytes()
+            size = str(len(data))
+            return b"#" + str(len(size)).encode() + size.encode() + data + b"\n"
+
+        def process_command(self, name, params, endPointIndex):
+            self.received[name] += 1
+            if name == "GET_STATUS_BYTE":
+                return {"stb": 0x04 if self.events else 0}
+            elif name == "GET_EVENT_STATUS":
+                esr, self.esr = self.esr, 0
+                return {"esr": esr}
+            elif name == "GET_EVENT_QUANTITY":
+                return {"quantity": len(self.events)}
+            elif name == "GET_ALL_EVENTS":
+                events, self.events = self.events, []
+                return ",".join('{0},"{1}"'.format(code, message) for code, message in events) + "\n"
+            elif name == "SELECT_CHANNEL":
+                channel = Channels(params["channel"])
+                if params["state"] == "ON":
+                    self.displayedChannels.add(channel)
+                else:
+                    self.displayedChannels.discard(channel)
+            elif name == "SET_DATA_WIDTH":
+                self.dataWidth = int(params["width"])
+            elif name == "SET_DATA_SOURCE":
+                self.dataSource = Channels(params["channel"])
+            elif name == "GET_PREAMBLE":
+                preamble = self.preamble(self.dataSource)
+                if self.dataSource not in self.displayedChannels:
+                    preamble = preamble[:5]
+                return ";".join('"{0}"'.format(value) if i in (6, 11, 15) else str(value)
+                                for i, value in enumerate(preamble)) + "\n"
+            elif name == "GET_CURVE":
+                return self.curve()
+            elif name == "GET_VERTICAL_SCALE":
+                return {"value": self.verticalScale[Channels(params["channel"])]}
+            elif name == "SET_VERTICAL_SCALE":
+                value = float(params["value"])
+                if not 2e-3 <= value <= 5:
+                    self.addEvent(222, "Data out of range", 0x10)
+                else:
+                    self.verticalScale[Channels(params["channel"])] = value
+            elif name == "SET_VERTICAL_POSITION":
+                self.verticalPosition[Channels(params["channel"])] = float(params["value"])
+            elif name == "GET_HORIZONTAL_SCALE":
+                return {"value": self.horizontalScale}
+            elif name == "SET_HORIZONTAL_SCALE":
+                self.horizontalScale = float(params["value"])
+            elif name == "SET_HORIZONTAL_POSITION":
+                self.horizontalPosition = float(params["value"])
+            return None
+
     @classmethod
     def showHelp(cls, err=None):
         print("This OscilloscopeDevice works with Tektronik scopes only (and was tested with a TDS-1002)")
@@ -1,9 +1,11 @@
 from abc import ABC, abstractmethod
 from enum import Enum, IntEnum
-from threading import Thread, RLock
+from threading import Thread, RLock, Event
 
 from hardwarelibrary import utils
 from hardwarelibrary.capabilities import Capability
+from hardwarelibrary.statuscache import StatusCache
+from hardwarelibrary.notificationdispatch import postIfObserved
 from notificationcenter import NotificationCenter
 import typing
 import time
@@ -47,6 +49,11 @@ class PhysicalDevice(ABC):
     # disambiguated by serial number, and DeviceManager will not auto-probe it.
     usesGenericSerialConverter = False
 
+    # Keys of doGetStatusUserInfo() that name a capability getter's status
+    # field differently (e.g. {"interlockOk": "interlock"}), so that polls
+    # also fill the StatusCache for that getter.
+    statusFieldNames = {}
+
     def __init__(self, serialNumber:str, idProduct:int, idVendor:int):
         if serialNumber == "*" or serialNumber is None:
             serialNumber = ".*"
@@ -67,10 +74,21 @@ class PhysicalDevice(ABC):
         self.usbDevice = None
         self.port = None
 
+        # Optional ProbeCache (see hardwarelibrary.probecache): a driver may use
+        # it to skip re-reading identity and calibration it already knows.
+        self.probeCache = None
+
+        # Recently read status values, see hardwarelibrary.statuscache
+        self.statusCache = StatusCache()
+
         self.lock = RLock()
         self.quitMonitoring = False
         self.monitoring = None
         self.refreshInterval = 1.0
+        # Optional AdaptivePollPolicy (see hardwarelibrary.pollpolicy): when
+        # set, it replaces refreshInterval and only changes are posted.
+        self.pollPolicy = None
+        self.monitoringWakeUp = Event()
 
         # Cooperative base: forward to the rest of the MRO so capability mixins
         # mixed in alongside a device (e.g. WavelengthCalibrationCapability) get their
@@ -172,6 +190,7 @@ class PhysicalDevice(ABC):
                 raise PhysicalDevice.UnableToShutdown(error)
             finally:
                 self.state = DeviceState.Recognized
+                self.statusCache.invalidate()
                 if self.port is not None:
                     self.port.close()
                     self.port = None
@@ -180,26 +199,73 @@ class PhysicalDevice(ABC):
     def doShutdownDevice(self):
         ...
 
-    def startBackgroundStatusUpdates(self):
+    def startBackgroundStatusUpdates(self, scheduler=None):
+        """Post a status notification every refreshInterval seconds.
+
+        By default a dedicated thread is started. With a scheduler (see
+        hardwarelibrary.scheduler.DeviceScheduler), the updates are a repeating
+        task of that scheduler instead, sharing its threads with other devices.
+        """
         with self.lock:
             if not self.isMonitoring:
                 self.quitMonitoring = False
-                self.monitoring = Thread(target=self.backgroundStatusUpdates, name="Physical-Device-backgroundStatusUpdates")
-                self.monitoring.start()
+                self.monitoringWakeUp.clear()
+                if scheduler is not None:
+                    self.monitoring = scheduler.scheduleRepeating(self, self.postStatusUpdate, self.statusUpdateInterval)
+                else:
+                    self.monitoring = Thread(target=self.backgroundStatusUpdates, name="Physical-Device-backgroundStatusUpdates")
+                    self.monitoring.start()
             else:
                 raise RuntimeError("Monitoring loop already running")
 
     def backgroundStatusUpdates(self):
         while True:
-            user_info = self.doGetStatusUserInfo()
-
-            NotificationCenter().post_notification(PhysicalDeviceNotification.status, notifying_object=self,
-                                                  user_info=user_info)
+            self.postStatusUpdate()
 
             with self.lock:
                 if self.quitMonitoring:
                     break
-            time.sleep(self.refreshInterval)
+            self.monitoringWakeUp.wait(self.statusUpdateInterval)
+            self.monitoringWakeUp.clear()
+
+    @property
+    def statusUpdateInterval(self):
+        if self.pollPolicy is not None:
+            return self.pollPolicy.effectiveInterval
+        return self.refreshInterval
+
+    def pollSoon(self):
+        """Call after changing the device: background status updates return
+        to their fastest rate and the next one happens right away."""
+        if self.pollPolicy is not None:
+            self.pollPolicy.reset()
+        if isinstance(self.monitoring, Thread) or self.monitoring is None:
+            self.monitoringWakeUp.set()
+        else:
+            self.monitoring.scheduler.reschedule(self.monitoring)
+
+    def postStatusUpdate(self):
+        user_info = self.getStatusUserInfo()
+
+        if self.pollPolicy is not None:
+            isChanged = self.pollPolicy.update(user_info)
+            if not isinstance(self.monitoring, (Thread, type(None))):
+                # A scheduler task: its next run follows the adapted interval
+                self.monitoring.interval = self.pollPolicy.effectiveInterval
+            if not isChanged:
+                return
+
+        postIfObserved(PhysicalDeviceNotification.status, self, user_info)
+
+    def getStatusUserInfo(self):
+        """The status snapshot from doGetStatusUserInfo(), also stored in the
+        statusCache so that capability getters can use it."""
+        generation = self.statusCache.generation
+        user_info = self.doGetStatusUserInfo()
+        if isinstance(user_info, dict):
+            fields = {self.statusFieldNames.get(key, key): value for key, value in user_info.items()}
+            self.statusCache.storeAll(fields, generation=generation)
+        return user_info
 
     def doGetStatusUserInfo(self):
         return None
@@ -213,7 +279,11 @@ class PhysicalDevice(ABC):
         if self.isMonitoring:
             with self.lock:
                 self.quitMonitoring = True
-            self.monitoring.join()
+            self.monitoringWakeUp.set()
+            if isinstance(self.monitoring, Thread):
+                self.monitoring.join()
+            else:
+                self.monitoring.cancel(wait=True)
             self.monitoring = None
         else:
             raise RuntimeError("No status loop running")
@@ -0,0 +1,94 @@
+"""Adaptive status polling: poll fast while things change, back off when stable.
+
+A fixed poll interval is a compromise: short enough to follow a ramping laser,
+it wastes port bandwidth on a laser that has been stable for an hour. An
+AdaptivePollPolicy decides the interval from what the polls return:
+
+  * each poll whose status is unchanged multiplies the interval by
+    backoffFactor, up to maxInterval;
+  * a change, or a call to reset() (a command was just sent), brings it back
+    to minInterval;
+  * a numeric field only counts as changed when it moved by more than its
+    threshold from the value last reported, so noise does not keep the poll
+    fast while a slow drift is still reported eventually.
+
+update() tells whether the status changed, so that only changes are posted.
+
+Example::
+
+    from hardwarelibrary.pollpolicy import AdaptivePollPolicy
+
+    policy = AdaptivePollPolicy(minInterval=0.2, maxInterval=10,
+                                thresholds={"power": 0.01})
+    controller = DeviceController(laser, pollPolicy=policy)
+    ...
+    policy.effectiveRate   # current polls per second
+"""
+
+from numbers import Number
+from threading import RLock
+
+__all__ = ["AdaptivePollPolicy"]
+
+
+class AdaptivePollPolicy:
+    def __init__(self, minInterval=0.2, maxInterval=5.0, backoffFactor=2.0, thresholds=None):
+        if minInterval <= 0 or maxInterval < minInterval:
+            raise ValueError("Intervals must satisfy 0 < minInterval <= maxInterval")
+        if backoffFactor < 1:
+            raise ValueError("backoffFactor must be at least 1")
+
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.backoffFactor = backoffFactor
+        self.thresholds = dict(thresholds or {})
+        self.lock = RLock()
+        self.effectiveInterval = minInterval
+        self.lastReported = None
+
+    @property
+    def effectiveRate(self):
+        """Polls per second at the current interval."""
+        with self.lock:
+            return 1.0 / self.effectiveInterval
+
+    def reset(self, forgetStatus=False):
+        """Poll fast again, e.g. after a command. With forgetStatus, the next
+        status is considered changed (e.g. after a reconnection)."""
+        with self.lock:
+            self.effectiveInterval = self.minInterval
+            if forgetStatus:
+                self.lastReported = None
+
+    def hasChanged(self, status):
+        with self.lock:
+            if self.lastReported is None or status is None:
+                return status is not self.lastReported
+            if not isinstance(status, dict):
+                return status != self.lastReported
+
+            if status.keys() != self.lastReported.keys():
+                return True
+            for field, value in status.items():
+                if self.isFieldChanged(field, self.lastReported[field], value):
+                    return True
+            return False
+
+    def isFieldChanged(self, field, previous, value):
+        threshold = self.thresholds.get(field, 0)
+        if (isinstance(value, Number) and isinstance(previous, Number)
+                and not isinstance(value, bool) and not isinstance(previous, bool)):
+            return abs(value - previous) > threshold
+        return value != previous
+
+    def update(self, status):
+        """Account for a poll: return True if status changed (and should be
+        posted), and adjust effectiveInterval."""
+        with self.lock:
+            if self.hasChanged(status):
+                self.lastReported = dict(status) if isinstance(status, dict) else status
+                self.effectiveInterval = self.minInterval
+                return True
+
+            self.effectiveInterval = min(self.maxInterval, self.effectiveInterval * self.backoffFactor)
+            return False
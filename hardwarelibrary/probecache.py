@@ -0,0 +1,167 @@
+"""An on-disk cache of what was learned the last time a USB device was probed.
+
+Identifying a device is expensive: DeviceManager instantiates every candidate
+class for a VID/PID and initializes each until one succeeds, and a driver such
+as OISpectrometer then reads its serial number, its calibration coefficients
+and its status over USB. None of that changes between two connections of the
+same unit, so the ProbeCache remembers it, keyed by (idVendor, idProduct,
+serialNumber):
+
+  * the driver class that recognized the device, so the next connection (or the
+    next process) tries that class first and skips the others;
+  * an identity dict (e.g. the serial number stored in the instrument, a
+    firmware version), which the driver compares against a single fresh read to
+    confirm the cached data still describes the connected unit;
+  * a calibration dict the driver can restore instead of reading it again.
+
+A device without a real serial number (None, or the ".*" wildcard) is never
+cached: two such units would share the same key. Entries are invalidated
+explicitly with invalidate() (a driver does it when its identity check fails)
+or all at once with clear().
+
+The cache is plain JSON, written atomically after every change. It is
+deliberately opt-in (DeviceManager.probeCache and PhysicalDevice.probeCache
+default to None) so that nothing is written to disk unless asked for.
+
+Example::
+
+    from hardwarelibrary.devicemanager import DeviceManager
+    from hardwarelibrary.probecache import ProbeCache
+
+    DeviceManager().probeCache = ProbeCache()   # ~/.hardwarelibrary/probecache.json
+    DeviceManager().startMonitoring()
+"""
+
+import json
+import os
+from pathlib import Path
+from threading import RLock
+
+__all__ = ["ProbeCache"]
+
+
+class ProbeCache:
+    formatVersion = 1
+
+    def __init__(self, path=None):
+        """Open (or create on first write) the cache stored at path.
+
+        path defaults to ProbeCache.defaultPath(). Pass path=False for a
+        memory-only cache that is never written to disk (useful in tests).
+        """
+        if path is None:
+            path = ProbeCache.defaultPath()
+        self.path = Path(path) if path is not False else None
+        self.lock = RLock()
+        self.entries = {}
+        self.load()
+
+    @classmethod
+    def defaultPath(cls):
+        return Path.home().joinpath(".hardwarelibrary", "probecache.json")
+
+    @classmethod
+    def key(cls, idVendor, idProduct, serialNumber):
+        """The cache key for a device, or None if it cannot be cached."""
+        if idVendor is None or idProduct is None:
+            return None
+        if serialNumber is None or serialNumber in ("", "*", ".*"):
+            return None
+        return "{0:04x}:{1:04x}:{2}".format(idVendor, idProduct, serialNumber)
+
+    @classmethod
+    def className(cls, deviceClass):
+        return "{0}.{1}".format(deviceClass.__module__, deviceClass.__qualname__)
+
+    def load(self):
+        with self.lock:
+            self.entries = {}
+            if self.path is None or not self.path.exists():
+                return
+            try:
+                with open(self.path, "r") as cacheFile:
+                    content = json.load(cacheFile)
+            except (OSError, ValueError):
+                # A corrupted or unreadable cache is only a lost optimization:
+                # start over rather than fail the connection.
+                return
+            if content.get("formatVersion") == self.formatVersion:
+                self.entries = content.get("entries", {})
+
+    def save(self):
+        with self.lock:
+            if self.path is None:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temporaryPath = self.path.with_name(self.path.name + ".tmp")
+            with open(temporaryPath, "w") as cacheFile:
+                json.dump({"formatVersion": self.formatVersion, "entries": self.entries},
+                          cacheFile, indent=2, sort_keys=True)
+            os.replace(temporaryPath, self.path)
+
+    def entry(self, idVendor, idProduct, serialNumber):
+        """A copy of the cached entry for the device, or None."""
+        key = self.key(idVendor, idProduct, serialNumber)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            return json.loads(json.dumps(entry))
+
+    def driverClassName(self, idVendor, idProduct, serialNumber):
+        entry = self.entry(idVendor, idProduct, serialNumber)
+        if entry is None:
+            return None
+        return entry.get("driverClass")
+
+    def identity(self, idVendor, idProduct, serialNumber):
+        entry = self.entry(idVendor, idProduct, serialNumber)
+        if entry is None:
+            return None
+        return entry.get("identity")
+
+    def calibration(self, idVendor, idProduct, serialNumber):
+        entry = self.entry(idVendor, idProduct, serialNumber)
+        if entry is None:
+            return None
+        return entry.get("calibration")
+
+    def update(self, idVendor, idProduct, serialNumber, driverClass=None,
+               identity=None, calibration=None):
+        """Merge what was learned about a device into its entry and save.
+
+        driverClass is a class (stored by qualified name); identity and
+        calibration are JSON-serializable dicts that replace the cached ones.
+        Returns False when the device cannot be cached (no serial number).
+        """
+        key = self.key(idVendor, idProduct, serialNumber)
+        if key is None:
+            return False
+
+        with self.lock:
+            entry = self.entries.setdefault(key, {})
+            if driverClass is not None:
+                entry["driverClass"] = self.className(driverClass)
+            if identity is not None:
+                entry["identity"] = dict(identity)
+            if calibration is not None:
+                entry["calibration"] = dict(calibration)
+            self.save()
+        return True
+
+    def invalidate(self, idVendor, idProduct, serialNumber):
+        """Forget everything about one device."""
+        key = self.key(idVendor, idProduct, serialNumber)
+        with self.lock:
+            if self.entries.pop(key, None) is not None:
+                self.save()
+
+    def clear(self):
+        """Forget everything about every device."""
+        with self.lock:
+            self.entries = {}
+            self.save()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
@@ -0,0 +1,547 @@
+"""Append-only recording of array time series (spectra, frames) to disk.
+
+Writing one CSV row per value takes milliseconds per spectrum and cannot keep
+up with a kinetics run. An ArrayRecorder appends arrays of a fixed shape and
+their timestamps to a binary file, from a background thread:
+
+  * append() copies the array into a preallocated chunk of `chunkSize` rows and
+    returns; full chunks are written by the writer thread in one write. When
+    the disk falls behind and every chunk is waiting to be written, append()
+    waits, or drops the array (counted) with dropWhenBehind=True.
+  * the default format is a directory with data.npy (leading axis growing
+    with each chunk written) and timestamps.npy. Their headers are rewritten
+    with the current length after each chunk, so the files can be opened while
+    the recording goes on. With a path ending in .h5 or .hdf5, an HDF5 file
+    with resizable datasets is written instead (requires h5py).
+  * with compression="zlib", each chunk is compressed (lossless) by the writer
+    thread: data.npy is replaced by data.zlib, the compressed chunks one after
+    the other, and chunks.npy, their offsets and lengths. HDF5 datasets use
+    gzip (the same zlib compression) instead.
+  * metadata (a JSON-compatible dict, e.g. a calibration) and constant arrays
+    (e.g. the wavelength axis) are stored once.
+  * statistics() tells whether the disk keeps up: chunks waiting to be
+    written, arrays dropped, and the bandwidth of the writer
+    (bytesWritten/writeTime).
+
+ArrayRecording reads a recording back, memory-mapped: slicing it only reads
+the rows needed (only decompresses the chunks needed).
+
+Example::
+
+    recorder = ArrayRecorder("kinetics", metadata={"integrationTime": 10},
+                             arrays={"wavelength": spectrometer.wavelength})
+    for i in range(1000000):
+        recorder.append(spectrometer.getSpectrum())
+    recorder.close()
+
+    recording = ArrayRecording("kinetics")
+    recording.data[1000:2000].mean(axis=0)
+"""
+
+import json
+import os
+import time
+import zlib
+from collections import deque
+from enum import Enum
+from queue import Queue
+from threading import Condition, Event, RLock, Thread
+from typing import NamedTuple
+
+__all__ = ["ArrayRecorder", "ArrayRecording", "RecordingFormat", "RecorderStatistics"]
+
+
+class RecordingFormat(Enum):
+    npy = "npy"       # a directory of .npy files and metadata.json
+    hdf5 = "hdf5"     # a single HDF5 file (h5py)
+
+    @classmethod
+    def fromPath(cls, path):
+        if os.path.splitext(str(path))[1].lower() in (".h5", ".hdf5"):
+            return cls.hdf5
+        return cls.npy
+
+
+class RecorderStatistics(NamedTuple):
+    appended: int = 0       # arrays accepted by append()
+    written: int = 0        # arrays written to disk
+    dropped: int = 0        # arrays dropped because the writer was behind
+    pendingChunks: int = 0  # full chunks waiting for the writer
+    maxPendingChunks: int = 0
+    bytesWritten: int = 0   # bytes written to disk (compressed if compressed)
+    writeTime: float = 0.0  # seconds the writer spent writing
+
+    @property
+    def writeBandwidth(self):
+        """Bytes per second the disk accepted while writing."""
+        return self.bytesWritten/self.writeTime if self.writeTime > 0 else 0.0
+
+
+class NpyFile:
+    """An .npy file whose leading axis grows as rows are appended. The header
+    is padded to a fixed size so it can be rewritten in place."""
+    headerSize = 256
+
+    def __init__(self, path, shape, dtype):
+        import numpy as np
+
+        self.shape = tuple(shape)
+        self.descr = np.lib.format.dtype_to_descr(np.dtype(dtype))
+        self.count = 0
+        self.file = open(path, "wb")
+        self.writeHeader()
+
+    def header(self):
+        dictionary = "{{'descr': {0!r}, 'fortran_order': False, 'shape': {1!r}, }}".format(
+                     self.descr, (self.count, *self.shape))
+        length = self.headerSize - 10
+        if len(dictionary) + 1 > length:
+            raise ValueError("Array shape too long for the .npy header")
+        return b"\x93NUMPY\x01\x00" + length.to_bytes(2, "little") + (dictionary.ljust(length - 1) + "\n").encode("latin1")
+
+    def writeHeader(self):
+        self.file.seek(0)
+        self.file.write(self.header())
+        self.file.seek(0, os.SEEK_END)
+
+    def append(self, rows):
+        self.file.write(memoryview(rows).cast("B"))
+        self.count += len(rows)
+        return rows.nbytes
+
+    def flush(self):
+        self.writeHeader()
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class CompressedChunkFile:
+    """Chunks of rows compressed with zlib one after the other, and their
+    index (offset, bytes and rows of each chunk), rewritten on flush()."""
+
+    def __init__(self, path, indexPath, level):
+        self.indexPath = indexPath
+        self.level = level
+        self.chunks = []
+        self.offset = 0
+        self.count = 0
+        self.file = open(path, "wb")
+
+    def append(self, rows):
+        compressed = zlib.compress(memoryview(rows).cast("B"), self.level)
+        self.file.write(compressed)
+        self.chunks.append((self.offset, len(compressed), len(rows)))
+        self.offset += len(compressed)
+        self.count += len(rows)
+        return len(compressed)
+
+    def flush(self):
+        import numpy as np
+
+        self.file.flush()
+        # Replaced in one step so a reader never sees a partial index
+        temporaryPath = self.indexPath + ".tmp"
+        with open(temporaryPath, "wb") as file:
+            np.save(file, np.array(self.chunks, dtype=np.int64).reshape(-1, 3))
+        os.replace(temporaryPath, self.indexPath)
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class NpyWriter:
+    def __init__(self, path, shape, dtype, metadata, arrays, compression=None, compressionLevel=1):
+        import numpy as np
+
+        os.makedirs(path, exist_ok=True)
+        if compression is None:
+            self.data = NpyFile(os.path.join(path, "data.npy"), shape, dtype)
+        elif compression == "zlib":
+            self.data = CompressedChunkFile(os.path.join(path, "data.zlib"),
+                                            os.path.join(path, "chunks.npy"), compressionLevel)
+        else:
+            raise ValueError("Unknown compression {0}".format(compression))
+        self.timestamps = NpyFile(os.path.join(path, "timestamps.npy"), (), np.float64)
+        with open(os.path.join(path, "metadata.json"), "w") as file:
+            json.dump({"metadata": metadata, "arrays": sorted(arrays), "compression": compression,
+                       "shape": list(shape), "dtype": np.lib.format.dtype_to_descr(np.dtype(dtype))},
+                      file, indent=2)
+        for name, array in arrays.items():
+            np.save(os.path.join(path, name + ".npy"), np.asarray(array))
+
+    def append(self, rows, timestamps):
+        written = self.data.append(rows)
+        return written + self.timestamps.append(timestamps)
+
+    def flush(self):
+        # Data first: a reader never sees a length larger than what is on disk
+        self.data.flush()
+        self.timestamps.flush()
+
+    def close(self):
+        self.data.close()
+        self.timestamps.close()
+
+
+class Hdf5Writer:
+    def __init__(self, path, shape, dtype, metadata, arrays, chunkSize, compression=None, compressionLevel=1):
+        import h5py
+        import numpy as np
+
+        if compression not in (None, "zlib"):
+            raise ValueError("Unknown compression {0}".format(compression))
+        self.file = h5py.File(path, "w")
+        self.data = self.file.create_dataset("data", shape=(0, *shape), maxshape=(None, *shape),
+                                             dtype=dtype, chunks=(chunkSize, *shape),
+                                             compression="gzip" if compression else None,
+                                             compression_opts=compressionLevel if compression else None)
+        self.timestamps = self.file.create_dataset("timestamps", shape=(0,), maxshape=(None,),
+                                                   dtype=np.float64, chunks=(chunkSize,))
+        self.file.attrs["metadata"] = json.dumps(metadata)
+        for name, array in arrays.items():
+            self.file.create_dataset(name, data=np.asarray(array))
+
+    def append(self, rows, timestamps):
+        count = len(self.data)
+        self.data.resize(count + len(rows), axis=0)
+        self.data[count:] = rows
+        self.timestamps.resize(count + len(rows), axis=0)
+        self.timestamps[count:] = timestamps
+        return rows.nbytes + timestamps.nbytes
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ArrayRecorder:
+    def __init__(self, path, shape=None, dtype=None, metadata=None, arrays=None, format=None,
+                 chunkSize=256, maxPendingChunks=8, dropWhenBehind=False,
+                 compression=None, compressionLevel=1):
+        """The shape and dtype of the arrays are those of the first array
+        appended if not given. At most (maxPendingChunks + 1)*chunkSize arrays
+        are held in memory. compression is None or "zlib"."""
+        self.path = str(path)
+        self.shape = None if shape is None else tuple(shape)
+        self.dtype = dtype
+        self.metadata = dict(metadata or {})
+        self.arrays = dict(arrays or {})
+        self.format = format if format is not None else RecordingFormat.fromPath(self.path)
+        self.chunkSize = chunkSize
+        self.maxPendingChunks = maxPendingChunks
+        self.dropWhenBehind = dropWhenBehind
+        self.compression = compression
+        self.compressionLevel = compressionLevel
+
+        self.lock = RLock()
+        self.condition = Condition(self.lock)
+        self.freeChunks = deque()
+        self.chunk = None           # (rows, timestamps) being filled
+        self.rows = 0
+        self.queue = Queue()
+        self.writer = None
+        self.thread = None
+        self.isClosed = False
+        self.writeError = None
+
+        self.appended = 0
+        self.written = 0
+        self.dropped = 0
+        self.pendingChunks = 0
+        self.mostPendingChunks = 0
+        self.bytesWritten = 0
+        self.writeTime = 0.0
+
+    @property
+    def isRecording(self):
+        return self.thread is not None
+
+    def start(self):
+        """Create the files and start the writer thread. Called by the first
+        append() if needed."""
+        import numpy as np
+
+        with self.lock:
+            if self.thread is not None:
+                return
+            if self.shape is None or self.dtype is None:
+                raise ValueError("The shape and dtype must be known to start recording")
+
+            if self.format == RecordingFormat.hdf5:
+                self.writer = Hdf5Writer(self.path, self.shape, self.dtype, self.metadata,
+                                         self.arrays, self.chunkSize, self.compression,
+                                         self.compressionLevel)
+            else:
+                self.writer = NpyWriter(self.path, self.shape, self.dtype, self.metadata, self.arrays,
+                                        self.compression, self.compressionLevel)
+
+            for i in range(self.maxPendingChunks + 1):
+                self.freeChunks.append((np.empty((self.chunkSize, *self.shape), dtype=self.dtype),
+                                        np.empty(self.chunkSize, dtype=np.float64)))
+            self.chunk = self.freeChunks.popleft()
+            self.rows = 0
+            self.thread = Thread(target=self.writeLoop, name="ArrayRecorder", daemon=True)
+            self.thread.start()
+
+    def append(self, array, timestamp=None):
+        """Copy array (and its time.time() timestamp) for writing. Returns
+        False if it was dropped because the writer is behind."""
+        import numpy as np
+
+        if timestamp is None:
+            timestamp = time.time()
+        with self.lock:
+            if self.isClosed:
+                raise RuntimeError("Recorder is closed")
+            if self.writeError is not None:
+                raise self.writeError
+            if self.thread is None:
+                if self.shape is None:
+                    self.shape = np.shape(array)
+                if self.dtype is None:
+                    self.dtype = np.asarray(array).dtype
+                self.start()
+
+            if self.chunk is None:
+                if not self.nextChunk():
+                    self.dropped += 1
+                    return False
+
+            rows, timestamps = self.chunk
+            np.copyto(rows[self.rows], array, casting="unsafe")
+            timestamps[self.rows] = timestamp
+            self.rows += 1
+            self.appended += 1
+            if self.rows == self.chunkSize:
+                self.submitChunk()
+            return True
+
+    def nextChunk(self):
+        # With the lock held: get an empty chunk, waiting for the writer unless
+        # dropWhenBehind.
+        while len(self.freeChunks) == 0:
+            if self.dropWhenBehind or self.writeError is not None:
+                return False
+            self.condition.wait()
+        self.chunk = self.freeChunks.popleft()
+        self.rows = 0
+        return True
+
+    def submitChunk(self):
+        if self.chunk is not None and self.rows > 0:
+            self.queue.put((self.chunk, self.rows, None))
+            self.pendingChunks += 1
+            self.mostPendingChunks = max(self.mostPendingChunks, self.pendingChunks)
+            self.chunk = None
+            self.rows = 0
+
+    def flush(self, timeout=None):
+        """Write everything appended so far and update the file headers.
+        Raises the error that stopped the writer thread, if any."""
+        with self.lock:
+            if self.writeError is not None:
+                raise self.writeError
+            if self.thread is None:
+                return True
+            self.submitChunk()
+            done = Event()
+            self.queue.put((None, 0, done))
+        isDone = done.wait(timeout)
+        with self.lock:
+            if self.writeError is not None:
+                raise self.writeError
+        return isDone
+
+    def close(self):
+        """Write what remains, close the files and stop the writer thread."""
+        with self.lock:
+            if self.isClosed:
+                return
+            self.isClosed = True
+            thread = self.thread
+            if thread is not None:
+                self.submitChunk()
+                self.queue.put(None)
+        if thread is not None:
+            thread.join()
+        with self.lock:
+            self.thread = None
+            if self.writeError is not None:
+                raise self.writeError
+
+    def statistics(self):
+        with self.lock:
+            return RecorderStatistics(appended=self.appended, written=self.written,
+                                      dropped=self.dropped, pendingChunks=self.pendingChunks,
+                                      maxPendingChunks=self.mostPendingChunks,
+                                      bytesWritten=self.bytesWritten, writeTime=self.writeTime)
+
+    # -- writer thread --
+
+    def writeLoop(self):
+        done = None
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    return
+                chunk, rows, done = item
+                if chunk is not None:
+                    self.writeChunk(chunk, rows)
+                if done is not None:
+                    self.writer.flush()
+                    done.set()
+        except Exception as err:
+            with self.lock:
+                self.writeError = err
+                self.condition.notify_all()
+                # Nothing reads the queue anymore: wake up the flush() calls waiting
+                while not self.queue.empty():
+                    item = self.queue.get_nowait()
+                    if item is not None and item[2] is not None:
+                        item[2].set()
+                if done is not None:
+                    done.set()
+        finally:
+            self.writer.close()
+
+    def writeChunk(self, chunk, rows):
+        data, timestamps = chunk
+        startTime = time.perf_counter()
+        written = self.writer.append(data[:rows], timestamps[:rows])
+        self.writer.flush()
+        duration = time.perf_counter() - startTime
+        with self.lock:
+            self.bytesWritten += written
+            self.writeTime += duration
+            self.written += rows
+            self.pendingChunks -= 1
+            self.freeChunks.append(chunk)
+            self.condition.notify_all()
+
+
+class CompressedArray:
+    """The data of a compressed recording, read like an array along its first
+    axis: only the chunks holding the rows asked for are decompressed (the
+    last one is kept)."""
+
+    def __init__(self, path, indexPath, shape, dtype):
+        import numpy as np
+
+        self.path = path
+        self.rowShape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.chunks = np.load(indexPath)
+        self.starts = np.concatenate(([0], np.cumsum(self.chunks[:, 2])))
+        self.count = int(self.starts[-1])
+        self.cachedChunk = None
+        self.cachedRows = None
+
+    @property
+    def shape(self):
+        return (self.count, *self.rowShape)
+
+    def __len__(self):
+        return self.count
+
+    def chunkRows(self, chunk):
+        if self.cachedChunk != chunk:
+            import numpy as np
+
+            offset, size, rows = self.chunks[chunk]
+            with open(self.path, "rb") as file:
+                file.seek(int(offset))
+                compressed = file.read(int(size))
+            self.cachedRows = np.frombuffer(zlib.decompress(compressed),
+                                            dtype=self.dtype).reshape(int(rows), *self.rowShape)
+            self.cachedChunk = chunk
+        return self.cachedRows
+
+    def __getitem__(self, index):
+        import numpy as np
+
+        if isinstance(index, tuple):
+            rows = self[index[0]]
+            if isinstance(index[0], (int, np.integer)):
+                return rows[index[1:]]
+            return rows[(slice(None), *index[1:])]
+
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += self.count
+            if not 0 <= index < self.count:
+                raise IndexError("index {0} out of range".format(index))
+            chunk = int(np.searchsorted(self.starts, index, side="right")) - 1
+            return self.chunkRows(chunk)[index - self.starts[chunk]]
+
+        indices = np.arange(self.count)[index]
+        result = np.empty((len(indices), *self.rowShape), dtype=self.dtype)
+        chunks = np.searchsorted(self.starts, indices, side="right") - 1
+        for chunk in np.unique(chunks):
+            selected = chunks == chunk
+            result[selected] = self.chunkRows(int(chunk))[indices[selected] - self.starts[chunk]]
+        return result
+
+    def __array__(self, dtype=None):
+        data = self[:]
+        return data if dtype is None else data.astype(dtype)
+
+
+class ArrayRecording:
+    """A recording made by ArrayRecorder, memory-mapped (npy), decompressed on
+    access (zlib) or read lazily (HDF5). data and timestamps can be sliced like
+    arrays; arrays holds the constant arrays (e.g. wavelength) and metadata the
+    metadata dict."""
+
+    def __init__(self, path, format=None):
+        import numpy as np
+
+        self.path = str(path)
+        self.format = format if format is not None else RecordingFormat.fromPath(self.path)
+        self.file = None
+        if self.format == RecordingFormat.hdf5:
+            import h5py
+
+            self.file = h5py.File(self.path, "r")
+            self.data = self.file["data"]
+            self.timestamps = self.file["timestamps"]
+            self.metadata = json.loads(self.file.attrs["metadata"])
+            self.arrays = {name: self.file[name][()] for name in self.file
+                           if name not in ("data", "timestamps")}
+        else:
+            with open(os.path.join(self.path, "metadata.json")) as file:
+                description = json.load(file)
+            self.metadata = description["metadata"]
+            self.arrays = {name: np.load(os.path.join(self.path, name + ".npy"))
+                           for name in description["arrays"]}
+            self.timestamps = np.load(os.path.join(self.path, "timestamps.npy"), mmap_mode="r")
+            if description.get("compression") == "zlib":
+                self.data = CompressedArray(os.path.join(self.path, "data.zlib"),
+                                            os.path.join(self.path, "chunks.npy"),
+                                            description["shape"], description["dtype"])
+            else:
+                self.data = np.load(os.path.join(self.path, "data.npy"), mmap_mode="r")
+            # A recording in progress may have more rows on disk than in its header
+            count = min(len(self.data), len(self.timestamps))
+            if isinstance(self.data, CompressedArray):
+                self.data.count = count
+            else:
+                self.data = self.data[:count]
+            self.timestamps = self.timestamps[:count]
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        return self.data[index]
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
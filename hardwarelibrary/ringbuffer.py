@@ -0,0 +1,212 @@
+"""A fixed pool of preallocated arrays passed from a producer thread to a consumer.
+
+Streaming acquisitions (spectra, camera frames) produce arrays of the same
+shape over and over. Allocating each one, and queueing them without bound,
+costs time in the reader thread and memory when the consumer falls behind. A
+RingBuffer owns `capacity` preallocated slots in a single NumPy array:
+
+  * the producer fills a slot (write(), or acquireSlot()/commitSlot() to read
+    directly into it) and commits it with a timestamp;
+  * the consumer gets the committed slots in order as Frames with get(), or
+    only the most recent one with latest(). A Frame's data is a view on its
+    slot: the slot is handed back to the producer on the next get()/latest()
+    or on release(), so copy the data to keep it longer;
+  * when every slot is full, OverflowPolicy.dropOldest reuses the oldest
+    frame not yet consumed (counted as dropped), and OverflowPolicy.block
+    makes the producer wait for the consumer.
+
+With the default capacity of 3, the producer writes one slot while the
+consumer holds another and the third holds the next frame (triple buffering).
+
+Example::
+
+    ring = RingBuffer(shape=(2048,), dtype=np.uint16, capacity=3)
+    # producer thread
+    ring.write(spectrum)
+    # consumer thread
+    for frame in ring:
+        process(frame.index, frame.timestamp, frame.data)
+"""
+
+import time
+from collections import deque
+from enum import Enum
+from threading import Condition, RLock
+from typing import NamedTuple
+
+__all__ = ["RingBuffer", "OverflowPolicy", "Frame", "RingBufferStatistics"]
+
+
+class OverflowPolicy(Enum):
+    dropOldest = "dropOldest"   # overwrite the oldest frame not yet consumed
+    block = "block"             # wait until the consumer releases a slot
+
+
+class Frame(NamedTuple):
+    index: int          # sequence number of the frame, from 0
+    timestamp: float    # time.time() when the frame was committed
+    data: object        # np.ndarray view on the slot, valid until released
+
+
+class RingBufferStatistics(NamedTuple):
+    written: int = 0    # frames committed by the producer
+    consumed: int = 0   # frames returned by get() or latest()
+    dropped: int = 0    # frames overwritten or skipped before being consumed
+    queued: int = 0     # frames committed and not consumed yet
+
+
+class RingBuffer:
+    def __init__(self, shape, dtype, capacity=3, policy=OverflowPolicy.dropOldest):
+        import numpy as np
+
+        if capacity < 2:
+            raise ValueError("A RingBuffer needs at least 2 slots")
+        if isinstance(shape, int):
+            shape = (shape,)
+
+        self.slots = np.zeros((capacity, *shape), dtype=dtype)
+        self.capacity = capacity
+        self.policy = policy
+        self.lock = RLock()
+        self.condition = Condition(self.lock)
+        self.free = deque(range(capacity))
+        self.ready = deque()        # (slot, index, timestamp) in commit order
+        self.held = None            # slot of the frame the consumer has
+        self.isClosed = False
+
+        self.written = 0
+        self.consumed = 0
+        self.dropped = 0
+
+    @property
+    def shape(self):
+        return self.slots.shape[1:]
+
+    @property
+    def dtype(self):
+        return self.slots.dtype
+
+    def statistics(self):
+        with self.lock:
+            return RingBufferStatistics(written=self.written, consumed=self.consumed,
+                                        dropped=self.dropped, queued=len(self.ready))
+
+    def slot(self, slot):
+        """The array of a slot obtained from acquireSlot()."""
+        return self.slots[slot]
+
+    # -- producer --
+
+    def acquireSlot(self, timeout=None):
+        """A slot to fill, or None if the buffer is closed or, with
+        OverflowPolicy.block, timeout elapsed."""
+        with self.lock:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self.isClosed:
+                if len(self.free) > 0:
+                    return self.free.popleft()
+                if self.policy == OverflowPolicy.dropOldest and len(self.ready) > 0:
+                    slot, _, _ = self.ready.popleft()
+                    self.dropped += 1
+                    return slot
+
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+            return None
+
+    def commitSlot(self, slot, timestamp=None):
+        """Make a filled slot available to the consumer. Returns its index."""
+        if timestamp is None:
+            timestamp = time.time()
+        with self.lock:
+            index = self.written
+            self.written += 1
+            self.ready.append((slot, index, timestamp))
+            self.condition.notify_all()
+            return index
+
+    def abandonSlot(self, slot):
+        """Give back a slot that could not be filled (e.g. the read failed)."""
+        with self.lock:
+            self.free.append(slot)
+            self.condition.notify_all()
+
+    def write(self, data, timestamp=None, timeout=None):
+        """Copy data into a slot and commit it. Returns the frame index, or
+        None if no slot could be obtained."""
+        import numpy as np
+
+        slot = self.acquireSlot(timeout)
+        if slot is None:
+            return None
+        np.copyto(self.slots[slot], data, casting='unsafe')
+        return self.commitSlot(slot, timestamp)
+
+    def close(self):
+        """Wake up and stop the producer and the consumer. Frames already
+        committed can still be consumed."""
+        with self.lock:
+            self.isClosed = True
+            self.condition.notify_all()
+
+    # -- consumer --
+
+    def get(self, timeout=None):
+        """The oldest frame not consumed yet, or None if timeout elapsed or the
+        buffer was closed and emptied. The previous frame is released."""
+        with self.lock:
+            self.releaseHeld()
+            if not self.waitForFrame(timeout):
+                return None
+            return self.checkOut(self.ready.popleft())
+
+    def latest(self, timeout=None):
+        """The most recent frame, skipping (and counting as dropped) older
+        ones not consumed yet. None as for get()."""
+        with self.lock:
+            self.releaseHeld()
+            if not self.waitForFrame(timeout):
+                return None
+            while len(self.ready) > 1:
+                slot, _, _ = self.ready.popleft()
+                self.free.append(slot)
+                self.dropped += 1
+            return self.checkOut(self.ready.popleft())
+
+    def release(self):
+        """Hand the frame last returned back to the producer."""
+        with self.lock:
+            self.releaseHeld()
+
+    def __iter__(self):
+        """Frames in order, until the buffer is closed and emptied."""
+        while True:
+            frame = self.get()
+            if frame is None:
+                return
+            yield frame
+
+    def waitForFrame(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while len(self.ready) == 0:
+            if self.isClosed:
+                return False
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            self.condition.wait(remaining)
+        return True
+
+    def checkOut(self, entry):
+        slot, index, timestamp = entry
+        self.held = slot
+        self.consumed += 1
+        return Frame(index=index, timestamp=timestamp, data=self.slots[slot])
+
+    def releaseHeld(self):
+        if self.held is not None:
+            self.free.append(self.held)
+            self.held = None
+            self.condition.notify_all()
@@ -0,0 +1,268 @@
+"""A shared scheduler running periodic and one-shot device work on a few threads.
+
+A DeviceController, or a PhysicalDevice with background status updates, used to
+own a thread that spends nearly all its time asleep. With dozens of instruments
+that is dozens of idle threads competing for the GIL, and their sleeps drift.
+A DeviceScheduler replaces them: one dispatcher thread keeps every pending task
+in a heap ordered by due time and hands due tasks to a bounded pool of workers.
+
+Tasks belong to an owner (usually the device or its controller). Tasks of the
+same owner never run concurrently and run in the order they became due, so an
+owner's port is never accessed from two workers at once; tasks of different
+owners run in parallel, up to maxWorkers.
+
+Repeating tasks are scheduled at a fixed rate (due, due + interval, ...). When
+a task runs so late that it missed its next slot, the missed runs are skipped
+rather than executed back-to-back. How late tasks start (the slip) is recorded
+and available from statistics().
+
+Example::
+
+    from hardwarelibrary.scheduler import DeviceScheduler
+
+    scheduler = DeviceScheduler(maxWorkers=4)
+    device.startBackgroundStatusUpdates(scheduler=scheduler)
+    controller = DeviceController(otherDevice, scheduler=scheduler)
+    controller.start()
+    ...
+    print(scheduler.statistics())
+    scheduler.stop()
+"""
+
+import heapq
+import itertools
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Event, RLock, Thread
+from typing import NamedTuple
+
+__all__ = ["DeviceScheduler", "ScheduledTask", "SchedulerStatistics"]
+
+
+class SchedulerStatistics(NamedTuple):
+    executed: int = 0       # number of task runs
+    skipped: int = 0        # repeating runs dropped because they were missed
+    meanSlip: float = 0.0   # seconds between due time and actual start
+    maxSlip: float = 0.0
+    failed: int = 0         # runs that raised an exception
+
+
+class ScheduledTask:
+    """A handle on work registered with a DeviceScheduler."""
+
+    def __init__(self, scheduler, owner, action, dueTime, interval=None):
+        self.scheduler = scheduler
+        self.owner = owner
+        self.action = action
+        self.dueTime = dueTime
+        self.interval = interval
+        self.isCancelled = False
+        self.isRescheduled = False
+        self.lastError = None
+        self.idle = Event()
+        self.idle.set()
+
+    @property
+    def isRepeating(self):
+        return self.interval is not None
+
+    def cancel(self, wait=False, timeout=None):
+        """Prevent any further run. With wait=True, also wait for a run in
+        progress to finish (never do this from the task itself)."""
+        self.isCancelled = True
+        self.scheduler.wakeUp()
+        if wait:
+            return self.idle.wait(timeout)
+        return True
+
+
+class DeviceScheduler:
+    _shared = None
+
+    def __init__(self, maxWorkers=4, name="DeviceScheduler"):
+        self.maxWorkers = maxWorkers
+        self.name = name
+        self.lock = RLock()
+        self.condition = Condition(self.lock)
+        self.heap = []
+        self.sequence = itertools.count()
+        self.backlogs = {}          # owner -> deque of due tasks waiting for the owner
+        self.busyOwners = set()
+        self.executor = None
+        self.dispatcher = None
+        self.quitDispatching = False
+
+        self.executed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.totalSlip = 0.0
+        self.maxSlip = 0.0
+
+    @classmethod
+    def shared(cls):
+        """A process-wide scheduler, created on first use."""
+        if cls._shared is None:
+            cls._shared = DeviceScheduler()
+        return cls._shared
+
+    @property
+    def isRunning(self):
+        with self.lock:
+            return self.dispatcher is not None
+
+    def start(self):
+        with self.lock:
+            if self.dispatcher is not None:
+                return
+            self.quitDispatching = False
+            self.executor = ThreadPoolExecutor(max_workers=self.maxWorkers,
+                                               thread_name_prefix=self.name + "-Worker")
+            self.dispatcher = Thread(target=self.dispatchLoop, name=self.name, daemon=True)
+            self.dispatcher.start()
+
+    def stop(self, wait=True):
+        """Stop dispatching. Pending tasks are dropped; with wait=True, runs
+        in progress are allowed to finish."""
+        with self.lock:
+            if self.dispatcher is None:
+                return
+            self.quitDispatching = True
+            self.condition.notify_all()
+            dispatcher, executor = self.dispatcher, self.executor
+        dispatcher.join()
+        executor.shutdown(wait=wait)
+        with self.lock:
+            self.dispatcher = None
+            self.executor = None
+            self.heap = []
+            self.backlogs = {}
+            self.busyOwners = set()
+
+    def schedule(self, owner, action, delay=0.0):
+        """Run action() once, delay seconds from now."""
+        task = ScheduledTask(self, owner, action, time.monotonic() + delay)
+        self.push(task)
+        return task
+
+    def scheduleRepeating(self, owner, action, interval, initialDelay=0.0):
+        """Run action() every interval seconds until the task is cancelled."""
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        task = ScheduledTask(self, owner, action, time.monotonic() + initialDelay, interval)
+        self.push(task)
+        return task
+
+    def reschedule(self, task, delay=0.0):
+        """Move the next run of a pending task to delay seconds from now. A
+        repeating task then continues at its interval from that run."""
+        with self.lock:
+            if task.isCancelled:
+                return
+            task.dueTime = time.monotonic() + delay
+            if not task.idle.is_set():
+                # Running: run() queues it again when it returns
+                task.isRescheduled = True
+                return
+        self.push(task)
+
+    def push(self, task):
+        self.start()
+        with self.lock:
+            heapq.heappush(self.heap, (task.dueTime, next(self.sequence), task))
+            self.condition.notify()
+
+    def wakeUp(self):
+        with self.lock:
+            self.condition.notify()
+
+    def statistics(self):
+        with self.lock:
+            meanSlip = self.totalSlip / self.executed if self.executed > 0 else 0.0
+            return SchedulerStatistics(executed=self.executed, skipped=self.skipped,
+                                       meanSlip=meanSlip, maxSlip=self.maxSlip,
+                                       failed=self.failed)
+
+    def resetStatistics(self):
+        with self.lock:
+            self.executed = 0
+            self.skipped = 0
+            self.failed = 0
+            self.totalSlip = 0.0
+            self.maxSlip = 0.0
+
+    def pendingCount(self):
+        with self.lock:
+            return len(self.heap) + sum(len(backlog) for backlog in self.backlogs.values())
+
+    # -- dispatcher thread --
+
+    def dispatchLoop(self):
+        with self.lock:
+            while not self.quitDispatching:
+                now = time.monotonic()
+                while len(self.heap) > 0 and self.heap[0][0] <= now:
+                    dueTime, _, task = heapq.heappop(self.heap)
+                    # An entry left behind by reschedule() is stale
+                    if not task.isCancelled and dueTime == task.dueTime:
+                        self.backlogs.setdefault(task.owner, deque()).append(task)
+                        self.dispatchOwner(task.owner)
+
+                timeout = None
+                if len(self.heap) > 0:
+                    timeout = max(0.0, self.heap[0][0] - now)
+                self.condition.wait(timeout)
+
+    def dispatchOwner(self, owner):
+        # Called with the lock held: start the owner's next task unless one of
+        # its tasks is already running.
+        if owner in self.busyOwners:
+            return
+        backlog = self.backlogs.get(owner)
+        while backlog:
+            task = backlog.popleft()
+            if task.isCancelled:
+                continue
+            self.busyOwners.add(owner)
+            task.idle.clear()
+            self.executor.submit(self.run, task)
+            break
+        if backlog is not None and len(backlog) == 0:
+            del self.backlogs[owner]
+
+    def run(self, task):
+        startTime = time.monotonic()
+        slip = max(0.0, startTime - task.dueTime)
+        failed = False
+        try:
+            if not task.isCancelled:
+                task.action()
+        except Exception as err:
+            task.lastError = err
+            failed = True
+        finally:
+            with self.lock:
+                self.executed += 1
+                self.totalSlip += slip
+                self.maxSlip = max(self.maxSlip, slip)
+                if failed:
+                    self.failed += 1
+
+                if task.isRepeating and not task.isCancelled and not self.quitDispatching:
+                    nextDue = task.dueTime + task.interval
+                    now = time.monotonic()
+                    if task.isRescheduled:
+                        nextDue = task.dueTime
+                        task.isRescheduled = False
+                    elif nextDue < now:
+                        missed = int((now - nextDue) // task.interval) + 1
+                        self.skipped += missed
+                        nextDue += missed * task.interval
+                    task.dueTime = nextDue
+                    heapq.heappush(self.heap, (task.dueTime, next(self.sequence), task))
+
+                self.busyOwners.discard(task.owner)
+                task.idle.set()
+                if not self.quitDispatching:
+                    self.dispatchOwner(task.owner)
+                self.condition.notify()
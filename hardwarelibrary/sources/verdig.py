@@ -103,6 +103,7 @@ class VerdiGDevice(LaserSourceDevice, OnOffCapability, ShutterCapability, PowerC
 
     classIdVendor = 0x0403   # FTDI FT2232 the HOPS supply enumerates as
     classIdProduct = 0x6010
+    statusFieldNames = {"interlockOk": "interlock"}
 
     def __init__(self, interface="auto", url=None, serialNumber=None,
                  idProduct=None, idVendor=None):
@@ -0,0 +1,280 @@
+"""Continuous spectrum acquisition on a dedicated reader thread.
+
+getSpectrum() requests a spectrum, waits for it, reads it and returns: the
+detector sits idle while the spectrum is transferred and while the caller
+processes it. A SpectrumAcquisition keeps the spectrometer integrating back
+to back instead. Its reader thread requests the next spectrum as soon as one
+is read, stores each spectrum with its timestamp in a RingBuffer of
+preallocated slots, and goes back to waiting. The consumer takes spectra at its
+own pace:
+
+    acquisition = SpectrumAcquisition(spectrometer)
+    acquisition.start()
+    for frame in acquisition.frames():
+        plot(spectrometer.wavelength, frame.data)   # frame.index, frame.timestamp
+    ...
+    acquisition.stop()
+
+get() and frames() return every spectrum in order, latest() only the most
+recent one. When the consumer falls behind, OverflowPolicy.dropOldest (the
+default) overwrites the oldest spectra not consumed yet and counts them as
+dropped; OverflowPolicy.block pauses the reader instead. A frame's data is a
+view on a buffer slot that is reused after the next get(): copy it to keep it.
+
+With a SpectrumPipeline (see processing.py), each spectrum is processed on the
+reader thread directly into its buffer slot, and frames hold float64 spectra.
+With a recorder (see recording.py), every spectrum is also recorded: the
+reader only copies it, the recorder writes it to disk on its own thread. A
+SpectrumRecorder drops spectra when the disk falls behind; an ArrayRecorder
+with dropWhenBehind=False stalls the reader instead.
+
+A failed readout (or a failure of the pipeline or the recorder) is counted in
+statistics().errors and retried; after maxConsecutiveErrors in a row the reader
+stops, and failure holds the last error (None if it was stopped by stop()).
+
+Do not call getSpectrum() or setIntegrationTime() on the spectrometer while
+an acquisition is running: acquisition.setIntegrationTime() hands the new
+integration time to the reader thread, which sets it between two readouts.
+"""
+
+import inspect
+import time
+from threading import Lock, Thread
+from typing import NamedTuple
+
+import numpy as np
+
+from hardwarelibrary.ringbuffer import RingBuffer, OverflowPolicy
+from hardwarelibrary.spectrometers.base import SpectrumRequestTimeoutError
+
+__all__ = ["SpectrumAcquisition", "AcquisitionStatistics"]
+
+
+class AcquisitionStatistics(NamedTuple):
+    acquired: int = 0       # spectra read from the spectrometer
+    consumed: int = 0       # spectra returned to the consumer
+    dropped: int = 0        # spectra overwritten or skipped before being consumed
+    errors: int = 0         # failed readouts or stores (retried)
+    rate: float = 0.0       # spectra per second since start()
+
+
+class SpectrumAcquisition:
+    def __init__(self, spectrometer, capacity=3, policy=OverflowPolicy.dropOldest,
+                 maxWait=2.0, maxConsecutiveErrors=10, pipeline=None, recorder=None):
+        self.spectrometer = spectrometer
+        self.pipeline = pipeline
+        self.recorder = recorder
+        self.capacity = capacity
+        self.policy = policy
+        self.maxWait = maxWait
+        self.maxConsecutiveErrors = maxConsecutiveErrors
+        self.ring = None
+        self.thread = None
+        self.quitAcquiring = False
+        self.isRequested = False
+        self.startTime = None
+        self.errors = 0
+        self.lastError = None
+        self.failure = None
+        self.settingsLock = Lock()
+        self.pendingIntegrationTime = None
+        self.readsWithoutCopy = False
+
+    @property
+    def isRunning(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    @property
+    def isPipelined(self):
+        """Spectrometers with the request/ready/read protocol (OISpectrometer)
+        are asked for the next spectrum before the current one is stored."""
+        return all(hasattr(self.spectrometer, name) for name in
+                   ("requestSpectrum", "isSpectrumReady", "getSpectrumData"))
+
+    @property
+    def canReadWithoutCopy(self):
+        """Spectrometers whose getSpectrumData() accepts copy=False (USB2000,
+        USB4000) return a view on their own buffer: the reader copies it once,
+        into its slot, before the next readout overwrites it."""
+        try:
+            parameters = inspect.signature(self.spectrometer.getSpectrumData).parameters
+        except (AttributeError, TypeError, ValueError):
+            return False
+        return "copy" in parameters
+
+    def start(self):
+        """Read a first spectrum (errors are raised here) to size the buffer
+        slots, then keep acquiring on the reader thread."""
+        if self.thread is not None:
+            raise RuntimeError("Acquisition already started")
+
+        self.quitAcquiring = False
+        self.errors = 0
+        self.lastError = None
+        self.failure = None
+        self.startTime = time.monotonic()
+        self.readsWithoutCopy = self.canReadWithoutCopy
+        spectrum, timestamp = self.readSpectrum()
+        dtype = spectrum.dtype if self.pipeline is None else 'float64'
+        self.ring = RingBuffer(shape=spectrum.shape, dtype=dtype,
+                               capacity=self.capacity, policy=self.policy)
+        if self.pipeline is not None:
+            self.pipeline.reset()
+        self.store(spectrum, timestamp)
+
+        self.thread = Thread(target=self.acquisitionLoop, name="SpectrumAcquisition", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the reader thread. Spectra already acquired can still be read."""
+        if self.thread is None:
+            return
+        self.quitAcquiring = True
+        self.ring.close()
+        self.thread.join()
+        self.thread = None
+        self.applyPendingSettings()
+
+    def setIntegrationTime(self, integrationTime):
+        """Set the integration time (ms) from any thread. While running, the
+        reader thread sets it after the spectrum being integrated is read:
+        the next spectrum uses it."""
+        with self.settingsLock:
+            self.pendingIntegrationTime = integrationTime
+        if self.thread is None:
+            self.applyPendingSettings()
+
+    def get(self, timeout=None):
+        """The next spectrum as a Frame, or None after stop() or timeout."""
+        return self.ring.get(timeout)
+
+    def latest(self, timeout=None):
+        """The most recent spectrum as a Frame, skipping older ones."""
+        return self.ring.latest(timeout)
+
+    def release(self):
+        """Give the slot of the frame last returned back to the reader,
+        once its data was copied."""
+        self.ring.release()
+
+    def frames(self):
+        """Every spectrum, in order, until stop()."""
+        return iter(self.ring)
+
+    def statistics(self):
+        if self.ring is None:
+            return AcquisitionStatistics(errors=self.errors)
+        ringStatistics = self.ring.statistics()
+        elapsed = time.monotonic() - self.startTime
+        rate = ringStatistics.written / elapsed if elapsed > 0 else 0.0
+        return AcquisitionStatistics(acquired=ringStatistics.written,
+                                     consumed=ringStatistics.consumed,
+                                     dropped=ringStatistics.dropped,
+                                     errors=self.errors, rate=rate)
+
+    # -- reader thread --
+
+    def acquisitionLoop(self):
+        consecutiveErrors = 0
+        try:
+            while not self.quitAcquiring:
+                try:
+                    spectrum, timestamp = self.readSpectrum()
+                    if self.store(spectrum, timestamp) is None:
+                        break   # closed
+                    consecutiveErrors = 0
+                except Exception as err:
+                    self.errors += 1
+                    self.lastError = err
+                    consecutiveErrors += 1
+                    if consecutiveErrors >= self.maxConsecutiveErrors:
+                        self.failure = err
+                        break
+                    time.sleep(0.02)
+        finally:
+            self.finishPendingRequest()
+            self.ring.close()
+
+    def store(self, spectrum, timestamp):
+        slot = self.ring.acquireSlot()
+        if slot is None:
+            return None
+        data = self.ring.slot(slot)
+        try:
+            if self.pipeline is None:
+                np.copyto(data, spectrum, casting='unsafe')
+            else:
+                self.pipeline.process(spectrum, out=data)
+            if self.recorder is not None:
+                self.recorder.append(data, timestamp)
+        except Exception:
+            self.ring.abandonSlot(slot)
+            raise
+        return self.ring.commitSlot(slot, timestamp)
+
+    def readSpectrum(self):
+        """The next spectrum and the time.time() it was ready."""
+        if not self.isPipelined:
+            self.applyPendingSettings()
+            spectrum = self.spectrometer.getSpectrum()
+            return spectrum, time.time()
+
+        if not self.isRequested:
+            self.spectrometer.requestSpectrum()
+            self.isRequested = True
+
+        if not self.waitForSpectrum():
+            self.isRequested = False
+            raise SpectrumRequestTimeoutError("Spectrum not ready after {0} s".format(self.maxWait))
+
+        timestamp = time.time()
+        self.isRequested = False
+        spectrum = self.getSpectrumData()
+
+        # The next integration runs while this spectrum is stored and consumed
+        if not self.quitAcquiring:
+            self.applyPendingSettings()
+            self.spectrometer.requestSpectrum()
+            self.isRequested = True
+        return spectrum, timestamp
+
+    def applyPendingSettings(self):
+        # Between two readouts, on the reader thread (or after it stopped)
+        with self.settingsLock:
+            integrationTime, self.pendingIntegrationTime = self.pendingIntegrationTime, None
+        if integrationTime is None:
+            return
+        try:
+            self.spectrometer.setIntegrationTime(integrationTime)
+        except Exception as err:
+            self.errors += 1
+            self.lastError = err
+
+    def getSpectrumData(self):
+        if self.readsWithoutCopy:
+            return self.spectrometer.getSpectrumData(copy=False)
+        return self.spectrometer.getSpectrumData()
+
+    def waitForSpectrum(self):
+        if hasattr(self.spectrometer, "waitForSpectrum"):
+            # Sleeps through the integration (OISpectrometer)
+            return self.spectrometer.waitForSpectrum(self.maxWait)
+
+        deadline = time.monotonic() + self.maxWait
+        while not self.spectrometer.isSpectrumReady():
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.001)
+        return True
+
+    def finishPendingRequest(self):
+        # Read out a spectrum still requested so that the spectrometer is left
+        # in sync for the next getSpectrum().
+        if not self.isRequested:
+            return
+        self.isRequested = False
+        try:
+            if self.waitForSpectrum():
+                self.getSpectrumData()
+        except Exception:
+            pass    # already counted, or the spectrometer is gone
@@ -33,11 +33,13 @@ class Spectrometer(PhysicalDevice):
     idProduct = None
     def __init__(self, serialNumber=None, idProduct:int = None, idVendor:int = None):
         import numpy as np
+        from hardwarelibrary.spectrometers.processing import SpectrumPipeline
 
         PhysicalDevice.__init__(self, serialNumber=serialNumber, idProduct=idProduct, idVendor=idVendor)
         self.model = ""
         self.wavelength = np.linspace(400,1000,1024)
         self.integrationTime = 10
+        self.processing = SpectrumPipeline()
 
     # The contract a driver must implement. For spectrometers the public
     # method is the hook itself (no doXxx wrapper), on top of
@@ -63,6 +65,29 @@ class Spectrometer(PhysicalDevice):
         viewer = SpectraViewer(spectrometer=self)
         viewer.display()
 
+    def getProcessedSpectrum(self, integrationTime=None):
+        """ A spectrum processed by the stages of self.processing (see
+        hardwarelibrary.spectrometers.processing). If the pipeline averages
+        scans, that many new spectra are acquired.
+
+        Returns
+        -------
+        spectrum : np.array(float)
+            A new array, not shared with the pipeline.
+        """
+        if integrationTime is not None:
+            self.setIntegrationTime(integrationTime)
+
+        self.processing.reset()
+        for i in range(self.processing.scansPerSpectrum):
+            processed = self.processing.process(self.getSpectrum())
+        return processed.copy()
+
+    def getNonlinearityCoefficients(self):
+        """ The coefficients of the detector nonlinearity correction, lowest
+        order first, or None if the spectrometer does not provide them. """
+        return None
+
     def getIntegrationTime(self):
         return self.integrationTime
 
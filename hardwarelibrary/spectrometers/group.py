@@ -0,0 +1,219 @@
+"""Synchronized acquisition on several spectrometers.
+
+Calling getSpectrum() on a UV, a VIS and a NIR spectrometer one after the
+other takes the sum of their cycle times, and the three spectra are not
+acquired at the same time. A SpectrometerGroup has one I/O thread per
+spectrometer: acquire() releases them together (a barrier), each requests its
+spectrum, waits for it and reads it, and acquire() returns when all are done.
+The cycle takes as long as the slowest spectrometer.
+
+    group = SpectrometerGroup([uv, vis, nir])
+    group.start()
+    spectra = group.acquire()
+    spectra.spectra, spectra.timestamps, spectra.skew
+    wavelength, stitched = group.stitch(spectra)
+    ...
+    group.stop()
+
+Each GroupSpectra holds the spectra in group order with the time.time() at
+which each request was sent and each spectrum was ready; skew is the spread
+of the ready times and requestSkew that of the requests. statistics()
+summarizes them. stitch() resamples the spectra on a common wavelength grid
+(np.interp) and averages them where they overlap.
+"""
+
+import time
+from threading import Barrier, BrokenBarrierError, Thread
+from typing import NamedTuple
+
+import numpy as np
+
+from hardwarelibrary.spectrometers.base import SpectrumRequestTimeoutError
+
+__all__ = ["SpectrometerGroup", "GroupSpectra", "GroupStatistics"]
+
+
+class GroupSpectra(NamedTuple):
+    index: int
+    spectra: list              # one spectrum per spectrometer, in group order
+    timestamps: list           # time.time() when each spectrum was ready
+    requestTimestamps: list    # time.time() when each spectrum was requested
+
+    @property
+    def skew(self):
+        return max(self.timestamps) - min(self.timestamps)
+
+    @property
+    def requestSkew(self):
+        return max(self.requestTimestamps) - min(self.requestTimestamps)
+
+
+class GroupStatistics(NamedTuple):
+    acquisitions: int = 0
+    meanSkew: float = 0.0
+    maxSkew: float = 0.0
+    meanRequestSkew: float = 0.0
+    maxRequestSkew: float = 0.0
+    meanCycleTime: float = 0.0
+
+
+class SpectrometerGroup:
+    def __init__(self, spectrometers, maxWait=2.0):
+        self.spectrometers = list(spectrometers)
+        self.maxWait = maxWait
+        count = len(self.spectrometers)
+        self.startBarrier = Barrier(count + 1)
+        self.doneBarrier = Barrier(count + 1)
+        self.threads = []
+        self.quitAcquiring = False
+        self.results = [None]*count
+        self.errors = [None]*count
+        self.grid = None
+        self.resampled = None
+
+        self.acquisitions = 0
+        self.totalSkew = 0.0
+        self.maxSkew = 0.0
+        self.totalRequestSkew = 0.0
+        self.maxRequestSkew = 0.0
+        self.totalCycleTime = 0.0
+
+    @property
+    def isRunning(self):
+        return len(self.threads) > 0
+
+    def start(self):
+        if self.isRunning:
+            return
+        self.quitAcquiring = False
+        self.startBarrier.reset()
+        self.doneBarrier.reset()
+        for i in range(len(self.spectrometers)):
+            thread = Thread(target=self.ioLoop, args=(i,), name="SpectrometerGroup-{0}".format(i), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        if not self.isRunning:
+            return
+        self.quitAcquiring = True
+        self.startBarrier.abort()
+        self.doneBarrier.abort()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def acquire(self, timeout=None):
+        """One spectrum from every spectrometer, requested together. The first
+        error raised by a spectrometer is raised once all are done."""
+        if not self.isRunning:
+            self.start()
+        if timeout is None:
+            timeout = 2*self.maxWait + 1
+
+        startTime = time.monotonic()
+        self.results = [None]*len(self.spectrometers)
+        self.errors = [None]*len(self.spectrometers)
+        try:
+            self.startBarrier.wait(timeout)
+            self.doneBarrier.wait(timeout)
+        except BrokenBarrierError:
+            self.stop()
+            raise TimeoutError("Spectrometers did not all answer in {0} s".format(timeout))
+
+        for error in self.errors:
+            if error is not None:
+                raise error
+
+        spectra = GroupSpectra(index=self.acquisitions,
+                               spectra=[result[0] for result in self.results],
+                               timestamps=[result[1] for result in self.results],
+                               requestTimestamps=[result[2] for result in self.results])
+        self.account(spectra, time.monotonic() - startTime)
+        return spectra
+
+    def account(self, spectra, cycleTime):
+        self.acquisitions += 1
+        self.totalSkew += spectra.skew
+        self.maxSkew = max(self.maxSkew, spectra.skew)
+        self.totalRequestSkew += spectra.requestSkew
+        self.maxRequestSkew = max(self.maxRequestSkew, spectra.requestSkew)
+        self.totalCycleTime += cycleTime
+
+    def statistics(self):
+        if self.acquisitions == 0:
+            return GroupStatistics()
+        return GroupStatistics(acquisitions=self.acquisitions,
+                               meanSkew=self.totalSkew/self.acquisitions, maxSkew=self.maxSkew,
+                               meanRequestSkew=self.totalRequestSkew/self.acquisitions,
+                               maxRequestSkew=self.maxRequestSkew,
+                               meanCycleTime=self.totalCycleTime/self.acquisitions)
+
+    # -- I/O threads --
+
+    def ioLoop(self, i):
+        spectrometer = self.spectrometers[i]
+        while not self.quitAcquiring:
+            try:
+                self.startBarrier.wait()
+            except BrokenBarrierError:
+                return
+            try:
+                self.results[i] = self.readSpectrum(spectrometer)
+            except Exception as err:
+                self.errors[i] = err
+            try:
+                self.doneBarrier.wait()
+            except BrokenBarrierError:
+                return
+
+    def readSpectrum(self, spectrometer):
+        """(spectrum, ready time, request time) from one spectrometer."""
+        requestTimestamp = time.time()
+        if not hasattr(spectrometer, "waitForSpectrum"):
+            spectrum = spectrometer.getSpectrum()
+            return spectrum, time.time(), requestTimestamp
+
+        spectrometer.requestSpectrum()
+        if not spectrometer.waitForSpectrum(self.maxWait):
+            raise SpectrumRequestTimeoutError("Spectrum not ready after {0} s".format(self.maxWait))
+        timestamp = time.time()
+        return spectrometer.getSpectrumData(), timestamp, requestTimestamp
+
+    # -- stitching --
+
+    def commonGrid(self, step=None):
+        """A wavelength grid covering all spectrometers, by default with the
+        finest pixel spacing of the group."""
+        wavelengths = [np.asarray(spectrometer.wavelength, dtype=np.float64)
+                       for spectrometer in self.spectrometers]
+        if step is None:
+            step = min(np.median(np.abs(np.diff(wavelength))) for wavelength in wavelengths)
+        start = min(wavelength.min() for wavelength in wavelengths)
+        stop = max(wavelength.max() for wavelength in wavelengths)
+        count = int(np.floor((stop - start)/step + 1e-9)) + 1
+        grid = start + step*np.arange(count)
+        return np.minimum(grid, stop, out=grid)
+
+    def stitch(self, spectra, grid=None):
+        """Resample the spectra of a GroupSpectra on grid (default: the
+        commonGrid(), computed once) and average them where they overlap.
+        Returns (grid, spectrum); wavelengths covered by no spectrometer are NaN."""
+        if grid is None:
+            if self.grid is None:
+                self.grid = self.commonGrid()
+            grid = self.grid
+
+        count = len(self.spectrometers)
+        if self.resampled is None or self.resampled.shape != (count, len(grid)):
+            self.resampled = np.empty((count, len(grid)), dtype=np.float64)
+        for i, spectrum in enumerate(spectra.spectra):
+            wavelength = self.spectrometers[i].wavelength
+            self.resampled[i] = np.interp(grid, wavelength, spectrum, left=np.nan, right=np.nan)
+
+        isValid = ~np.isnan(self.resampled)
+        counts = isValid.sum(axis=0)
+        total = np.where(isValid, self.resampled, 0.0).sum(axis=0)
+        stitched = np.full(len(grid), np.nan)
+        np.divide(total, counts, out=stitched, where=counts > 0)
+        return grid, stitched
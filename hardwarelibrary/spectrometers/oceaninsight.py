@@ -134,6 +134,18 @@ class OISpectrometer(Spectrometer):
 
     timeScale = 1 # milliseconds=1, microseconds=1000
 
+    # Waiting for a spectrum: sleep through the integration, then poll the
+    # status with a delay doubling from minimumPollDelay up to maximumPollDelay
+    minimumPollDelay = 0.001
+    maximumPollDelay = 0.020
+
+    # Metrics of the status polling, see waitForSpectrum()
+    statusTransactions = 0              # status commands sent since creation
+    statusTransactionsPerSpectrum = 0   # for the last spectrum, from request to ready
+    readoutLatency = 0.0                # seconds between end of integration and 'ready'
+    requestTime = None
+    statusTransactionsAtRequest = 0
+
     def __init__(self, serialNumber, idProduct, idVendor, model):
         """
         Finds and initializes the communication with the Ocean Insight spectrometer
@@ -191,6 +203,7 @@ class OISpectrometer(Spectrometer):
         """
         Spectrometer.__init__(self, serialNumber, idProduct, idVendor)
 
+        self.usbDevice = None   # if set (e.g. a simulator), used instead of matching a USB device
         self.device = None
         self.configuration = None
         self.interface = None
@@ -211,9 +224,13 @@ class OISpectrometer(Spectrometer):
 
         self.model = model
         self.wavelength = None
+        self.pixels = None
         self.discardLeadingSamples = 0  # In some models, the leading data is meaningless
         self.discardTrailingSamples = 0 # In some models, the trailing data is meaningless
         self.lastStatus = None
+        self.strayLight = None
+        self.nonlinearityCoefficients = None    # read once, on first use
+        self.storedSerialNumber = None  # last read by getSerialNumber(), for the probe cache
 
     def doInitializeDevice(self):
         """
@@ -223,8 +240,11 @@ class OISpectrometer(Spectrometer):
         """
 
         try:
+            self.storedSerialNumber = None
 
-            if self.serialNumber == "*" or self.serialNumber == ".*":
+            if self.usbDevice is not None:
+                self.device = self.usbDevice
+            elif self.serialNumber == "*" or self.serialNumber == ".*":
                 self.device = OISpectrometer.matchUniqueUSBDevice( idProduct=self.idProduct)
             else:
                 self.device = OISpectrometer.matchUniqueUSBDevice( idProduct=self.idProduct,
@@ -247,6 +267,8 @@ class OISpectrometer(Spectrometer):
             second input is the data endpoint. If that is not the case, the subclass can
             simply reassign the endpoints properly in its __init__ function. 
             """
+            self.inputEndpoints = []
+            self.outputEndpoints = []
             for endpoint in self.interface:
                 """ The endpoint address has the 8th bit set to 1 when it is an input.
                 We can check with the bitwise operator & (and) 0x80. It will be zero
@@ -270,7 +292,9 @@ class OISpectrometer(Spectrometer):
             self.flushEndpoints()
             self.sendCommand(b'\x01')
             time.sleep(0.1)
-            self.getCalibration()
+            if not self.restoreCachedCalibration():
+                self.getCalibration()
+                self.cacheCalibration()
         except Exception as err:
             raise UnableToInitialize("Error when initializing device: {0}".format(err))
 
@@ -315,23 +339,136 @@ class OISpectrometer(Spectrometer):
         """ Get the serial nunmber of the spectrometer.  This can be used to
         differentiate two connected spectrometers.
         """
-        return self.getParameter(index=0)
+        self.storedSerialNumber = self.getParameter(index=0)
+        return self.storedSerialNumber
 
     def getCalibration(self):
         """ Get the hardcoded calibration from the spectrometer.  It is a
-        3rd-order polynomial. Currently, no nonlinearities are considered.
+        3rd-order polynomial. The nonlinearity coefficients are read when
+        first needed, see getNonlinearityCoefficients.
         """
         self.a0 = float(self.getParameter(index=1))
         self.a1 = float(self.getParameter(index=2))
         self.a2 = float(self.getParameter(index=3))
         self.a3 = float(self.getParameter(index=4))
         status = self.getStatus()
-        self.wavelength = [ self.a0 + self.a1*x + self.a2*x*x + self.a3*x*x*x 
-                            for x in range(status.pixels)]
-        if self.discardTrailingSamples > 0:
-            self.wavelength = self.wavelength[:-self.discardTrailingSamples]
-        if self.discardLeadingSamples > 0:
-            self.wavelength = self.wavelength[self.discardLeadingSamples:]
+        self.pixels = status.pixels
+        self.computeWavelength()
+
+    def getNonlinearityCoefficients(self):
+        """ The nonlinearity correction coefficients (parameters 6 to 13,
+        lowest order first, as many as the polynomial order in parameter 14
+        requires). The stray light constant (parameter 5) is kept in
+        self.strayLight. They are read from the spectrometer only once, and
+        stored with the calibration in the probe cache.
+
+        Returns
+        -------
+        coefficients : list of float
+            Empty if the spectrometer has no valid nonlinearity calibration.
+        """
+        if self.nonlinearityCoefficients is None:
+            try:
+                self.strayLight = float(self.getParameter(index=5))
+            except ValueError:
+                self.strayLight = None
+
+            try:
+                order = int(float(self.getParameter(index=14)))
+                self.nonlinearityCoefficients = [float(self.getParameter(index=6+i))
+                                                 for i in range(min(order, 7) + 1)]
+            except ValueError:
+                self.nonlinearityCoefficients = []
+            self.cacheCalibration()
+
+        return self.nonlinearityCoefficients
+
+    def computeWavelength(self):
+        """ Compute the wavelength of each pixel from the calibration
+        coefficients a0...a3 and the number of pixels, as a np.array. """
+        import numpy as np
+
+        x = np.arange(self.pixels, dtype=np.float64)
+        wavelength = ((self.a3*x + self.a2)*x + self.a1)*x + self.a0
+        self.wavelength = wavelength[self.discardLeadingSamples:self.pixels-self.discardTrailingSamples]
+
+    def cacheKeySerialNumber(self):
+        """ The serial number used to key this spectrometer in the probe
+        cache: the USB descriptor serial number when there is one (it is what
+        DeviceManager sees), otherwise the serial number of the constructor
+        if it is not a wildcard. """
+        try:
+            serialNumber = usb.util.get_string(self.device, self.device.iSerialNumber)
+            if serialNumber:
+                return serialNumber
+        except Exception as err:
+            pass
+
+        if self.serialNumber in (None, "*", ".*"):
+            return None
+        return self.serialNumber
+
+    def restoreCachedCalibration(self) -> bool:
+        """ Restore the calibration from the probe cache instead of reading
+        it from the spectrometer. The serial number stored in the spectrometer
+        is read (a single USB transaction) and compared with the cached identity:
+        if they differ, the entry is invalidated and False is returned so the
+        calibration is read again.
+
+        Returns
+        -------
+        isRestored : bool
+            True if the calibration was restored from the cache
+        """
+        if self.probeCache is None:
+            return False
+
+        key = (self.idVendor, self.idProduct, self.cacheKeySerialNumber())
+        identity = self.probeCache.identity(*key)
+        calibration = self.probeCache.calibration(*key)
+        if identity is None or calibration is None:
+            return False
+
+        if identity.get("serialNumber") != self.getSerialNumber():
+            self.probeCache.invalidate(*key)
+            return False
+
+        try:
+            self.a0, self.a1, self.a2, self.a3 = calibration["coefficients"]
+            self.pixels = calibration["pixels"]
+            if "nonlinearity" in calibration:
+                self.nonlinearityCoefficients = list(calibration["nonlinearity"])
+                self.strayLight = calibration.get("strayLight")
+        except (KeyError, ValueError, TypeError):
+            self.probeCache.invalidate(*key)
+            return False
+
+        self.computeWavelength()
+        return True
+
+    def cacheCalibration(self):
+        """ Store the identity and calibration just read in the probe cache,
+        if there is one. The serial number is read from the spectrometer only
+        if it was not read already during this connection. """
+        if self.probeCache is None:
+            return
+
+        serialNumber = self.storedSerialNumber
+        if serialNumber is None:
+            serialNumber = self.getSerialNumber()
+        self.probeCache.update(self.idVendor, self.idProduct, self.cacheKeySerialNumber(),
+                               driverClass=type(self),
+                               identity={"serialNumber": serialNumber,
+                                         "model": self.model},
+                               calibration=self.calibrationCacheEntry())
+
+    def calibrationCacheEntry(self):
+        calibration = {"coefficients": [self.a0, self.a1, self.a2, self.a3],
+                       "pixels": self.pixels}
+        if self.nonlinearityCoefficients is not None:
+            calibration["nonlinearity"] = self.nonlinearityCoefficients
+            calibration["strayLight"] = self.strayLight
+        return calibration
 
     def getParameter(self, index):
         """ Get any of the 20 parameters hardcoded into the spectrometer.
@@ -376,12 +513,14 @@ class OISpectrometer(Spectrometer):
                              payloadBytes=bytearray([index]))
             parameters = self.readReply(inputEndpoint=self.epParameters,
                                         timeout=200)
-            for i, c in enumerate(parameters):
-                if c == 0:
-                    parameters = parameters[:i]
-                    break
+            # The reply echoes the command and the index (0 for the serial
+            # number): the string starts after them and ends at the first 0.
+            value = bytes(parameters[2:])
+            end = value.find(0)
+            if end >= 0:
+                value = value[:end]
 
-            return bytes(parameters[2:]).decode()
+            return value.decode()
 
         except Exception as err:
             self.flushEndpoints()
@@ -393,12 +532,74 @@ class OISpectrometer(Spectrometer):
         it properly in its operating status. If after 1 second the request 
         has not been processed, it will raise a TimeoutError exception. """
 
+        self.requestTime = time.monotonic()
+        self.statusTransactionsAtRequest = self.statusTransactions
         self.epCommandOut.write(b'\x09')
         timeOut = time.time() + 1
+        delay = self.minimumPollDelay
         while not self.isSpectrumRequested():
-            time.sleep(0.001)
             if time.time() > timeOut:
                 raise SpectrumRequestTimeoutError('The spectrometer never acknowledged the reception of the spectrum request')
+            time.sleep(delay)
+            delay = min(2*delay, self.maximumPollDelay)
+
+    def expectedIntegrationDelay(self):
+        """ The integration time in seconds according to the last status read,
+        or 0 if unknown. """
+        status = getattr(self, 'lastStatus', None)
+        if status is None or getattr(status, 'integrationTime', None) is None:
+            return 0.0
+        return status.integrationTime/self.timeScale/1000
+
+    def waitForSpectrum(self, maxWait=2.0):
+        """ Wait until the spectrum requested with requestSpectrum is ready.
+
+        Rather than polling the status during the whole integration (each poll is
+        a USB round trip), sleep until the spectrum is expected: the integration
+        time plus the readout latency measured for the previous spectrum. Then
+        poll with a delay that doubles from minimumPollDelay to maximumPollDelay.
+        The number of status transactions used for the spectrum is available in
+        statusTransactionsPerSpectrum.
+
+        Parameters
+        ----------
+        maxWait: float, default 2.0
+            seconds to wait after the request.
+
+        Returns
+        -------
+        isSpectrumReady : bool
+            False if the spectrum was not ready after maxWait seconds.
+        """
+        requestTime = self.requestTime
+        if requestTime is None:
+            requestTime = time.monotonic()
+        integrationDelay = self.expectedIntegrationDelay()
+        deadline = requestTime + maxWait
+
+        expectedTime = min(requestTime + integrationDelay + self.readoutLatency, deadline)
+        sleepTime = expectedTime - time.monotonic()
+        if sleepTime > 0:
+            time.sleep(sleepTime)
+
+        delay = self.minimumPollDelay
+        polls = 0
+        while not self.isSpectrumReady():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(2*delay, self.maximumPollDelay)
+            polls += 1
+
+        if polls > 0:
+            self.readoutLatency = max(0.0, time.monotonic() - requestTime - integrationDelay)
+        else:
+            # Ready at the first poll: the spectrum may have been ready well
+            # before, so aim earlier next time instead of measuring our own sleep.
+            self.readoutLatency /= 2
+        self.statusTransactionsPerSpectrum = self.statusTransactions - self.statusTransactionsAtRequest
+        return True
 
     def isSpectrumRequested(self) -> bool:
         """ The spectrometer is currently waiting for an acquisition to 
@@ -443,6 +644,7 @@ class OISpectrometer(Spectrometer):
        
         """
 
+        self.statusTransactions += 1
         self.sendCommand(cmdBytes = b'\xfe')
         statusList = self.readReply(inputEndpoint=self.epStatus,
                                     unpackingFormat=self.statusPackingFormat,
@@ -451,13 +653,19 @@ class OISpectrometer(Spectrometer):
         self.lastStatus = status
         return status
 
-    def getSpectrumData(self):
+    def getSpectrumData(self, copy=True):
         """ Retrieve the spectral data.  You must call requestSpectrum first.
         If the spectrum is not ready yet, it will simply wait. The timeout 
         is set short so it may timeout.  You would normally check with
         isSpectrumReady before calling this function.
         This is highly device specific and must be implemented by the subclass.
 
+        Parameters
+        ----------
+        copy : bool, default True
+            If False, the returned array may be a view on an internal buffer
+            that the next call overwrites.
+
         Returns
         -------
         spectrum : np.array(float)
@@ -474,7 +682,8 @@ class OISpectrometer(Spectrometer):
         4- actually retrieving and returning the data.
 
         The wait is bounded: at most `maxRequests` requests are issued, each
-        awaited up to `maxWait` seconds. Rather than looping forever when the
+        awaited up to `maxWait` seconds with waitForSpectrum, which sleeps
+        through the integration instead of polling the status. Rather than looping forever when the
         'spectrum ready' flag never rises (a transient USB glitch can leave it
         stuck), SpectrumRequestTimeoutError is raised in bounded time. Transient
         USB errors raised by requestSpectrum()/isSpectrumReady() are absorbed
@@ -504,11 +713,8 @@ class OISpectrometer(Spectrometer):
         for _ in range(maxRequests):
             try:
                 self.requestSpectrum()
-                deadline = time.time() + maxWait
-                while time.time() < deadline:
-                    if self.isSpectrumReady():
-                        return self.getSpectrumData()
-                    time.sleep(0.001)
+                if self.waitForSpectrum(maxWait):
+                    return self.getSpectrumData()
             except usb.core.USBError as err:   # includes USBTimeoutError
                 lastError = err
                 time.sleep(0.02)
@@ -594,10 +800,18 @@ class USB2000(OISpectrometer):
         timerSwap: bool = None
         isSpectralDataReady : bool = None
 
+    packets = 32        # each packet is 64 low bytes then 64 high bytes
+    packetSize = 64
+    syncByte = 0x69     # sent after the last packet
+
     def __init__(self, serialNumber=None, idProduct=None, idVendor=None):
         OISpectrometer.__init__(self, serialNumber, idProduct, idVendor, model="USB2000")
         self.epParametersIdx = self.epSecondaryInIdx
         self.epStatusIdx = self.epMainInIdx
+        # The whole transfer, sync byte included, is read into this buffer
+        self.spectrumBytes = array.array('B', bytes(self.packets*2*self.packetSize + 1))
+        # and decoded into this one
+        self.spectrum = None
 
     def doInitializeDevice(self):
         """
@@ -605,7 +819,7 @@ class USB2000(OISpectrometer):
         """
         super().doInitializeDevice()
 
-    def getSpectrumData(self):
+    def getSpectrumData(self, copy=True):
         """ Retrieve the spectral data.  You must call requestSpectrum first.
         If the spectrum is not ready yet, it will simply wait. The timeout 
         is set short so it may timeout.  You would normally check with
@@ -613,28 +827,51 @@ class USB2000(OISpectrometer):
 
         The format for the USB2000 is all the least significant bytes in a packet
         then the most significant bytes. We combine them to get the values.
+        The 32 packet pairs and the sync byte are read in a single bulk
+        transfer (the short sync packet ends it) and combined in one
+        vectorized operation into a preallocated spectrum.
+
+        Parameters
+        ----------
+        copy : bool, default True
+            If False, the returned array is a view on the internal buffer that
+            the next call overwrites.
 
         Returns
         -------
-        spectrum : np.array(float)
+        spectrum : np.array(np.uint16)
             The spectrum, in 16-bit integers corresponding to each wavelength
             available in self.wavelength.
         """
         import numpy as np
 
-        spectrum = []
-
-        for packet in range(32):
-            bytesReadLow = self.epMainIn.read(size_or_buffer=64, timeout=200)
-            bytesReadHi = self.epMainIn.read(size_or_buffer=64, timeout=200)
-            
-            spectrum.extend(np.array(bytesReadLow, dtype=np.uint16)+256*np.array(bytesReadHi, dtype=np.uint16))
-
-        confirmation = self.epMainIn.read(size_or_buffer=1, timeout=200)
-        spectrum[0] = spectrum[1]
-
-        assert(confirmation[0] == 0x69)
-        return np.array(spectrum)
+        dataSize = self.packets*2*self.packetSize
+        received = self.epMainIn.read(size_or_buffer=self.spectrumBytes, timeout=200)
+        while received < dataSize:
+            # The packets came in more than one transfer
+            chunk = self.epMainIn.read(size_or_buffer=dataSize + 1 - received, timeout=200)
+            self.spectrumBytes[received:received+len(chunk)] = chunk
+            received += len(chunk)
+        if received == dataSize:
+            confirmation = self.epMainIn.read(size_or_buffer=1, timeout=200)
+            self.spectrumBytes[dataSize] = confirmation[0]
+
+        if self.spectrumBytes[dataSize] != self.syncByte:
+            raise UnableToCommunicate("Spectrum not followed by sync byte 0x69 (got {0:#04x})".format(self.spectrumBytes[dataSize]))
+
+        if self.spectrum is None:
+            self.spectrum = np.empty(self.packets*self.packetSize, dtype=np.uint16)
+
+        packets = np.frombuffer(self.spectrumBytes, dtype=np.uint8, count=dataSize).reshape(self.packets, 2, self.packetSize)
+        combined = self.spectrum.reshape(self.packets, self.packetSize)
+        np.left_shift(packets[:, 1, :], 8, out=combined, dtype=np.uint16)
+        np.bitwise_or(combined, packets[:, 0, :], out=combined)
+        self.spectrum[0] = self.spectrum[1]
+
+        spectrum = self.spectrum[self.discardLeadingSamples:len(self.spectrum)-self.discardTrailingSamples]
+        if copy:
+            return spectrum.copy()
+        return spectrum
 
     def setIntegrationTime(self, timeInMs):
         """ Set the integration time in an integer value of milliseconds 
@@ -692,6 +929,10 @@ class USB4000_2000Plus(OISpectrometer):
         packetsTransferred: int = None
         isHighSpeed : bool = None
 
+    packetSize = 512                # bytes of little-endian 16-bit values
+    secondaryEndpointPackets = 4    # USB4000 only: first packets on the secondary endpoint
+    syncByte = 0x69                 # sent after the last packet
+
     def __init__(self, serialNumber=None, idProduct:int = None, idVendor:int = None, model=None):
         OISpectrometer.__init__(self, serialNumber=serialNumber, idProduct=idProduct, idVendor=idVendor, model="USB4000")
         self.epCommandOutIdx = 0
@@ -701,55 +942,99 @@ class USB4000_2000Plus(OISpectrometer):
         self.epParametersIdx = 2
         self.epStatusIdx = 2
 
+        # Allocated by getSpectrumData once the packet count is known
+        self.spectrum = None
+        self.spectrumSegments = None
+        self.syncBuffer = array.array('B', bytes(1))
+
     def doInitializeDevice(self):
         self.discardLeadingSamples = 5
         self.discardTrailingSamples = 173
         super().doInitializeDevice()
 
-    def getSpectrumData(self):
+    def getSpectrumData(self, copy=True):
         """ Retrieve the spectral data.  You must call requestSpectrum first.
         If the spectrum is not ready yet, it will simply wait. The timeout 
         is set short so it may timeout.  You would normally check with
         isSpectrumReady before calling this function.
 
         The format for the USB4000/USB2000+ is 512 bytes of integers in each packet
-        followed by a single byte 0x69.
+        followed by a single byte 0x69. On the USB4000, the first 4 packets
+        come from the secondary input endpoint. The packets are read in one
+        bulk transfer per endpoint directly into reusable buffers and copied
+        into a preallocated spectrum, without any per-sample Python object.
+
+        Parameters
+        ----------
+        copy : bool, default True
+            If False, the returned array is a view on the internal buffer that
+            the next call overwrites.
 
         Returns
         -------
-        spectrum : np.array(float)
+        spectrum : np.array(np.uint16)
             The spectrum, in 16-bit integers corresponding to each wavelength
             available in self.wavelength.
         """
-        import numpy as np
-
-        spectrum = []
-
         if not self.lastStatus.isHighSpeed:
             raise NotImplementedError('Full speed mode not implemented for {0}.'.format(self.model))
 
         packetCount = self.lastStatus.packetCount
-        exposureTime = self.lastStatus.integrationTime
+        timeout = self.lastStatus.integrationTime*2
 
-        for packet in range(packetCount):
-            inputEndpoint = self.inputEndpoints[0]
-            if self.idProduct == USB4000.classIdProduct and packet <= 3:
-                inputEndpoint = self.inputEndpoints[1]
+        if self.spectrumSegments is None or len(self.spectrum) != packetCount*self.packetSize//2:
+            self.allocateSpectrumBuffers(packetCount)
 
-            values = self.readReply(inputEndpoint, unpackingFormat='<'+'H'*256, timeout=exposureTime*2)
-            spectrum.extend(np.array(values))
+        for endpointIndex, buffer, values, target in self.spectrumSegments:
+            inputEndpoint = self.inputEndpoints[endpointIndex]
+            self.readInto(inputEndpoint, buffer, timeout)
+            target[:] = values
 
-        confirmation = self.readReply(inputEndpoint, size=1)
-        if confirmation[0] != 0x69:
+        inputEndpoint.read(size_or_buffer=self.syncBuffer, timeout=timeout)
+        if self.syncBuffer[0] != self.syncByte:
             self.flushEndpoints()
             raise RuntimeError('Spectrometer is desynchronized. Should disconnect')
 
-        if self.discardTrailingSamples > 0:
-            spectrum = spectrum[:-self.discardTrailingSamples]
-        if self.discardLeadingSamples > 0:
-            spectrum = spectrum[self.discardLeadingSamples:]
+        spectrum = self.spectrum[self.discardLeadingSamples:len(self.spectrum)-self.discardTrailingSamples]
+        if copy:
+            return spectrum.copy()
+        return spectrum
+
+    def allocateSpectrumBuffers(self, packetCount):
+        """ One USB read buffer per input endpoint used, each with a numpy
+        view, and the spectrum they are copied into. """
+        import numpy as np
 
-        return np.array(spectrum)
+        valuesPerPacket = self.packetSize//2
+        self.spectrum = np.zeros(packetCount*valuesPerPacket, dtype=np.uint16)
+
+        # (endpoint index, packets): the USB4000 sends its first packets on the secondary endpoint
+        split = []
+        if self.idProduct == USB4000.classIdProduct:
+            split.append((1, min(self.secondaryEndpointPackets, packetCount)))
+        if packetCount > sum(packets for _, packets in split):
+            split.append((0, packetCount - sum(packets for _, packets in split)))
+
+        self.spectrumSegments = []
+        start = 0
+        for endpointIndex, packets in split:
+            count = packets*valuesPerPacket
+            buffer = array.array('H', bytes(count*2))
+            values = np.frombuffer(buffer, dtype='<u2')
+            self.spectrumSegments.append((endpointIndex, buffer, values, self.spectrum[start:start+count]))
+            start += count
+
+    def readInto(self, inputEndpoint, buffer, timeout):
+        """ Fill buffer from inputEndpoint, in more than one transfer if the
+        data does not come at once. """
+        size = len(buffer)*buffer.itemsize
+        received = inputEndpoint.read(size_or_buffer=buffer, timeout=timeout)
+        if received < size:
+            bufferBytes = memoryview(buffer).cast('B')
+            while received < size:
+                chunk = inputEndpoint.read(size_or_buffer=size - received, timeout=timeout)
+                bufferBytes[received:received+len(chunk)] = chunk
+                received += len(chunk)
 
     def setIntegrationTime(self, timeInMs):
         """ Set the integration time in an integer value of milliseconds 
@@ -772,12 +1057,8 @@ class USB4000_2000Plus(OISpectrometer):
         isSpectrumRequested : bool
             Whether or not the spectrometer is waiting for an acquisition
         """
-        while True:
-            status = self.getStatus()
-            if status.acquisitionStatus & 2 != 0:
-                break
-
-        return True
+        status = self.getStatus()
+        return status.acquisitionStatus & 2 != 0
 
     def isSpectrumReady(self):
         """ The requested spectrum is ready to be retrieved with getSpectrumData.
@@ -791,16 +1072,12 @@ class USB4000_2000Plus(OISpectrometer):
         isSpectrumReady : bool
             Whether or not the spectrum ready to be retrieved
         """
+        try:
+            status = self.getStatus()
+        except:
+            return False
 
-        while True:
-            try:
-                status = self.getStatus()
-                if status.acquisitionStatus & 4 != 0:
-                    break
-            except:
-                return False
-
-        return True
+        return status.acquisitionStatus & 4 != 0
 
 class USB650(USB2000):
     classIdProduct = 0x1014
@@ -845,6 +1122,7 @@ class DebugSpectro:
 
     def __init__(self):
         import numpy as np
+        from hardwarelibrary.spectrometers.simulator import SyntheticSpectrum
 
         self.model = "Debug - Nothing is connected"
         self.wavelength = np.linspace(400,1000,1024)
@@ -856,28 +1134,17 @@ class DebugSpectro:
             width = random.uniform(2,10)
             intensity = random.uniform(10,100) # per ms
             self.emitters.append(self.Emitter(center, width, intensity))
+        self.synthetic = SyntheticSpectrum(self.emitters, background=self.background, maxCounts=32767)
 
     def getSerialNumber(self):
         return "000-000-000"
 
     def getSpectrum(self):
-        import numpy as np
-
-        spectrum = []
-        time = self.getIntegrationTime()
-        for wavelength in self.wavelength:
-            intensity = 0
-            for emitter in self.emitters:
-                intensity += emitter.intensity*np.exp(-((wavelength-emitter.center)/emitter.width)**2)
-            intensity *= time
-            noise = random.gauss(0, np.sqrt(intensity))
-            intensity += noise
-            intensity += random.uniform(*self.background)
-            if intensity > 32767:
-                intensity = 32767
-            spectrum.append(intensity)
-
-        return np.array(spectrum)
+        """ A synthetic spectrum: the emitters over the background, with shot
+        noise, computed for all wavelengths at once. """
+        self.synthetic.emitters = self.emitters
+        self.synthetic.background = self.background
+        return self.synthetic.counts(self.wavelength, self.getIntegrationTime())
 
     def display(self):
         """ Display the spectrum with the SpectraViewer class."""
@@ -0,0 +1,286 @@
+"""Vectorized spectral processing: references, nonlinearity, averaging, smoothing.
+
+A SpectrumPipeline applies a list of processing stages to raw spectra. Each
+raw spectrum is copied once into a preallocated float64 buffer and every stage
+then works in place on that buffer with its own preallocated scratch arrays,
+so processing a stream of spectra does not allocate:
+
+    pipeline = SpectrumPipeline([DarkSubtraction(dark),
+                                 NonlinearityCorrection.fromSpectrometer(spectrometer),
+                                 ScanAverage(scans=4),
+                                 WhiteNormalization(white, dark),
+                                 Boxcar(halfWidth=2)])
+    processed = pipeline.process(spectrometer.getSpectrum())
+
+process() returns the pipeline's buffer, overwritten by the next call (pass
+out= to write elsewhere, e.g. into a RingBuffer slot). Every Spectrometer has a
+pipeline (spectrometer.processing, empty by default) used by
+getProcessedSpectrum(), and a SpectrumAcquisition given a pipeline processes
+each spectrum on its reader thread.
+
+Stages are applied in the order given. The usual order is the one above: the
+nonlinearity of the detector applies to dark-subtracted counts, and smoothing
+comes last.
+"""
+
+import numpy as np
+
+__all__ = ["SpectrumPipeline", "ProcessingStage", "DarkSubtraction", "NonlinearityCorrection",
+           "WhiteNormalization", "ScanAverage", "Boxcar", "SavitzkyGolay"]
+
+
+class ProcessingStage:
+    """A processing step working in place on a float64 spectrum. Buffers are
+    (re)allocated by prepare() when the number of pixels changes."""
+
+    isEnabled = True
+
+    def prepare(self, pixels):
+        pass
+
+    def process(self, spectrum):
+        raise NotImplementedError("You must implement process() for your stage.")
+
+    def reset(self):
+        """Forget any state accumulated from previous spectra."""
+        pass
+
+
+class DarkSubtraction(ProcessingStage):
+    def __init__(self, dark=None):
+        self.dark = None
+        self.setReference(dark)
+
+    def setReference(self, dark):
+        self.dark = None if dark is None else np.array(dark, dtype=np.float64)
+
+    @property
+    def isEnabled(self):
+        return self.dark is not None
+
+    def process(self, spectrum):
+        np.subtract(spectrum, self.dark, out=spectrum)
+
+
+class NonlinearityCorrection(ProcessingStage):
+    """Detector nonlinearity correction as calibrated by Ocean Insight: the
+    counts (dark subtracted) are divided by the polynomial
+    c0 + c1*counts + ... + cn*counts**n of the spectrometer parameters 6-14."""
+
+    def __init__(self, coefficients=None):
+        self.coefficients = None if coefficients is None else [float(c) for c in coefficients]
+        self.polynomial = None
+
+    @classmethod
+    def fromSpectrometer(cls, spectrometer):
+        return cls(spectrometer.getNonlinearityCoefficients())
+
+    @property
+    def isEnabled(self):
+        return self.coefficients is not None and len(self.coefficients) > 0
+
+    def prepare(self, pixels):
+        self.polynomial = np.empty(pixels, dtype=np.float64)
+
+    def process(self, spectrum):
+        # Horner's rule, in place in self.polynomial
+        polynomial = self.polynomial
+        polynomial.fill(self.coefficients[-1])
+        for coefficient in reversed(self.coefficients[:-1]):
+            np.multiply(polynomial, spectrum, out=polynomial)
+            np.add(polynomial, coefficient, out=polynomial)
+        np.divide(spectrum, polynomial, out=spectrum)
+
+
+class WhiteNormalization(ProcessingStage):
+    """Divide by the white reference, minus the dark reference if given.
+    Pixels where that difference is zero become NaN."""
+
+    def __init__(self, white=None, dark=None):
+        self.denominator = None
+        self.invalid = None
+        self.setReference(white, dark)
+
+    def setReference(self, white, dark=None):
+        if white is None:
+            self.denominator = None
+            return
+        self.denominator = np.array(white, dtype=np.float64)
+        if dark is not None:
+            self.denominator -= dark
+        self.invalid = self.denominator == 0
+        self.denominator[self.invalid] = 1
+
+    @property
+    def isEnabled(self):
+        return self.denominator is not None
+
+    def process(self, spectrum):
+        np.divide(spectrum, self.denominator, out=spectrum)
+        spectrum[self.invalid] = np.nan
+
+
+class ScanAverage(ProcessingStage):
+    """Average of the last `scans` spectra (fewer until that many went
+    through). getProcessedSpectrum() feeds `scans` new spectra, so it returns
+    the average of consecutive scans like the spectrometer software does."""
+
+    def __init__(self, scans=1):
+        if scans < 1:
+            raise ValueError("scans must be at least 1")
+        self.scans = scans
+        self.history = None
+        self.sum = None
+        self.count = 0
+        self.next = 0
+
+    @property
+    def isEnabled(self):
+        return self.scans > 1
+
+    def prepare(self, pixels):
+        self.history = np.zeros((self.scans, pixels), dtype=np.float64)
+        self.sum = np.zeros(pixels, dtype=np.float64)
+        self.reset()
+
+    def reset(self):
+        if self.sum is not None:
+            self.sum.fill(0)
+        self.count = 0
+        self.next = 0
+
+    def process(self, spectrum):
+        oldest = self.history[self.next]
+        if self.count == self.scans:
+            np.subtract(self.sum, oldest, out=self.sum)
+        else:
+            self.count += 1
+        np.copyto(oldest, spectrum)
+        np.add(self.sum, spectrum, out=self.sum)
+        self.next = (self.next + 1) % self.scans
+        np.divide(self.sum, self.count, out=spectrum)
+
+
+class Boxcar(ProcessingStage):
+    """Mean over halfWidth pixels on each side of every pixel (fewer at the
+    edges), computed from a cumulative sum."""
+
+    def __init__(self, halfWidth=1):
+        self.halfWidth = halfWidth
+        self.cumulative = None
+        self.upper = None
+
+    @property
+    def isEnabled(self):
+        return self.halfWidth > 0
+
+    def prepare(self, pixels):
+        indices = np.arange(pixels)
+        self.high = np.minimum(indices + self.halfWidth + 1, pixels)
+        self.low = np.maximum(indices - self.halfWidth, 0)
+        self.counts = (self.high - self.low).astype(np.float64)
+        self.cumulative = np.zeros(pixels + 1, dtype=np.float64)
+        self.upper = np.empty(pixels, dtype=np.float64)
+
+    def process(self, spectrum):
+        np.cumsum(spectrum, out=self.cumulative[1:])
+        np.take(self.cumulative, self.high, out=self.upper)
+        np.take(self.cumulative, self.low, out=spectrum)
+        np.subtract(self.upper, spectrum, out=spectrum)
+        np.divide(spectrum, self.counts, out=spectrum)
+
+
+class SavitzkyGolay(ProcessingStage):
+    """Savitzky-Golay smoothing: a polynomial of order polyOrder fitted over
+    windowLength pixels (odd). At the edges, the polynomial fitted over the
+    first and last windows is evaluated, as scipy.signal.savgol_filter does
+    with mode='interp'."""
+
+    def __init__(self, windowLength=11, polyOrder=3):
+        if windowLength % 2 != 1 or polyOrder >= windowLength:
+            raise ValueError("windowLength must be odd and larger than polyOrder")
+        self.windowLength = windowLength
+        self.polyOrder = polyOrder
+
+        halfWidth = windowLength // 2
+        positions = np.arange(-halfWidth, halfWidth + 1, dtype=np.float64)
+        vandermonde = np.vander(positions, polyOrder + 1, increasing=True)
+        fit = np.linalg.pinv(vandermonde)   # polynomial coefficients from the window values
+        self.coefficients = fit[0]          # value at the center of the window
+        self.leftEdge = np.vander(positions[:halfWidth], polyOrder + 1, increasing=True) @ fit
+        self.rightEdge = np.vander(positions[halfWidth + 1:], polyOrder + 1, increasing=True) @ fit
+        self.smoothed = None
+        self.term = None
+
+    def prepare(self, pixels):
+        if pixels < self.windowLength:
+            raise ValueError("Spectrum shorter than the Savitzky-Golay window")
+        self.smoothed = np.empty(pixels, dtype=np.float64)
+        self.term = np.empty(pixels - self.windowLength + 1, dtype=np.float64)
+
+    def process(self, spectrum):
+        pixels = len(spectrum)
+        halfWidth = self.windowLength // 2
+        center = self.smoothed[halfWidth:pixels - halfWidth]
+        center.fill(0)
+        for k, coefficient in enumerate(self.coefficients):
+            np.multiply(spectrum[k:k + len(center)], coefficient, out=self.term)
+            np.add(center, self.term, out=center)
+        np.dot(self.leftEdge, spectrum[:self.windowLength], out=self.smoothed[:halfWidth])
+        np.dot(self.rightEdge, spectrum[pixels - self.windowLength:], out=self.smoothed[pixels - halfWidth:])
+        np.copyto(spectrum, self.smoothed)
+
+
+class SpectrumPipeline:
+    def __init__(self, stages=None):
+        self.stages = list(stages or [])
+        self.buffer = None
+        self.preparedPixels = None
+
+    def add(self, stage):
+        self.stages.append(stage)
+        self.preparedPixels = None
+        return stage
+
+    def remove(self, stage):
+        self.stages.remove(stage)
+
+    def stage(self, stageClass):
+        """The first stage of the given class, or None."""
+        for stage in self.stages:
+            if isinstance(stage, stageClass):
+                return stage
+        return None
+
+    @property
+    def scansPerSpectrum(self):
+        """Raw spectra needed for one processed spectrum (see ScanAverage)."""
+        scans = 1
+        for stage in self.stages:
+            if isinstance(stage, ScanAverage) and stage.isEnabled:
+                scans = max(scans, stage.scans)
+        return scans
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+    def prepare(self, pixels):
+        self.buffer = np.empty(pixels, dtype=np.float64)
+        for stage in self.stages:
+            stage.prepare(pixels)
+        self.preparedPixels = pixels
+
+    def process(self, spectrum, out=None):
+        """Process a raw spectrum. The result is written in out if given,
+        otherwise in the pipeline's buffer that the next call overwrites."""
+        pixels = len(spectrum)
+        if self.preparedPixels != pixels:
+            self.prepare(pixels)
+
+        buffer = self.buffer if out is None else out
+        np.copyto(buffer, spectrum, casting='unsafe')
+        for stage in self.stages:
+            if stage.isEnabled:
+                stage.process(buffer)
+        return buffer
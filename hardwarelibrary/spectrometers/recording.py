@@ -0,0 +1,46 @@
+"""Recording spectra at high rate: an ArrayRecorder that stores the wavelength
+axis and the calibration of the spectrometer once.
+
+    recorder = SpectrumRecorder("kinetics", spectrometer)
+    acquisition = SpectrumAcquisition(spectrometer, recorder=recorder)
+    acquisition.start()
+    ...
+    acquisition.stop()
+    recorder.close()
+
+    recording = ArrayRecording("kinetics")
+    recording.arrays["wavelength"], recording.data[-100:], recording.timestamps[-100:]
+
+Like a FrameRecorder, a SpectrumRecorder drops spectra (counted in
+statistics().dropped) rather than stall the reader thread of the acquisition
+when the disk falls behind: pass dropWhenBehind=False to wait instead.
+"""
+
+from hardwarelibrary.recording import ArrayRecorder
+
+__all__ = ["SpectrumRecorder"]
+
+
+class SpectrumRecorder(ArrayRecorder):
+    def __init__(self, path, spectrometer, metadata=None, dropWhenBehind=True, **kwargs):
+        allMetadata = self.spectrometerMetadata(spectrometer)
+        allMetadata.update(metadata or {})
+        super().__init__(path, metadata=allMetadata, arrays={"wavelength": spectrometer.wavelength},
+                         dropWhenBehind=dropWhenBehind, **kwargs)
+
+    @staticmethod
+    def spectrometerMetadata(spectrometer):
+        metadata = {"model": spectrometer.model,
+                    "serialNumber": spectrometer.getSerialNumber(),
+                    "integrationTime": spectrometer.getIntegrationTime()}
+        if all(hasattr(spectrometer, name) for name in ("a0", "a1", "a2", "a3")):
+            metadata["wavelengthCoefficients"] = [spectrometer.a0, spectrometer.a1,
+                                                  spectrometer.a2, spectrometer.a3]
+        coefficients = getattr(spectrometer, "nonlinearityCoefficients", None)
+        if coefficients is not None:
+            metadata["nonlinearityCoefficients"] = coefficients
+        return metadata
+
+    def appendFrame(self, frame):
+        """Record a Frame from a SpectrumAcquisition with its timestamp."""
+        return self.append(frame.data, frame.timestamp)
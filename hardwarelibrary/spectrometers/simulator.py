@@ -0,0 +1,329 @@
+"""A USB-level simulator of Ocean Insight spectrometers.
+
+The OISpectrometer drivers talk to pyusb endpoints. This module provides
+objects with the same interface as a pyusb Device and its Endpoints, that
+answer the Ocean Insight command set like the real instrument does:
+
+    0x01    initialize
+    0x02    set integration time (ms as '<H' for the USB2000, µs as '<L' for
+            the USB4000 family)
+    0x05    query parameter (serial number, calibration coefficients, ...)
+    0x09    request spectrum: the data is ready after the integration time
+            plus the readout time
+    0xFE    query status
+
+Replies are queued on the input endpoint where the driver reads them, with
+the packet framing of the model (USB2000: 64 low bytes then 64 high bytes per
+packet pair; USB4000: 512-byte little-endian packets, the first 4 on their own
+endpoint; both followed by the 0x69 sync byte). Reading an endpoint with
+nothing to read raises usb.core.USBTimeoutError, as pyusb does. The USB2000 and
+USB4000 classes therefore run unmodified, from initialization to spectrum
+decoding:
+
+    spectrometer = simulatedSpectrometer(USB4000)
+    spectrometer.initializeDevice()
+    spectrum = spectrometer.getSpectrum()
+
+The spectra are synthetic (a few gaussian emitters over a background, with
+shot noise), generated with vectorized NumPy code by SyntheticSpectrum, which
+DebugSpectro also uses.
+"""
+
+import array
+import time
+from collections import deque
+from struct import pack, unpack
+from threading import RLock
+
+import numpy as np
+import usb.core
+
+from hardwarelibrary.spectrometers.oceaninsight import USB2000, USB4000, USB4000_2000Plus
+
+__all__ = ["SyntheticSpectrum", "SimulatedEndpoint", "SimulatedOIDevice", "SimulatedUSB2000Device",
+           "SimulatedUSB4000Device", "simulatedSpectrometer"]
+
+
+class SyntheticSpectrum:
+    """Gaussian emitters (center, width in nm, intensity in counts/ms) over a
+    uniform background, with shot noise, clipped to maxCounts."""
+
+    def __init__(self, emitters, background=(100, 200), maxCounts=32767, seed=None):
+        self.emitters = list(emitters)
+        self.background = background
+        self.maxCounts = maxCounts
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def random(cls, count=5, wavelengthRange=(400, 1000), seed=None, **kwargs):
+        rng = np.random.default_rng(seed)
+        emitters = [(rng.uniform(*wavelengthRange), rng.uniform(2, 10), rng.uniform(10, 100))
+                    for i in range(count)]
+        return cls(emitters, seed=seed, **kwargs)
+
+    def profile(self, wavelength):
+        """Counts per ms at each wavelength, without noise or background."""
+        if len(self.emitters) == 0:
+            return np.zeros(len(wavelength))
+        centers, widths, intensities = np.array(self.emitters, dtype=np.float64).T
+        wavelength = np.asarray(wavelength, dtype=np.float64)
+        return intensities @ np.exp(-((wavelength[None, :] - centers[:, None])/widths[:, None])**2)
+
+    def counts(self, wavelength, integrationTime):
+        """A noisy spectrum (float64) for an integration time in ms."""
+        intensity = self.profile(wavelength)*integrationTime
+        intensity += self.rng.normal(0.0, 1.0, len(intensity))*np.sqrt(intensity)
+        intensity += self.rng.uniform(*self.background, len(intensity))
+        return np.clip(intensity, 0, self.maxCounts, out=intensity)
+
+
+class SimulatedEndpoint:
+    """A pyusb-like bulk endpoint. Input endpoints hold a queue of packets:
+    a read returns whole packets until the buffer is full or a short packet
+    ends the transfer."""
+
+    def __init__(self, device, bEndpointAddress, wMaxPacketSize=64):
+        self.device = device
+        self.bEndpointAddress = bEndpointAddress
+        self.wMaxPacketSize = wMaxPacketSize
+        self.packets = deque()
+
+    def write(self, data, timeout=None):
+        return self.device.receiveCommand(bytes(data))
+
+    def read(self, size_or_buffer, timeout=None):
+        isBuffer = not isinstance(size_or_buffer, int)
+        size = len(size_or_buffer)*size_or_buffer.itemsize if isBuffer else size_or_buffer
+
+        self.device.waitForData(self, timeout)
+        with self.device.lock:
+            if len(self.packets) == 0:
+                raise usb.core.USBTimeoutError("Operation timed out", errno=110)
+
+            data = bytearray()
+            while len(self.packets) > 0 and len(data) < size:
+                packet = self.packets[0]
+                room = size - len(data)
+                if len(packet) > room:
+                    data += packet[:room]
+                    self.packets[0] = packet[room:]
+                    break
+                data += self.packets.popleft()
+                if len(packet) < self.wMaxPacketSize:
+                    break   # short packet: end of transfer
+
+        if isBuffer:
+            memoryview(size_or_buffer).cast('B')[:len(data)] = data
+            return len(data)
+        return array.array('B', data)
+
+    def queue(self, data, packetSize=None):
+        """Queue data as packets of packetSize (default wMaxPacketSize)."""
+        packetSize = packetSize or self.wMaxPacketSize
+        with self.device.lock:
+            for start in range(0, len(data), packetSize):
+                self.packets.append(bytes(data[start:start+packetSize]))
+
+    def clear(self):
+        with self.device.lock:
+            self.packets.clear()
+
+
+class SimulatedConfiguration:
+    def __init__(self, interface):
+        self.interface = interface
+
+    def __getitem__(self, index):
+        return self.interface
+
+
+class SimulatedOIDevice:
+    """The USB device of an Ocean Insight spectrometer. Subclasses define the
+    endpoint layout, the status format and the spectrum framing."""
+    idVendor = 0x2457
+    idProduct = None
+    pixels = None
+    maxCounts = None
+    defaultIntegrationTime = 10  # ms
+
+    def __init__(self, serialNumber="SIM00001", coefficients=(339.5, 0.3767, -1.58e-5, -6.6e-10),
+                 readoutTime=0.002, spectrum=None, seed=None):
+        self.lock = RLock()
+        self.serialNumber = serialNumber
+        self.iSerialNumber = 3
+        self.coefficients = coefficients
+        self.readoutTime = readoutTime
+        self.integrationTime = self.defaultIntegrationTime
+        self.requestTime = None
+        self.readyTime = None
+        if spectrum is None:
+            spectrum = SyntheticSpectrum.random(maxCounts=self.maxCounts, seed=seed)
+        self.spectrum = spectrum
+        self.wavelength = np.polynomial.polynomial.polyval(np.arange(self.pixels), coefficients)
+
+        self.commandOut = SimulatedEndpoint(self, 0x01)
+        self.inputEndpoints = self.createInputEndpoints()
+        self.interface = [self.commandOut, *self.inputEndpoints]
+        self.commands = 0
+
+    # pyusb Device interface
+    def set_configuration(self, configuration=None):
+        pass
+
+    def get_active_configuration(self):
+        return SimulatedConfiguration(self.interface)
+
+    def reset(self):
+        with self.lock:
+            self.requestTime = None
+            self.readyTime = None
+            for endpoint in self.inputEndpoints:
+                endpoint.clear()
+
+    @property
+    def parameters(self):
+        """The values of the 0x05 query, by index."""
+        parameters = {0: self.serialNumber, 5: "0.0", 6: "1.0", 14: "0"}
+        for i, coefficient in enumerate(self.coefficients):
+            parameters[1+i] = repr(coefficient)
+        return parameters
+
+    def receiveCommand(self, data):
+        with self.lock:
+            self.commands += 1
+            command, payload = data[0], data[1:]
+            if command == 0x01:
+                self.reset()
+                self.integrationTime = self.defaultIntegrationTime
+            elif command == 0x02:
+                self.integrationTime = self.decodeIntegrationTime(payload)
+            elif command == 0x05:
+                index = payload[0]
+                value = self.parameters.get(index, "").encode()
+                self.parameterEndpoint.queue((bytes([0x05, index]) + value + b'\x00').ljust(17, b'\x00'))
+            elif command == 0x09:
+                self.requestTime = time.monotonic()
+                self.readyTime = self.requestTime + self.integrationTime/1000 + self.readoutTime
+            elif command == 0xFE:
+                self.statusEndpoint.queue(self.statusBytes())
+            return len(data)
+
+    def isSpectrumRequested(self):
+        return self.requestTime is not None
+
+    def isSpectrumReady(self):
+        return self.readyTime is not None and time.monotonic() >= self.readyTime
+
+    def waitForData(self, endpoint, timeout):
+        """Before a read: the spectrum is queued once ready, as the real
+        device only sends it after the integration, up to timeout ms later."""
+        with self.lock:
+            if self.readyTime is None or endpoint not in self.dataEndpoints or len(endpoint.packets) > 0:
+                return
+            delay = self.readyTime - time.monotonic()
+        if delay > 0:
+            if timeout is not None and delay > timeout/1000:
+                return
+            time.sleep(delay)
+        with self.lock:
+            if self.isSpectrumReady():
+                self.queueSpectrum(self.spectrum.counts(self.wavelength, self.integrationTime))
+                self.requestTime = None
+                self.readyTime = None
+
+    # Defined by subclasses
+    def createInputEndpoints(self):
+        raise NotImplementedError()
+
+    def decodeIntegrationTime(self, payload):
+        raise NotImplementedError()
+
+    def statusBytes(self):
+        raise NotImplementedError()
+
+    def queueSpectrum(self, counts):
+        raise NotImplementedError()
+
+
+class SimulatedUSB2000Device(SimulatedOIDevice):
+    idProduct = USB2000.classIdProduct
+    pixels = 2048
+    maxCounts = 4095    # 12-bit
+
+    def createInputEndpoints(self):
+        # In the order of the driver's indices: parameters on 1, status and spectra on 2
+        self.parameterEndpoint = SimulatedEndpoint(self, 0x81)
+        self.statusEndpoint = SimulatedEndpoint(self, 0x82)
+        self.dataEndpoints = [self.statusEndpoint]
+        return [SimulatedEndpoint(self, 0x87), self.parameterEndpoint, self.statusEndpoint]
+
+    def decodeIntegrationTime(self, payload):
+        return unpack('<H', payload[:2])[0]
+
+    def statusBytes(self):
+        return pack(USB2000.statusPackingFormat, self.pixels, self.integrationTime, False, 0,
+                    self.isSpectrumRequested(), False, self.isSpectrumReady())
+
+    def queueSpectrum(self, counts):
+        values = counts.astype(np.uint16).reshape(-1, 64)
+        packets = np.empty((len(values), 2, 64), dtype=np.uint8)
+        packets[:, 0, :] = values & 0xFF
+        packets[:, 1, :] = values >> 8
+        self.statusEndpoint.queue(packets.tobytes())
+        self.statusEndpoint.queue(bytes([USB2000.syncByte]))
+
+
+class SimulatedUSB4000Device(SimulatedOIDevice):
+    idProduct = USB4000.classIdProduct
+    pixels = 3840
+    maxCounts = 65535
+
+    def createInputEndpoints(self):
+        # Driver indices: 0 spectrum packets 4 and up, 1 first 4 packets, 2 status and parameters
+        self.mainEndpoint = SimulatedEndpoint(self, 0x82, wMaxPacketSize=512)
+        self.firstPacketsEndpoint = SimulatedEndpoint(self, 0x86, wMaxPacketSize=512)
+        self.statusEndpoint = SimulatedEndpoint(self, 0x81, wMaxPacketSize=64)
+        self.parameterEndpoint = self.statusEndpoint
+        self.dataEndpoints = [self.mainEndpoint, self.firstPacketsEndpoint]
+        return [self.mainEndpoint, self.firstPacketsEndpoint, self.statusEndpoint]
+
+    @property
+    def packetCount(self):
+        return self.pixels*2 // 512
+
+    def decodeIntegrationTime(self, payload):
+        return unpack('<L', payload[:4])[0]/1000
+
+    def statusBytes(self):
+        acquisitionStatus = 0
+        if self.isSpectrumRequested():
+            acquisitionStatus |= 2
+        if self.isSpectrumReady():
+            acquisitionStatus |= 4
+        return pack(USB4000_2000Plus.statusPackingFormat, self.pixels, int(self.integrationTime*1000),
+                    False, 0, acquisitionStatus, self.packetCount, False, 0, True)
+
+    def queueSpectrum(self, counts):
+        data = counts.astype('<u2').tobytes()
+        if self.idProduct == USB4000.classIdProduct:
+            split = USB4000_2000Plus.secondaryEndpointPackets*512
+            self.firstPacketsEndpoint.queue(data[:split])
+            self.mainEndpoint.queue(data[split:])
+        else:
+            self.mainEndpoint.queue(data)
+        self.mainEndpoint.queue(bytes([USB4000_2000Plus.syncByte]))
+
+
+def simulatedSpectrometer(spectrometerClass=USB2000, **kwargs):
+    """An instance of spectrometerClass connected to a simulated device of
+    the same family (keyword arguments go to the simulated device). Call
+    initializeDevice() as with a real spectrometer."""
+    if issubclass(spectrometerClass, USB4000_2000Plus):
+        device = SimulatedUSB4000Device(**kwargs)
+    else:
+        device = SimulatedUSB2000Device(**kwargs)
+    device.idProduct = spectrometerClass.classIdProduct
+
+    spectrometer = spectrometerClass(serialNumber=device.serialNumber)
+    spectrometer.usbDevice = device
+    return spectrometer
@@ -1,4 +1,5 @@
 import os
+import time
 
 import usb.core
 import usb.util
@@ -6,12 +7,14 @@ import usb.backend.libusb1
 import numpy as np
 
 import matplotlib.pyplot as plt
-import matplotlib.animation as animation
 from matplotlib.widgets import Button, TextBox
 
+from hardwarelibrary.spectrometers.processing import SpectrumPipeline, DarkSubtraction, WhiteNormalization
+from hardwarelibrary.spectrometers.acquisition import SpectrumAcquisition
+
 
 class SpectraViewer:
-    def __init__(self, spectrometer):
+    def __init__(self, spectrometer, maxRedrawRate=20):
         """A matplotlib-based window to display and manage a spectrometer
         to replace the insanely inept OceanView software from OceanInsight or
         the dude-wtf?1 software from Stellarnet.
@@ -25,12 +28,23 @@ class SpectraViewer:
 
         spectrometer: Spectrometer
             A spectrometer from Ocean Insight or Stellarnet
+        maxRedrawRate: float
+            The plot is redrawn at most this many times per second, whatever
+            the rate of the spectrometer. Spectra are acquired on a background
+            SpectrumAcquisition and only the latest one is displayed, so the
+            display never slows down the acquisition.
         """
 
         self.spectrometer = spectrometer
+        self.maxRedrawRate = maxRedrawRate
         self.lastSpectrum = []
+        self.rawSpectrum = None
+        self.lastTimestamp = None
         self.whiteReference = None
         self.darkReference = None
+        self.darkSubtraction = DarkSubtraction()
+        self.whiteNormalization = WhiteNormalization()
+        self.pipeline = SpectrumPipeline([self.darkSubtraction, self.whiteNormalization])
         self.figure = None
         self.axes = None
         self.quitFlag = False
@@ -40,7 +54,13 @@ class SpectraViewer:
         self.darkBtn = None
         self.integrationTimeBox = None
         self.filenameBox = None
-        self.animation = None
+        self.acquisition = None
+        self.timer = None
+        self.line = None
+        self.background = None
+        self.integrationTime = None
+        self.rescaleAfter = None
+        self.pendingReferences = {}
 
     def display(self):
         """Display the spectrum in free-running mode, with simple
@@ -48,14 +68,37 @@ class SpectraViewer:
         the integration time. This is the only user-facing function that
         is needed.
         """
+        self.setupDisplay()
+        try:
+            self.timer.start()
+            plt.show()
+        finally:
+            self.stopAcquisition()
+
+    def setupDisplay(self):
+        """Create the figure, start the acquisition and the redraw timer
+        (not started)."""
         self.figure, self.axes = self.createFigure()
 
         self.setupLayout()
         self.quitFlag = False
-        self.animation = animation.FuncAnimation(
-            self.figure, self.animate, interval=100
-        )
-        plt.show()
+        self.requestRescale()
+        self.startAcquisition()
+        self.createLine()
+        self.figure.canvas.mpl_connect("draw_event", self.captureBackground)
+        self.timer = self.figure.canvas.new_timer(interval=1000/self.maxRedrawRate)
+        self.timer.add_callback(self.redraw)
+
+    def startAcquisition(self):
+        """Acquire spectra on a background thread. The viewer only ever
+        takes the latest one."""
+        self.acquisition = SpectrumAcquisition(self.spectrometer)
+        self.acquisition.start()
+
+    def stopAcquisition(self):
+        if self.acquisition is not None:
+            self.acquisition.stop()
+            self.acquisition = None
 
     def createFigure(self):
         """Create a matplotlib figure with decent properties."""
@@ -119,6 +162,7 @@ class SpectraViewer:
         self.darkBtn.on_clicked(self.clickDarkReference)
 
         currentIntegrationTime = self.spectrometer.getIntegrationTime()
+        self.integrationTime = currentIntegrationTime
         self.integrationTimeBox = TextBox(
             axTime,
             "ms ",
@@ -136,53 +180,108 @@ class SpectraViewer:
 
         self.figure.canvas.mpl_connect("key_press_event", self.keyPress)
 
-    def plotSpectrum(self, spectrum=None):
-        """Plot a spectrum into the figure or request a new spectrum. This
-        is called repeatedly when the display function is called."""
+    def createLine(self):
+        """The spectrum line is animated: it is not drawn with the rest of the
+        figure but blitted over a saved background (see captureBackground)."""
+        wavelength = self.spectrometer.wavelength
+        self.line, = self.axes.plot(wavelength, np.zeros(len(wavelength)), "k", animated=True)
+        self.axes.set_xlabel("Wavelength [nm]")
+        self.axes.set_ylabel("Intensity [arb.u]")
+
+    def captureBackground(self, event=None):
+        """Called after each full redraw of the figure: keep the axes without
+        the spectrum, to be restored before blitting the next one."""
+        self.background = self.figure.canvas.copy_from_bbox(self.axes.bbox)
+        if self.line is not None:
+            self.axes.draw_artist(self.line)
+
+    def plotSpectrum(self, spectrum=None, timestamp=None):
+        """Plot a spectrum into the figure or request a new spectrum. Only the
+        line is redrawn; the axes are rescaled (and the whole figure redrawn)
+        when a rescale is due."""
         if spectrum is None:
             spectrum = self.spectrometer.getSpectrum()
 
-        if len(self.axes.lines) == 0:
-            self.axes.plot(self.spectrometer.wavelength, spectrum, "k")
-            self.axes.set_xlabel("Wavelength [nm]")
-            self.axes.set_ylabel("Intensity [arb.u]")
+        if self.line is None:
+            self.createLine()
+        self.line.set_ydata(spectrum)
+
+        if self.isRescaleDue(timestamp):
+            self.rescale()
         else:
-            self.axes.lines[0].set_data(
-                self.spectrometer.wavelength, spectrum
-            )  # set plot data
-            self.axes.relim()
+            self.blit()
 
-    def animate(self, i):
-        """Internal function that is called repeatedly to manage the
-        update  of the spectrum plot. It is better to use the `animation`
-        strategy instead of a loop with  plt.pause() because plt.pause() will
-        always bring the window to the  foreground.
+    def blit(self):
+        canvas = self.figure.canvas
+        if self.background is None:
+            canvas.draw_idle()   # captureBackground will draw the line
+            return
+        canvas.restore_region(self.background)
+        self.axes.draw_artist(self.line)
+        canvas.blit(self.axes.bbox)
+
+    def requestRescale(self, delay=0):
+        """Rescale the axes with the first spectrum acquired delay seconds
+        from now or later (e.g. after a new integration time applies)."""
+        self.rescaleAfter = time.time() + delay
+
+    def isRescaleDue(self, timestamp):
+        if self.rescaleAfter is None:
+            return False
+        return timestamp is None or timestamp >= self.rescaleAfter
+
+    def rescale(self):
+        self.rescaleAfter = None
+        self.axes.relim()
+        self.axes.autoscale_view()
+        self.figure.canvas.draw_idle()
+
+    def redraw(self):
+        """Called by the redraw timer, at most maxRedrawRate times per
+        second: plot the latest spectrum acquired since the last call, if any.
+        It never waits for the spectrometer.
 
         This function is also responsible for determining if the user asked to quit.
         """
-
-        try:
-            self.lastSpectrum = self.spectrometer.getSpectrum()
-            if self.darkReference is not None:
-                self.lastSpectrum -= self.darkReference
-            if self.whiteReference is not None:
-                np.seterr(divide="ignore", invalid="ignore")
-                if self.darkReference is not None:
-                    self.lastSpectrum = self.lastSpectrum / (
-                        self.whiteReference - self.darkReference
-                    )
-                else:
-                    self.lastSpectrum = self.lastSpectrum / self.whiteReference
-
-            self.plotSpectrum(spectrum=self.lastSpectrum)
-        except usb.core.USBError as err:
-            print("The spectrometer was disconnected. Quitting.")
-            self.quitFlag = True
+        if not self.quitFlag:
+            frame = self.acquisition.latest(timeout=0)
+            if frame is not None:
+                self.takeFrame(frame)
+                self.lastSpectrum = self.pipeline.process(self.rawSpectrum)
+                self.plotSpectrum(spectrum=self.lastSpectrum, timestamp=self.lastTimestamp)
+            elif not self.acquisition.isRunning:
+                print("The spectrometer was disconnected. Quitting.")
+                self.quitFlag = True
 
         if self.quitFlag:
-            self.animation.event_source.stop()
-            self.animation = None
-            plt.close()
+            if self.timer is not None:
+                self.timer.stop()
+                self.timer = None
+            self.stopAcquisition()
+            plt.close(self.figure)
+
+    def takeFrame(self, frame):
+        """Copy the spectrum out of the acquisition buffer and give the slot
+        back, then use it as a reference if one was requested before it was
+        acquired."""
+        if self.rawSpectrum is None or self.rawSpectrum.shape != frame.data.shape:
+            self.rawSpectrum = np.empty_like(frame.data)
+        np.copyto(self.rawSpectrum, frame.data)
+        self.lastTimestamp = frame.timestamp
+        self.acquisition.release()
+
+        for name, requestTime in list(self.pendingReferences.items()):
+            if frame.timestamp >= requestTime:
+                setattr(self, name, self.rawSpectrum.copy())
+                del self.pendingReferences[name]
+                self.updateReferences()
+                self.requestRescale()
+
+    def requestReference(self, name):
+        """Take the next spectrum integrated entirely after now as reference
+        (name is "whiteReference" or "darkReference")."""
+        integrationTime = self.integrationTime or 0
+        self.pendingReferences[name] = time.time() + integrationTime/1000
 
     def keyPress(self, event):
         """Event-handling function for keypress: if the user clicks command-Q
@@ -196,32 +295,36 @@ class SpectraViewer:
     def submitTime(self, event):
         """Event-handling function for when the user hits return/enter
         in the integration time text field. The new integration time
-        is set in the spectrometer.
+        is set in the spectrometer by the acquisition thread.
 
         We must autoscale the plot because the intensities could be very different.
-        However, it takes a small amount of time for the spectrometer to react.
-        We wait 0.3 seconds, which is small enough to not be annoying and seems to
-        work fine.
+        The spectrum being acquired still has the old integration time, so the
+        axes are rescaled with the first spectrum acquired after two new
+        integration times, without pausing the display.
 
         Anything incorrect will bring the integration time to 3 milliseconds.
         """
         try:
-            time = float(self.integrationTimeBox.text)
-            if time == 0:
+            integrationTime = float(self.integrationTimeBox.text)
+            if integrationTime == 0:
                 raise ValueError(
                     'Requested integration time is invalid: \
 the text "{0}" converts to 0.'
                 )
-            self.spectrometer.setIntegrationTime(time)
-            plt.pause(0.3)
-            self.axes.autoscale_view()
+            if self.acquisition is not None:
+                # Set by the reader thread, between two readouts
+                self.acquisition.setIntegrationTime(integrationTime)
+            else:
+                self.spectrometer.setIntegrationTime(integrationTime)
+            self.integrationTime = integrationTime
+            self.requestRescale(delay=2*integrationTime/1000)
         except Exception as err:
             print("Error when setting integration time: ", err)
             self.integrationTimeBox.set_val("3")
 
     def clickAutoscale(self, event):
         """Event-handling function to autoscale the plot"""
-        self.axes.autoscale_view()
+        self.rescale()
 
     def clickClearReferences(self, event):
         """Event-handling function to acquire a white reference"""
@@ -229,30 +332,39 @@ the text "{0}" converts to 0.'
         self.lightBtn.color = "0.85"
         self.darkReference = None
         self.darkBtn.color = "0.85"
-        plt.pause(0.3)
-        self.axes.autoscale_view()
+        self.pendingReferences.clear()
+        self.updateReferences()
+        self.requestRescale()
 
     def clickWhiteReference(self, event):
-        """Event-handling function to acquire a white reference"""
+        """Event-handling function to acquire a white reference. The reference
+        is the next spectrum acquired, taken by redraw()."""
         if self.whiteReference is None:
-            self.whiteReference = self.spectrometer.getSpectrum()
+            self.requestReference("whiteReference")
             self.lightBtn.color = "0.99"
         else:
             self.whiteReference = None
             self.lightBtn.color = "0.85"
-        plt.pause(0.3)
-        self.axes.autoscale_view()
+            self.updateReferences()
+            self.requestRescale()
 
     def clickDarkReference(self, event):
-        """Event-handling function to acquire a dark reference"""
+        """Event-handling function to acquire a dark reference. The reference
+        is the next spectrum acquired, taken by redraw()."""
         if self.darkReference is None:
-            self.darkReference = self.spectrometer.getSpectrum()
+            self.requestReference("darkReference")
             self.darkBtn.color = "0.99"
         else:
             self.darkReference = None
             self.darkBtn.color = "0.85"
-        plt.pause(0.3)
-        self.axes.autoscale_view()
+            self.updateReferences()
+            self.requestRescale()
+
+    def updateReferences(self):
+        """Give the current references to the processing stages. A white
+        reference is normalized by the dark reference if there is one."""
+        self.darkSubtraction.setReference(self.darkReference)
+        self.whiteNormalization.setReference(self.whiteReference, self.darkReference)
 
     def clickSave(self, event):
         """Write the current spectrum to the file path shown in the
@@ -266,17 +378,13 @@ the text "{0}" converts to 0.'
         filepath = self.filenameBox.text.strip()
         if not filepath:
             return
-        self.animation.event_source.stop()
-        try:
-            self.spectrometer.saveSpectrum(
-                filepath,
-                spectrum=self.lastSpectrum,
-                whiteReference=self.whiteReference,
-                darkReference=self.darkReference,
-            )
-            print("Saved spectrum to {0}".format(filepath))
-        finally:
-            self.animation.event_source.start()
+        self.spectrometer.saveSpectrum(
+            filepath,
+            spectrum=self.lastSpectrum,
+            whiteReference=self.whiteReference,
+            darkReference=self.darkReference,
+        )
+        print("Saved spectrum to {0}".format(filepath))
 
     def clickQuit(self, event):
         """Event-handling function to quit nicely."""
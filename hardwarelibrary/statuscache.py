@@ -0,0 +1,99 @@
+"""A per-device cache of recently read status values.
+
+GUIs and loggers call capability getters (power(), isLaserOn(), interlock(),
+wavelength(), ...) constantly, and each call is a round trip on the port even
+when a background status poll read the very same value a few milliseconds
+earlier. Every PhysicalDevice has a StatusCache (device.statusCache) that
+remembers each value with the time it was read:
+
+  * PhysicalDevice.getStatusUserInfo(), used by the status polls, stores every
+    field of the snapshot returned by doGetStatusUserInfo();
+  * the capability getters store what they read, and accept a maxAge argument:
+    a value younger than maxAge seconds is returned without any I/O;
+  * setters invalidate the fields they affect.
+
+Without a maxAge, a getter uses the field's time-to-live (ttls[field], or
+defaultTTL). Both default to 0, so out of the box every getter still reads the
+device; a GUI that can live with slightly old values sets for instance
+``device.statusCache.defaultTTL = 0.5``.
+
+A value read before an invalidation is never stored after it: a poll that was
+under way while a setter ran cannot put the old state back in the cache.
+"""
+
+import time
+from threading import RLock
+
+__all__ = ["StatusCache"]
+
+
+class StatusCache:
+    missing = object()  # returned by lookup() when no fresh value is cached
+
+    def __init__(self, defaultTTL=0.0, ttls=None):
+        self.defaultTTL = defaultTTL
+        self.ttls = dict(ttls or {})
+        self.lock = RLock()
+        self.values = {}        # field -> (value, timestamp)
+        self.generation = 0     # incremented by every invalidation
+        self.hits = 0
+        self.misses = 0
+
+    def ttl(self, field):
+        return self.ttls.get(field, self.defaultTTL)
+
+    def lookup(self, field, maxAge=None):
+        """The cached value of field if younger than maxAge (default: the
+        field's TTL), otherwise StatusCache.missing."""
+        if maxAge is None:
+            maxAge = self.ttl(field)
+        with self.lock:
+            entry = self.values.get(field)
+            if entry is not None and maxAge > 0 and time.monotonic() - entry[1] <= maxAge:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return StatusCache.missing
+
+    def read(self, field, getter, maxAge=None):
+        """The cached value of field, or the result of getter() (then cached)."""
+        value = self.lookup(field, maxAge)
+        if value is StatusCache.missing:
+            generation = self.generation
+            value = getter()
+            self.store(field, value, generation=generation)
+        return value
+
+    def store(self, field, value, timestamp=None, generation=None):
+        self.storeAll({field: value}, timestamp, generation)
+
+    def storeAll(self, status, timestamp=None, generation=None):
+        """Cache every field of a status dict. generation, if given, is the
+        value of self.generation when the reading started: the values are
+        dropped if an invalidation happened in the meantime."""
+        if not isinstance(status, dict):
+            return
+        if timestamp is None:
+            timestamp = time.monotonic()
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            for field, value in status.items():
+                self.values[field] = (value, timestamp)
+
+    def invalidate(self, *fields):
+        """Forget the given fields, or every field if none is given."""
+        with self.lock:
+            self.generation += 1
+            if len(fields) == 0:
+                self.values = {}
+            for field in fields:
+                self.values.pop(field, None)
+
+    def age(self, field):
+        """Seconds since field was read, or None if it is not cached."""
+        with self.lock:
+            entry = self.values.get(field)
+            if entry is None:
+                return None
+            return time.monotonic() - entry[1]
@@ -0,0 +1,291 @@
+import env
+import unittest
+import os
+import tempfile
+import time
+import threading
+import csv
+
+import numpy as np
+
+from hardwarelibrary.recording import ArrayRecorder, ArrayRecording, RecordingFormat
+from hardwarelibrary.spectrometers.recording import SpectrumRecorder
+from hardwarelibrary.spectrometers.acquisition import SpectrumAcquisition
+from hardwarelibrary.spectrometers.base import Spectrometer
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+
+class RampSpectrometer(Spectrometer):
+    classIdVendor = 0xFFFF
+    classIdProduct = 0xFFF1
+
+    def __init__(self):
+        super().__init__()
+        self.model = "Ramp"
+        self.wavelength = np.linspace(400, 800, 64)
+        self.count = 0
+
+    def getSerialNumber(self):
+        return "ramp-1"
+
+    def getSpectrum(self):
+        self.count += 1
+        return np.full(64, self.count % 65536, dtype=np.uint16)
+
+    def doInitializeDevice(self):
+        pass
+
+    def doShutdownDevice(self):
+        pass
+
+
+class SlowRecorder(ArrayRecorder):
+    def writeChunk(self, chunk, rows):
+        time.sleep(0.05)
+        super().writeChunk(chunk, rows)
+
+
+class StalledSpectrumRecorder(SpectrumRecorder):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.diskIsBack = threading.Event()
+
+    def writeChunk(self, chunk, rows):
+        self.diskIsBack.wait()
+        super().writeChunk(chunk, rows)
+
+
+class FailingRecorder(ArrayRecorder):
+    """A disk that fails on the first chunk, once diskFails is set."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.diskFails = threading.Event()
+
+    def writeChunk(self, chunk, rows):
+        self.diskFails.wait()
+        raise OSError("No space left on device")
+
+
+class TestArrayRecorder(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "run")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testRoundTrip(self):
+        recorder = ArrayRecorder(self.path, metadata={"integrationTime": 10},
+                                 arrays={"wavelength": np.arange(8.0)}, chunkSize=16)
+        for i in range(100):
+            recorder.append(np.full(8, i, dtype=np.uint16), timestamp=1000.0 + i)
+        recorder.close()
+
+        recording = ArrayRecording(self.path)
+        self.assertEqual(len(recording), 100)
+        self.assertEqual(recording.data.dtype, np.uint16)
+        self.assertTrue(np.array_equal(recording[42], np.full(8, 42)))
+        self.assertEqual(recording.timestamps[99], 1099.0)
+        self.assertEqual(recording.metadata, {"integrationTime": 10})
+        self.assertTrue(np.array_equal(recording.arrays["wavelength"], np.arange(8.0)))
+
+    def testReadbackIsMemoryMapped(self):
+        recorder = ArrayRecorder(self.path, chunkSize=10)
+        for i in range(50):
+            recorder.append(np.full((4, 4), i, dtype=np.float32))
+        recorder.close()
+
+        recording = ArrayRecording(self.path)
+        self.assertIsInstance(recording.data.base, np.memmap)
+        self.assertTrue(np.array_equal(recording.data[10:20:3, 0, 0], [10, 13, 16, 19]))
+
+    def testFlushMakesDataReadableWhileRecording(self):
+        recorder = ArrayRecorder(self.path, chunkSize=64)
+        for i in range(10):
+            recorder.append(np.full(4, i, dtype=np.int32))
+        self.assertTrue(recorder.flush(timeout=5))
+        self.assertEqual(len(ArrayRecording(self.path)), 10)
+
+        for i in range(10, 80):
+            recorder.append(np.full(4, i, dtype=np.int32))
+        recorder.close()
+        self.assertEqual(ArrayRecording(self.path).data[-1, 0], 79)
+
+    def testAppendDoesNotWaitForDisk(self):
+        recorder = SlowRecorder(self.path, chunkSize=8, maxPendingChunks=4, dropWhenBehind=True)
+        startTime = time.perf_counter()
+        for i in range(200):
+            recorder.append(np.zeros(16))
+        duration = time.perf_counter() - startTime
+        recorder.close()
+
+        statistics = recorder.statistics()
+        self.assertLess(duration, 0.05)
+        self.assertGreater(statistics.dropped, 0)
+        self.assertEqual(statistics.written + statistics.dropped, 200)
+        self.assertEqual(len(ArrayRecording(self.path)), statistics.written)
+
+    def testWaitsForDiskUnlessDropping(self):
+        recorder = SlowRecorder(self.path, chunkSize=4, maxPendingChunks=1)
+        for i in range(20):
+            recorder.append(np.full(2, i))
+        recorder.close()
+        self.assertEqual(recorder.statistics().dropped, 0)
+        self.assertEqual(len(ArrayRecording(self.path)), 20)
+
+    def testFlushRaisesWhenTheWriterFails(self):
+        recorder = FailingRecorder(self.path, chunkSize=4)
+        for i in range(10):
+            recorder.append(np.full(2, i))
+
+        errors = []
+
+        def flush():
+            try:
+                recorder.flush()
+            except OSError as err:
+                errors.append(err)
+
+        waiting = threading.Thread(target=flush, daemon=True)
+        waiting.start()
+        time.sleep(0.05)
+        recorder.diskFails.set()
+        waiting.join(timeout=2)
+        self.assertFalse(waiting.is_alive())
+        self.assertEqual(len(errors), 1)
+
+        with self.assertRaises(OSError):
+            recorder.flush()
+        with self.assertRaises(OSError):
+            recorder.close()
+
+    def testCompressedRoundTrip(self):
+        recorder = ArrayRecorder(self.path, chunkSize=16, compression="zlib")
+        for i in range(100):
+            recorder.append(np.full((8, 8), i, dtype=np.uint16), timestamp=float(i))
+        recorder.close()
+
+        self.assertFalse(os.path.exists(os.path.join(self.path, "data.npy")))
+        statistics = recorder.statistics()
+        self.assertLess(statistics.bytesWritten, 100*8*8*2)
+        self.assertGreater(statistics.writeBandwidth, 0)
+
+        recording = ArrayRecording(self.path)
+        self.assertEqual(len(recording), 100)
+        self.assertEqual(recording.data.shape, (100, 8, 8))
+        self.assertTrue(np.array_equal(recording[42], np.full((8, 8), 42)))
+        self.assertEqual(recording[-1][0, 0], 99)
+        self.assertTrue(np.array_equal(recording.data[10:40:10, 0, 0], [10, 20, 30]))
+        self.assertTrue(np.array_equal(recording.data[[3, 60, 5], 1, 1], [3, 60, 5]))
+        self.assertEqual(recording.timestamps[99], 99.0)
+
+    def testCompressedRecordingIsReadableWhileRecording(self):
+        recorder = ArrayRecorder(self.path, chunkSize=8, compression="zlib")
+        for i in range(20):
+            recorder.append(np.full(4, i, dtype=np.int32))
+        self.assertTrue(recorder.flush(timeout=5))
+        recording = ArrayRecording(self.path)
+        self.assertEqual(len(recording), 20)
+        self.assertEqual(recording[19][0], 19)
+        recorder.close()
+
+    def testStatisticsShowBandwidth(self):
+        recorder = ArrayRecorder(self.path, chunkSize=10)
+        for i in range(100):
+            recorder.append(np.zeros(1000, dtype=np.float64))
+        recorder.close()
+        statistics = recorder.statistics()
+        self.assertEqual(statistics.bytesWritten, 100*1000*8 + 100*8)
+        self.assertGreater(statistics.writeTime, 0)
+
+    def testFormatFromPath(self):
+        self.assertEqual(RecordingFormat.fromPath("run.h5"), RecordingFormat.hdf5)
+        self.assertEqual(RecordingFormat.fromPath("run"), RecordingFormat.npy)
+
+    @unittest.skipIf(h5py is None, "h5py not installed")
+    def testHdf5RoundTrip(self):
+        path = self.path + ".h5"
+        recorder = ArrayRecorder(path, arrays={"wavelength": np.arange(4.0)}, chunkSize=8)
+        for i in range(20):
+            recorder.append(np.full(4, i, dtype=np.uint16), timestamp=float(i))
+        recorder.close()
+
+        recording = ArrayRecording(path)
+        self.assertEqual(len(recording), 20)
+        self.assertEqual(recording.data[7, 0], 7)
+        self.assertEqual(recording.timestamps[19], 19.0)
+        recording.close()
+
+    def testBenchmarkAgainstCSV(self):
+        spectrum = np.random.default_rng(5).integers(0, 65536, 2048).astype(np.uint16)
+        wavelength = np.linspace(400, 1000, 2048)
+        count = 20
+
+        startTime = time.perf_counter()
+        for i in range(count):
+            with open(os.path.join(self.directory.name, "spectrum{0}.csv".format(i)), "w", newline="\n") as csvfile:
+                fileWrite = csv.writer(csvfile, delimiter=",")
+                for x, y in zip(wavelength, spectrum):
+                    fileWrite.writerow(["{0:.2f}".format(x), y])
+        csvDuration = time.perf_counter() - startTime
+
+        recorder = ArrayRecorder(self.path, arrays={"wavelength": wavelength})
+        startTime = time.perf_counter()
+        for i in range(count*100):
+            recorder.append(spectrum)
+        recorder.close()
+        duration = time.perf_counter() - startTime
+
+        self.assertLess(duration/(count*100), csvDuration/count)
+        print("\nRecording: {0:.0f} spectra/s (CSV: {1:.0f} spectra/s)".format(
+              count*100/duration, count/csvDuration))
+
+
+class TestSpectrumRecorder(unittest.TestCase):
+    def testRecordsAcquisitionWithCalibration(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "kinetics")
+            spectrometer = RampSpectrometer()
+            recorder = SpectrumRecorder(path, spectrometer, metadata={"sample": "A"})
+            acquisition = SpectrumAcquisition(spectrometer, recorder=recorder)
+            acquisition.start()
+            time.sleep(0.05)
+            acquisition.stop()
+            recorder.close()
+
+            recording = ArrayRecording(path)
+            self.assertEqual(len(recording) + recorder.statistics().dropped,
+                             acquisition.statistics().acquired)
+            self.assertEqual(recording.metadata["serialNumber"], "ramp-1")
+            self.assertEqual(recording.metadata["sample"], "A")
+            self.assertTrue(np.array_equal(recording.arrays["wavelength"], spectrometer.wavelength))
+            self.assertTrue(np.array_equal(recording.data[:5, 0], [1, 2, 3, 4, 5]))
+            self.assertTrue(np.all(np.diff(recording.timestamps) >= 0))
+
+    def testStalledDiskDropsSpectraInsteadOfStallingTheReader(self):
+        with tempfile.TemporaryDirectory() as directory:
+            spectrometer = RampSpectrometer()
+            recorder = StalledSpectrumRecorder(os.path.join(directory, "kinetics"), spectrometer,
+                                               chunkSize=4, maxPendingChunks=1)
+            acquisition = SpectrumAcquisition(spectrometer, recorder=recorder)
+            acquisition.start()
+            try:
+                time.sleep(0.1)
+                acquired = acquisition.statistics().acquired
+            finally:
+                recorder.diskIsBack.set()
+                acquisition.stop()
+                recorder.close()
+
+            statistics = recorder.statistics()
+            self.assertGreater(acquired, 100)
+            self.assertGreater(statistics.dropped, 0)
+            self.assertEqual(statistics.written + statistics.dropped, acquisition.statistics().acquired)
+
+
+if __name__ == "__main__":
+    unittest.main()
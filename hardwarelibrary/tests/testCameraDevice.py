@@ -0,0 +1,238 @@
+import env
+import unittest
+import os
+import tempfile
+import time
+import threading
+
+import numpy as np
+from notificationcenter import NotificationCenter
+
+from hardwarelibrary.cameras import CameraDevice, CameraDeviceNotification, FrameRecorder
+from hardwarelibrary.ringbuffer import OverflowPolicy
+from hardwarelibrary.recording import ArrayRecording
+
+
+class CountingCamera(CameraDevice):
+    """Frames of 48x64x3 pixels filled with the frame number (modulo 256)."""
+    classIdVendor = 0xFFFF
+    classIdProduct = 0xFFF1
+    shape = (48, 64, 3)
+
+    def __init__(self, delay=0.0):
+        super().__init__(serialNumber="counting")
+        self.delay = delay
+        self.count = 0
+        self.allocations = 0
+        self.intoCalls = 0
+
+    def doCaptureFrame(self):
+        self.allocations += 1
+        frame = np.empty(self.shape, dtype=np.uint8)
+        self.fill(frame)
+        return frame
+
+    def doCaptureFrameInto(self, frame):
+        self.intoCalls += 1
+        self.fill(frame)
+
+    def fill(self, frame):
+        if self.delay > 0:
+            time.sleep(self.delay)
+        frame.fill(self.count % 256)
+        self.count += 1
+
+
+class TestCaptureFrames(unittest.TestCase):
+    def testContiguousArrayWithoutCapturing(self):
+        camera = CountingCamera()
+        frames = camera.captureFrames(5)
+        self.assertEqual(frames.shape, (5, 48, 64, 3))
+        self.assertTrue(frames.flags['C_CONTIGUOUS'])
+        self.assertEqual(list(frames[:, 0, 0, 0]), [0, 1, 2, 3, 4])
+        self.assertEqual(camera.allocations, 1)
+
+    def testContiguousArrayWhileCapturing(self):
+        camera = CountingCamera(delay=0.002)
+        camera.overflowPolicy = OverflowPolicy.block
+        camera.start()
+        try:
+            frames = camera.captureFrames(10)
+        finally:
+            camera.stop()
+        self.assertEqual(frames.shape, (10, 48, 64, 3))
+        self.assertTrue(np.all(np.diff(frames[:, 0, 0, 0].astype(int)) == 1))
+
+
+class TestFrameBuffer(unittest.TestCase):
+    def testFramesAreViewsOnPreallocatedSlots(self):
+        camera = CountingCamera(delay=0.002)
+        camera.start()
+        try:
+            slots = set()
+            for i in range(10):
+                frame = camera.nextFrame(timeout=1)
+                self.assertEqual(frame.data.shape, (48, 64, 3))
+                self.assertIsNotNone(frame.data.base)
+                slots.add(frame.data.__array_interface__['data'][0])
+        finally:
+            camera.stop()
+        self.assertLessEqual(len(slots), camera.bufferCapacity)
+        self.assertEqual(camera.allocations, 1)
+
+    def testBlockPolicyDeliversEveryFrameInOrder(self):
+        camera = CountingCamera()
+        camera.overflowPolicy = OverflowPolicy.block
+        camera.start()
+        try:
+            indices = []
+            values = []
+            for i in range(20):
+                frame = camera.nextFrame(timeout=1)
+                indices.append(frame.index)
+                values.append(int(frame.data[0, 0, 0]))
+                time.sleep(0.002)
+        finally:
+            camera.stop()
+        self.assertEqual(indices, list(range(20)))
+        self.assertEqual(values, list(range(20)))
+        self.assertEqual(camera.captureStatistics().dropped, 0)
+
+    def testDropOldestCountsDroppedFrames(self):
+        camera = CountingCamera(delay=0.001)
+        camera.start()
+        try:
+            time.sleep(0.1)
+            frame = camera.latestFrame(timeout=1)
+            self.assertGreater(frame.index, 10)
+            statistics = camera.captureStatistics()
+        finally:
+            camera.stop()
+        self.assertEqual(statistics.delivered, 1)
+        self.assertGreater(statistics.dropped, 10)
+        self.assertEqual(statistics.captured, statistics.delivered + statistics.dropped + statistics.queued)
+
+    def testSlowObserverGetsCopies(self):
+        received = []
+
+        def slowObserver(notification):
+            received.append(notification.user_info)
+            time.sleep(0.005)
+
+        camera = CountingCamera()
+        NotificationCenter().add_observer(self, slowObserver, CameraDeviceNotification.imageCaptured, camera)
+        try:
+            camera.start()
+            time.sleep(0.1)
+            camera.stop()
+        finally:
+            NotificationCenter().remove_observer(self)
+        self.assertGreater(len(received), 3)
+        values = [int(frame[0, 0, 0]) for frame in received]
+        self.assertEqual(values, list(range(len(values))))
+
+    def testStopBeforeTheFirstFrameUnderTheCameraLock(self):
+        camera = CountingCamera(delay=0.1)
+        camera.start()
+
+        def stopWithLock():
+            with camera.lock:
+                camera.stop()
+
+        stopping = threading.Thread(target=stopWithLock, daemon=True)
+        stopping.start()
+        stopping.join(timeout=2)
+        self.assertFalse(stopping.is_alive())
+        self.assertFalse(camera.isCapturing)
+        self.assertIsNone(camera.frameBuffer)
+
+    def testStopWakesUpBlockedCapture(self):
+        camera = CountingCamera()
+        camera.overflowPolicy = OverflowPolicy.block
+        camera.start()
+        time.sleep(0.05)
+        camera.stop()
+        self.assertFalse(camera.isCapturing)
+        self.assertEqual(camera.captureStatistics().captured, camera.bufferCapacity)
+        self.assertIsNotNone(camera.nextFrame(timeout=0))
+
+
+class StalledRecorder(FrameRecorder):
+    """A disk much slower than the camera."""
+    def writeChunk(self, chunk, rows):
+        time.sleep(0.2)
+        super().writeChunk(chunk, rows)
+
+
+class TestFrameRecording(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "movie")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testRecordsEveryFrameWithItsTimestamp(self):
+        camera = CountingCamera(delay=0.001)
+        camera.start()
+        recorder = camera.startRecording(self.path, compression="zlib")
+        try:
+            timestamps = {}
+            for i in range(20):
+                frame = camera.nextFrame(timeout=1)
+                timestamps[frame.index] = frame.timestamp
+        finally:
+            camera.stopRecording()
+            camera.stop()
+
+        recording = ArrayRecording(self.path)
+        statistics = recorder.statistics()
+        self.assertGreater(len(recording), 10)
+        self.assertEqual(statistics.dropped, 0)
+        self.assertEqual(recording.data.shape[1:], (48, 64, 3))
+        self.assertEqual(recording.metadata["model"], "CountingCamera")
+        values = recording.data[:, 0, 0, 0].astype(int)
+        self.assertTrue(np.all(np.diff(values) % 256 == 1))
+        self.assertTrue(np.all(np.diff(recording.timestamps) > 0))
+        matched = 0
+        for i in range(len(recording)):
+            if values[i] in timestamps:
+                self.assertEqual(recording.timestamps[i], timestamps[values[i]])
+                matched += 1
+        self.assertGreater(matched, 0)
+
+    def testSlowDiskDoesNotSlowDownCapture(self):
+        camera = CountingCamera(delay=0.001)
+        camera.start()
+        try:
+            time.sleep(0.1)
+            before = camera.captureStatistics().captured
+            time.sleep(0.2)
+            rateWithout = (camera.captureStatistics().captured - before)/0.2
+
+            recorder = camera.startRecording(recorder=StalledRecorder(self.path, camera=camera,
+                                                                      chunkSize=4, maxPendingChunks=2))
+            before = camera.captureStatistics().captured
+            time.sleep(0.2)
+            rateWith = (camera.captureStatistics().captured - before)/0.2
+        finally:
+            camera.stopRecording()
+            camera.stop()
+
+        statistics = recorder.statistics()
+        self.assertGreater(rateWith, 0.6*rateWithout)
+        self.assertGreater(statistics.dropped, 0)
+        self.assertLessEqual(statistics.maxPendingChunks, 3)
+        self.assertEqual(len(ArrayRecording(self.path)), statistics.written)
+
+    def testOnlyOneRecorderAtATime(self):
+        camera = CountingCamera()
+        camera.startRecording(self.path)
+        with self.assertRaises(RuntimeError):
+            camera.startRecording(self.path + "2")
+        self.assertIsNotNone(camera.stopRecording())
+        self.assertIsNone(camera.stopRecording())
+
+
+if __name__ == '__main__':
+    unittest.main()
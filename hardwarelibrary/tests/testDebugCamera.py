@@ -0,0 +1,125 @@
+import env
+import unittest
+import os
+import tempfile
+import time
+import threading
+
+import numpy as np
+from notificationcenter import NotificationCenter
+
+from hardwarelibrary.cameras import DebugCameraDevice, CameraDeviceNotification
+from hardwarelibrary.physicaldevice import DeviceState
+
+
+class TestDebugCameraDevice(unittest.TestCase):
+    def setUp(self):
+        self.camera = DebugCameraDevice(width=320, height=240, seed=0)
+        self.camera.initializeDevice()
+
+    def tearDown(self):
+        self.camera.shutdownDevice()
+
+    def testFrameShapeAndType(self):
+        self.assertEqual(self.camera.state, DeviceState.Ready)
+        frames = self.camera.captureFrames(3)
+        self.assertEqual(frames.shape, (3, 240, 320, 3))
+        self.assertEqual(frames.dtype, np.uint8)
+
+        camera = DebugCameraDevice(width=64, height=32, channels=1, dtype="uint16")
+        frame = camera.doCaptureFrame()
+        self.assertEqual(frame.shape, (32, 64))
+        self.assertEqual(frame.dtype, np.uint16)
+        self.assertGreater(frame.max(), 1000)
+
+    def testPatternMovesAndIsNoisy(self):
+        first, second = self.camera.captureFrames(2).astype(int)
+        self.assertFalse(np.array_equal(first, second))
+        # Scrolled by one pixel, up to the noise
+        self.assertLessEqual(np.abs(first[:, 1:100, 0] - second[:, :99, 0]).max(), 16)
+        self.assertGreater(first.std(), 10)
+
+    def testReuseBuffers(self):
+        self.assertIs(self.camera.doCaptureFrame(), self.camera.doCaptureFrame())
+        camera = DebugCameraDevice(width=32, height=16, reuseBuffers=False)
+        self.assertIsNot(camera.doCaptureFrame(), camera.doCaptureFrame())
+
+    def testFrameRate(self):
+        camera = DebugCameraDevice(width=32, height=16, frameRate=100)
+        startTime = time.perf_counter()
+        camera.captureFrames(21)
+        self.assertAlmostEqual(time.perf_counter() - startTime, 0.2, delta=0.05)
+
+    def testShutdownWhileCapturing(self):
+        camera = DebugCameraDevice(width=64, height=48, frameRate=30)
+        camera.initializeDevice()
+        camera.start()
+        time.sleep(0.3)
+        shutdown = threading.Thread(target=camera.shutdownDevice, daemon=True)
+        shutdown.start()
+        shutdown.join(timeout=2)
+        self.assertFalse(shutdown.is_alive())
+        self.assertFalse(camera.isCapturing)
+        self.assertEqual(camera.state, DeviceState.Recognized)
+
+    def testIntegerPixelsOnly(self):
+        with self.assertRaises(ValueError):
+            DebugCameraDevice(dtype="float32")
+
+
+class TestCaptureThroughput(unittest.TestCase):
+    """Frames/s and MB/s of the capture loop, without hardware. The numbers are
+    printed; the assertions are only loose bounds."""
+
+    def setUp(self):
+        self.camera = DebugCameraDevice(width=640, height=480, seed=0)
+        self.camera.initializeDevice()
+        self.received = 0
+
+    def tearDown(self):
+        NotificationCenter().remove_observer(self)
+        self.camera.shutdownDevice()
+
+    def receive(self, notification):
+        self.received += 1
+
+    def measure(self, duration=0.3):
+        self.camera.start()
+        try:
+            time.sleep(duration)
+        finally:
+            self.camera.stop()
+        captured = self.camera.captureStatistics().captured
+        frameBytes = 640*480*3
+        return captured/duration, captured*frameBytes/duration/1e6
+
+    def report(self, label, rate, bandwidth):
+        print("\n{0}: {1:.0f} frames/s, {2:.0f} MB/s".format(label, rate, bandwidth))
+
+    def testCaptureLoop(self):
+        rate, bandwidth = self.measure()
+        self.report("Capture into the frame buffer", rate, bandwidth)
+        self.assertGreater(rate, 100)
+
+    def testNotificationFanOut(self):
+        for i in range(8):
+            NotificationCenter().add_observer(self, self.receive, CameraDeviceNotification.imageCaptured, self.camera)
+        rate, bandwidth = self.measure()
+        self.report("Capture with imageCaptured observed", rate, bandwidth)
+        self.assertGreater(self.received, 0)
+
+    def testRecording(self):
+        with tempfile.TemporaryDirectory() as directory:
+            recorder = self.camera.startRecording(os.path.join(directory, "movie"))
+            rate, bandwidth = self.measure()
+            self.camera.stopRecording()
+            statistics = recorder.statistics()
+        self.report("Capture while recording", rate, bandwidth)
+        print("Recorder: {0} written, {1} dropped, disk {2:.0f} MB/s".format(
+              statistics.written, statistics.dropped, statistics.writeBandwidth/1e6))
+        self.assertEqual(statistics.written, statistics.appended)
+        self.assertGreater(statistics.written, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
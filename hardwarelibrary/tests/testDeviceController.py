@@ -1,10 +1,14 @@
 import env  # noqa: F401  (sets sys.path)
+import asyncio
 import time
 import unittest
-from threading import Lock
+from threading import Event, Lock
 
 from hardwarelibrary.devicecontroller import (
-    DeviceController, DeviceControllerNotification, connectionErrorReason)
+    CommandPriority, DeviceController, DeviceControllerNotification,
+    connectionErrorReason)
+from hardwarelibrary.scheduler import DeviceScheduler
+from hardwarelibrary.pollpolicy import AdaptivePollPolicy
 from notificationcenter import NotificationCenter
 from hardwarelibrary.sources.millennia import DebugMillenniaDevice
 
@@ -207,6 +211,146 @@ class TestDeviceController(unittest.TestCase):
             rec.names().count(DeviceControllerNotification.didConnect), before,
             "must not reconnect when autoReconnect is False")
 
+    # -- priorities and coalescing --
+
+    def blockWorker(self, controller):
+        """Occupy the worker until the returned Event is set, so that the
+        next submissions accumulate in the queue."""
+        release = Event()
+        started = Event()
+
+        def wait(device):
+            started.set()
+            release.wait(3.0)
+
+        controller.submit(wait)
+        self.assertTrue(started.wait(3.0))
+        return release
+
+    def testBurstOfCommandsIsFollowedByOnePoll(self):
+        controller, rec = self.make(pollInterval=10.0)
+        controller.connect()
+        rec.wait_for(DeviceControllerNotification.didConnect)
+        rec.wait_for(DeviceControllerNotification.status)
+        before = rec.names().count(DeviceControllerNotification.status)
+
+        release = self.blockWorker(controller)
+        futures = [controller.submit(lambda device, p=i: device.setPower(1.0 + p * 0.1))
+                   for i in range(50)]
+        release.set()
+        for future in futures:
+            future.result(timeout=3.0)
+        self.assertTrue(rec.wait_seen(DeviceControllerNotification.status))
+        time.sleep(0.2)
+        self.assertLessEqual(rec.names().count(DeviceControllerNotification.status) - before, 2)
+
+    def testInteractiveCommandsGoBeforeScriptedOnes(self):
+        controller, rec = self.make()
+        controller.connect()
+        rec.wait_for(DeviceControllerNotification.didConnect)
+
+        order = []
+        release = self.blockWorker(controller)
+        for i in range(5):
+            controller.submit(lambda device, i=i: order.append(i), priority=CommandPriority.scripted)
+        last = controller.submit(lambda device: order.append("user"))
+        release.set()
+        last.result(timeout=3.0)
+        controller.submit(lambda device: None, priority=CommandPriority.scripted).result(timeout=3.0)
+        self.assertEqual(order, ["user", 0, 1, 2, 3, 4])
+
+    def testDisconnectThenConnectRunInOrder(self):
+        controller, rec = self.make()
+        controller.connect().result(timeout=3.0)
+
+        release = self.blockWorker(controller)
+        disconnected = controller.disconnect()
+        connected = controller.connect()
+        release.set()
+        disconnected.result(timeout=3.0)
+        self.assertTrue(connected.result(timeout=3.0))
+        self.assertTrue(controller.isConnected)
+        self.assertTrue(controller.wantConnected)
+
+    def testCoalescedSettersOnlySendTheLatestValue(self):
+        controller, rec = self.make()
+        controller.connect()
+        rec.wait_for(DeviceControllerNotification.didConnect)
+
+        sent = []
+        release = self.blockWorker(controller)
+        futures = [controller.submit(lambda device, p=p: sent.append(p), coalesceKey="power")
+                   for p in range(10)]
+        release.set()
+        futures[-1].result(timeout=3.0)
+        self.assertEqual(sent, [9])
+        self.assertTrue(all(future.cancelled() for future in futures[:-1]))
+
+    # -- adaptive polling --
+
+    def testAdaptivePollingBacksOffAndPostsOnlyChanges(self):
+        policy = AdaptivePollPolicy(minInterval=0.02, maxInterval=2.0)
+        controller, rec = self.make(pollPolicy=policy)
+        controller.connect().result(timeout=3.0)
+        rec.wait_for(DeviceControllerNotification.status)
+        time.sleep(0.4)
+        self.assertEqual(rec.names().count(DeviceControllerNotification.status), 1)
+        self.assertGreater(controller.currentPollInterval, 0.2)
+
+        controller.submit(lambda device: device.turnOn()).result(timeout=3.0)
+        deadline = time.time() + 3.0
+        while rec.names().count(DeviceControllerNotification.status) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(rec.last_status()["isLaserOn"])
+
+    # -- asyncio --
+
+    def testConnectAndDisconnectFuturesResolve(self):
+        controller, rec = self.make()
+        self.assertTrue(controller.connect().result(timeout=3.0))
+        self.assertIsNone(controller.disconnect().result(timeout=3.0))
+        self.assertFalse(controller.isConnected)
+
+    def testAwaitableCommandsAndStatusSnapshots(self):
+        controller, rec = self.make(pollInterval=0.05)
+
+        async def client():
+            self.assertTrue(await controller.connectAsync())
+            await controller.submitAsync(lambda device: device.setPower(5.0))
+            readings = await asyncio.gather(*[controller.submitAsync(lambda device: device.power())
+                                              for i in range(100)])
+            snapshots = []
+            async for status in controller.statusSnapshots():
+                snapshots.append(status)
+                if len(snapshots) == 3:
+                    break
+            await controller.disconnectAsync()
+            return readings, snapshots
+
+        readings, snapshots = asyncio.run(client())
+        self.assertEqual(readings, [5.0] * 100)
+        self.assertEqual(snapshots[-1]["power"], 5.0)
+        self.assertFalse(controller.isConnected)
+
+    def testStatusSnapshotsObserverIsRemoved(self):
+        controller, rec = self.make(pollInterval=0.05)
+        controller.connect().result(timeout=3.0)
+        countBefore = NotificationCenter().observers_count()
+
+        async def client():
+            async for status in controller.statusSnapshots():
+                self.assertEqual(NotificationCenter().observers_count(), countBefore + 1)
+                break
+
+        asyncio.run(client())
+        self.assertEqual(NotificationCenter().observers_count(), countBefore)
+
+    def testStatusSnapshotsRejectsInvalidMaxsize(self):
+        controller, rec = self.make()
+        for maxsize in (0, -1):
+            with self.assertRaises(ValueError):
+                controller.statusSnapshots(maxsize=maxsize)
+
     # -- misc --
 
     def testDeviceWithoutStatusStillConnects(self):
@@ -224,5 +368,34 @@ class TestDeviceController(unittest.TestCase):
         self.assertIsNone(connectionErrorReason(RuntimeError("weird")))
 
 
+class TestDeviceControllerWithScheduler(TestDeviceController):
+    """The same behaviour, with the controller's loop run by a shared
+    DeviceScheduler instead of its own thread."""
+
+    def setUp(self):
+        super().setUp()
+        self.scheduler = DeviceScheduler(maxWorkers=2)
+
+    def tearDown(self):
+        super().tearDown()
+        self.scheduler.stop()
+
+    def make(self, device=None, **kwargs):
+        kwargs.setdefault("scheduler", self.scheduler)
+        return super().make(device=device, **kwargs)
+
+    def testNoThreadPerController(self):
+        controllers = []
+        for i in range(20):
+            controller, rec = self.make()
+            controller.connect()
+            controllers.append((controller, rec))
+        for controller, rec in controllers:
+            self.assertIsNotNone(rec.wait_for(DeviceControllerNotification.didConnect))
+        self.assertFalse(any(controller.thread.is_alive() for controller, rec in controllers))
+        for controller, rec in controllers:
+            self.assertIsNotNone(rec.wait_for(DeviceControllerNotification.status))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -2,11 +2,31 @@ import env
 import unittest
 
 from hardwarelibrary.communication.diagnostics import *
-from hardwarelibrary.devicemanager import DeviceManager, DeviceManagerNotification
+from hardwarelibrary.devicemanager import DeviceManager, DeviceManagerNotification, DebugPhysicalDevice
 from hardwarelibrary.motion import DebugLinearMotionDevice, LinearMotionDevice
 from hardwarelibrary.motion import SutterDevice
 from notificationcenter import NotificationCenter
-from hardwarelibrary.physicaldevice import PhysicalDevice
+from hardwarelibrary.physicaldevice import PhysicalDevice, DeviceState
+from hardwarelibrary.capabilities import OnOffCapability, ShutterCapability
+from hardwarelibrary.sources.millennia import DebugMillenniaDevice
+
+
+class SlowDebugDevice(DebugPhysicalDevice):
+    def __init__(self, delay=0.2, portPath=None):
+        super().__init__()
+        self.delay = delay
+        self.portPath = portPath
+        self.events = []
+
+    def doInitializeDevice(self):
+        self.events.append(("init", time.perf_counter()))
+        time.sleep(self.delay)
+        super().doInitializeDevice()
+        self.events.append(("ready", time.perf_counter()))
+
+    def doShutdownDevice(self):
+        self.events.append(("shutdown", time.perf_counter()))
+        super().doShutdownDevice()
 
 
 class TestDeviceManager(unittest.TestCase):
@@ -106,6 +126,101 @@ class TestDeviceManager(unittest.TestCase):
         self.assertTrue(len(matched) == 1)
         self.assertTrue(device2 in matched)
 
+    def testIndexesFollowAddAndRemove(self):
+        dm = DeviceManager()
+        stage = DebugLinearMotionDevice()
+        laser = DebugMillenniaDevice()
+        laser.serialNumber = "laser1"
+        dm.addDevice(stage)
+        dm.addDevice(laser)
+
+        self.assertEqual(dm.anyLinearMotionDevice(), stage)
+        self.assertEqual(dm.devicesWithCapability(ShutterCapability), [laser])
+        self.assertEqual(dm.anyDeviceWithCapability(OnOffCapability), laser)
+        self.assertEqual(dm.devicesWithSerialNumber("laser1"), [laser])
+        self.assertEqual(dm.matchPhysicalDevicesOfType(PhysicalDevice), [stage, laser])
+
+        laser.serialNumber = "renamed"
+        dm.removeDevice(laser)
+        self.assertEqual(dm.devicesWithCapability(ShutterCapability), [])
+        self.assertEqual(dm.devicesWithSerialNumber("laser1"), [])
+        self.assertIsNone(dm.anyDeviceWithCapability(OnOffCapability))
+        self.assertEqual(dm.matchPhysicalDevicesOfType(PhysicalDevice), [stage])
+
+    def testSendCommandUnknownSerialNumber(self):
+        dm = DeviceManager()
+        dm.addDevice(DebugLinearMotionDevice())
+        with self.assertRaises(KeyError):
+            dm.sendCommand("VERSION", deviceIdentifier="nothere")
+
+    def testInitializeAllRunsConcurrently(self):
+        dm = DeviceManager()
+        devices = [SlowDebugDevice() for i in range(6)]
+
+        startTime = time.perf_counter()
+        results = dm.initializeAll(devices)
+        self.assertLess(time.perf_counter() - startTime, 0.2 * 3)
+
+        self.assertEqual(len(results), 6)
+        self.assertTrue(all(result.succeeded for result in results))
+        self.assertTrue(all(result.duration >= 0.2 for result in results))
+        self.assertTrue(all(device.state == DeviceState.Ready for device in devices))
+
+        results = dm.shutdownAll(devices)
+        self.assertTrue(all(result.succeeded for result in results))
+        self.assertTrue(all(device.state == DeviceState.Recognized for device in devices))
+
+    def testSharedPortIsInitializedSequentially(self):
+        dm = DeviceManager()
+        first = SlowDebugDevice(portPath="/dev/cu.shared")
+        second = SlowDebugDevice(portPath="/dev/cu.shared")
+        dm.initializeAll([first, second])
+
+        (_, firstStart), (_, firstEnd) = first.events
+        (_, secondStart), (_, secondEnd) = second.events
+        self.assertTrue(firstEnd <= secondStart or secondEnd <= firstStart)
+
+    def testPrerequisiteComesFirstAndFailureSkipsDependents(self):
+        dm = DeviceManager()
+        powerStrip = SlowDebugDevice(delay=0.1)
+        instrument = SlowDebugDevice(delay=0)
+        dm.addDependency(instrument, powerStrip)
+
+        dm.initializeAll([instrument, powerStrip])
+        self.assertLessEqual(powerStrip.events[-1][1], instrument.events[0][1])
+
+        dm.shutdownAll([instrument, powerStrip])
+        self.assertLessEqual(instrument.events[-1][1], powerStrip.events[-1][1])
+
+        powerStrip.errorInitialize = True
+        results = {result.device: result for result in dm.initializeAll([instrument, powerStrip])}
+        self.assertIsNotNone(results[powerStrip].error)
+        self.assertTrue(results[instrument].skipped)
+        self.assertNotEqual(instrument.state, DeviceState.Ready)
+
+    def testRemovedDeviceIsForgottenInDependencies(self):
+        dm = DeviceManager()
+        powerStrip = SlowDebugDevice(delay=0)
+        instrument = SlowDebugDevice(delay=0)
+        detector = SlowDebugDevice(delay=0)
+        for device in (powerStrip, instrument, detector):
+            dm.addDevice(device)
+        dm.addDependency(instrument, powerStrip)
+        dm.addDependency(detector, instrument)
+
+        dm.removeDevice(instrument)
+        self.assertNotIn(instrument, dm.dependencies)
+        self.assertNotIn(instrument, dm.dependencies[detector])
+
+    def testCircularDependencyIsRejected(self):
+        dm = DeviceManager()
+        first = SlowDebugDevice(delay=0)
+        second = SlowDebugDevice(delay=0)
+        dm.addDependency(first, second)
+        dm.addDependency(second, first)
+        with self.assertRaises(ValueError):
+            dm.initializeAll([first, second])
+
     def testStartRunLoop(self):
         dm = DeviceManager()
         dm.startMonitoring()
@@ -0,0 +1,126 @@
+import env
+import unittest
+import threading
+import time
+
+from hardwarelibrary.scheduler import DeviceScheduler
+from hardwarelibrary.sources.millennia import DebugMillenniaDevice
+from hardwarelibrary.physicaldevice import PhysicalDeviceNotification
+from notificationcenter import NotificationCenter
+
+
+class TestDeviceScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = DeviceScheduler(maxWorkers=4)
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def testOneShotTaskRunsAfterDelay(self):
+        done = threading.Event()
+        startTime = time.monotonic()
+        self.scheduler.schedule(self, lambda: done.set(), delay=0.1)
+        self.assertTrue(done.wait(2.0))
+        self.assertGreaterEqual(time.monotonic() - startTime, 0.1)
+
+    def testRepeatingTaskUntilCancelled(self):
+        runs = []
+        task = self.scheduler.scheduleRepeating(self, lambda: runs.append(time.monotonic()), interval=0.05)
+        time.sleep(0.5)
+        task.cancel(wait=True)
+        count = len(runs)
+        self.assertTrue(5 <= count <= 12)
+        time.sleep(0.2)
+        self.assertEqual(len(runs), count)
+
+    def testRescheduledTaskRunsNowThenKeepsItsInterval(self):
+        runs = []
+        task = self.scheduler.scheduleRepeating(self, lambda: runs.append(time.monotonic()),
+                                                interval=0.5, initialDelay=0.5)
+        time.sleep(0.05)
+        startTime = time.monotonic()
+        self.scheduler.reschedule(task)
+        time.sleep(0.1)
+        self.assertEqual(len(runs), 1)
+        self.assertLess(runs[0] - startTime, 0.05)
+        time.sleep(0.5)
+        task.cancel(wait=True)
+        # The stale entry at the old due time did not run it a second time
+        self.assertEqual(len(runs), 2)
+        self.assertAlmostEqual(runs[1] - runs[0], 0.5, delta=0.05)
+
+    def testTasksOfTheSameOwnerNeverOverlap(self):
+        owner = object()
+        active = []
+        overlaps = []
+        lock = threading.Lock()
+
+        def work():
+            with lock:
+                active.append(1)
+                if len(active) > 1:
+                    overlaps.append(len(active))
+            time.sleep(0.02)
+            with lock:
+                active.pop()
+
+        tasks = [self.scheduler.scheduleRepeating(owner, work, interval=0.01) for i in range(4)]
+        time.sleep(0.4)
+        for task in tasks:
+            task.cancel(wait=True)
+        self.assertEqual(overlaps, [])
+
+    def testHundredsOfOwnersUseBoundedThreads(self):
+        threadsBefore = threading.active_count()
+        counts = [0] * 300
+
+        def work(i):
+            counts[i] += 1
+
+        tasks = [self.scheduler.scheduleRepeating(i, lambda i=i: work(i), interval=0.1) for i in range(300)]
+        time.sleep(0.55)
+        self.assertLessEqual(threading.active_count() - threadsBefore, 4 + 1)
+        for task in tasks:
+            task.cancel()
+        self.assertTrue(all(count >= 3 for count in counts))
+
+        statistics = self.scheduler.statistics()
+        self.assertGreaterEqual(statistics.executed, 900)
+        self.assertLess(statistics.meanSlip, 0.1)
+
+    def testFailingTaskIsRecordedAndKeepsRepeating(self):
+        def boom():
+            raise IOError("link down")
+
+        task = self.scheduler.scheduleRepeating(self, boom, interval=0.02)
+        time.sleep(0.2)
+        task.cancel(wait=True)
+        self.assertIsInstance(task.lastError, IOError)
+        self.assertGreater(self.scheduler.statistics().failed, 2)
+
+
+class TestScheduledStatusUpdates(unittest.TestCase):
+    def testBackgroundStatusUpdatesWithScheduler(self):
+        scheduler = DeviceScheduler(maxWorkers=2)
+        device = DebugMillenniaDevice()
+        device.initializeDevice()
+        device.refreshInterval = 0.05
+        received = []
+        NotificationCenter().add_observer(self, lambda notification: received.append(notification.user_info),
+                                          PhysicalDeviceNotification.status, device)
+        try:
+            device.startBackgroundStatusUpdates(scheduler=scheduler)
+            self.assertTrue(device.isMonitoring)
+            time.sleep(0.3)
+            device.stopBackgroundStatusUpdates()
+            self.assertFalse(device.isMonitoring)
+            self.assertGreaterEqual(len(received), 3)
+            self.assertIn("power", received[0])
+        finally:
+            NotificationCenter().remove_observer(self)
+            device.shutdownDevice()
+            scheduler.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
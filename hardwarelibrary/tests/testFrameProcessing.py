@@ -0,0 +1,146 @@
+import env
+import unittest
+import time
+
+import numpy as np
+from notificationcenter import NotificationCenter
+
+from hardwarelibrary.cameras import CameraDevice, CameraDeviceNotification
+from hardwarelibrary.cameras.processing import (FramePipeline, RegionOfInterest, Binning,
+                                                RunningAverage, Accumulation)
+
+
+class RampCamera(CameraDevice):
+    """Frames whose pixels are their column number plus the frame number."""
+    classIdVendor = 0xFFFF
+    classIdProduct = 0xFFF2
+
+    def __init__(self, shape=(60, 80, 3)):
+        super().__init__(serialNumber="ramp")
+        self.shape = shape
+        self.count = 0
+
+    def doCaptureFrame(self):
+        time.sleep(0.002)
+        frame = np.empty(self.shape, dtype=np.uint16)
+        frame[...] = (np.arange(self.shape[1]) + self.count)[None, :, None]
+        self.count += 1
+        return frame
+
+
+class TestFrameStages(unittest.TestCase):
+    def setUp(self):
+        self.frame = np.arange(8*6*3, dtype=np.uint8).reshape(8, 6, 3)
+
+    def testRegionOfInterestIsAView(self):
+        pipeline = FramePipeline([RegionOfInterest(x=1, y=2, width=3, height=4)])
+        roi = pipeline.process(self.frame)
+        self.assertEqual(roi.shape, (4, 3, 3))
+        self.assertTrue(np.shares_memory(roi, self.frame))
+        self.assertTrue(np.array_equal(roi, self.frame[2:6, 1:4]))
+
+    def testBinningMatchesLoops(self):
+        frame = np.random.default_rng(0).integers(0, 255, size=(9, 7, 3), dtype=np.uint8)
+        binned = FramePipeline([Binning(factor=2)]).process(frame)
+        self.assertEqual(binned.shape, (4, 3, 3))
+        for i in range(4):
+            for j in range(3):
+                expected = frame[2*i:2*i + 2, 2*j:2*j + 2].astype(float).sum(axis=(0, 1))
+                self.assertTrue(np.allclose(binned[i, j], expected))
+        mean = FramePipeline([Binning(factor=2, mean=True)]).process(frame)
+        self.assertTrue(np.allclose(mean, binned/4))
+
+    def testRunningAverage(self):
+        pipeline = FramePipeline([RunningAverage(frames=3)])
+        outputs = [pipeline.process(np.full((2, 2), value, dtype=np.uint16))[0, 0] for value in (3, 6, 9, 12)]
+        self.assertEqual(outputs, [3, 4.5, 6, 9])
+        pipeline.reset()
+        self.assertEqual(pipeline.process(np.full((2, 2), 1, dtype=np.uint16))[0, 0], 1)
+
+    def testAccumulation(self):
+        pipeline = FramePipeline([Accumulation()])
+        for i in range(5):
+            result = pipeline.process(np.ones((2, 2), dtype=np.uint8))
+        self.assertTrue(np.all(result == 5))
+
+    def testChainDoesNotAllocatePerFrame(self):
+        pipeline = FramePipeline([RegionOfInterest(0, 0, 4, 4), Binning(2), RunningAverage(2)])
+        first = pipeline.process(self.frame)
+        second = pipeline.process(self.frame)
+        self.assertIs(first, second)
+        self.assertEqual(first.shape, (2, 2, 3))
+
+    def testTimingsPerStage(self):
+        pipeline = FramePipeline([RegionOfInterest(0, 0, 4, 4), Binning(2)])
+        for i in range(3):
+            pipeline.process(self.frame)
+        timings = pipeline.timings()
+        self.assertEqual([timing.name for timing in timings], ["RegionOfInterest", "Binning"])
+        self.assertTrue(all(timing.calls == 3 for timing in timings))
+        self.assertTrue(all(timing.meanTime > 0 for timing in timings))
+
+
+class TestWorkerPool(unittest.TestCase):
+    def testParallelBinningGivesTheSameResult(self):
+        frame = np.random.default_rng(1).integers(0, 4095, size=(1080, 1440, 3), dtype=np.uint16)
+        serial = FramePipeline([Binning(factor=4)])
+        parallel = FramePipeline([Binning(factor=4)], workers=4)
+        try:
+            self.assertTrue(np.array_equal(serial.process(frame), parallel.process(frame)))
+
+            startTime = time.perf_counter()
+            for i in range(10):
+                serial.process(frame)
+            serialTime = time.perf_counter() - startTime
+            startTime = time.perf_counter()
+            for i in range(10):
+                parallel.process(frame)
+            parallelTime = time.perf_counter() - startTime
+        finally:
+            parallel.close()
+        print("\nBinning 4x4 of 1440x1080x3: {0:.1f} ms serial, {1:.1f} ms on 4 workers".format(
+              serialTime*100, parallelTime*100))
+
+
+class TestFrameProcessor(unittest.TestCase):
+    def setUp(self):
+        self.camera = RampCamera()
+        self.notifications = []
+
+    def tearDown(self):
+        NotificationCenter().remove_observer(self)
+        if self.camera.isCapturing:
+            self.camera.stop()
+
+    def receive(self, notification):
+        self.notifications.append(notification.user_info)
+
+    def testProcessesCapturedFramesOffTheCaptureThread(self):
+        NotificationCenter().add_observer(self, self.receive, CameraDeviceNotification.imageProcessed, self.camera)
+        self.camera.start()
+        processor = self.camera.startProcessing([RegionOfInterest(10, 0, 40, 60), Binning(2, mean=True)])
+        frames = [processor.get(timeout=1) for i in range(5)]
+        self.assertTrue(all(frame is not None for frame in frames))
+        self.assertEqual(frames[-1].data.shape, (30, 20, 3))
+        self.camera.stop()
+
+        self.assertFalse(processor.isRunning)
+        self.assertGreater(len(self.notifications), 3)
+        first = self.notifications[0]
+        self.assertEqual(first.shape, (30, 20, 3))
+        # Columns 10+2j and 11+2j, plus the frame number
+        self.assertEqual(first[0, 0, 0] - int(first[0, 0, 0]), 0.5)
+        self.assertTrue(np.all(np.diff(first[0, :, 0]) == 2))
+        self.assertEqual(processor.timings()[1].name, "Binning")
+        self.assertGreater(processor.timings()[1].calls, 3)
+
+    def testOnlyOneProcessorAtATime(self):
+        self.camera.start()
+        self.camera.startProcessing([Binning(2)])
+        with self.assertRaises(RuntimeError):
+            self.camera.startProcessing([Binning(2)])
+        self.assertIsNotNone(self.camera.stopProcessing())
+
+
+if __name__ == '__main__':
+    unittest.main()
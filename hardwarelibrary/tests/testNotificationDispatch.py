@@ -0,0 +1,117 @@
+import env
+import unittest
+import time
+from enum import Enum
+from threading import Event
+
+from notificationcenter import NotificationCenter
+from hardwarelibrary.notificationdispatch import (isObserved, postIfObserved, DeliveryPolicy,
+                                                  ThrottledObserver)
+from hardwarelibrary.motion import DebugLinearMotionDevice, LinearMotionNotification
+
+
+class Ping(Enum):
+    ping = "ping"
+    pong = "pong"
+
+
+class Source:
+    pass
+
+
+class TestFastPath(unittest.TestCase):
+    def tearDown(self):
+        NotificationCenter().remove_observer(self)
+
+    def testUserInfoIsOnlyBuiltWhenObserved(self):
+        built = []
+
+        def makeUserInfo():
+            built.append(1)
+            return {"value": 1}
+
+        self.assertFalse(isObserved(Ping.ping))
+        self.assertFalse(postIfObserved(Ping.ping, self, makeUserInfo=makeUserInfo))
+        self.assertEqual(built, [])
+
+        received = []
+        NotificationCenter().add_observer(self, lambda n: received.append(n.user_info), Ping.ping)
+        self.assertTrue(isObserved(Ping.ping))
+        self.assertTrue(postIfObserved(Ping.ping, self, makeUserInfo=makeUserInfo))
+        self.assertEqual(received, [{"value": 1}])
+
+    def testMovesStillNotifyObservers(self):
+        device = DebugLinearMotionDevice()
+        received = []
+        NotificationCenter().add_observer(self, lambda n: received.append(n.name),
+                                          LinearMotionNotification.didMove, device)
+        device.moveTo((1, 2, 3))
+        self.assertEqual(received, [LinearMotionNotification.didMove])
+
+
+class TestThrottledObserver(unittest.TestCase):
+    def tearDown(self):
+        self.observer.remove()
+
+    def testCoalesceKeepsTheLatestPerObject(self):
+        delivered = []
+        self.observer = ThrottledObserver(delivered.append, policy=DeliveryPolicy.coalesce)
+        self.observer.observe(Ping.ping)
+        first, second = Source(), Source()
+        for i in range(100):
+            NotificationCenter().post_notification(Ping.ping, first, i)
+        NotificationCenter().post_notification(Ping.ping, second, "other")
+
+        self.assertEqual(self.observer.deliverPending(), 2)
+        self.assertEqual(sorted([n.user_info for n in delivered], key=str), [99, "other"])
+        statistics = self.observer.statistics()
+        self.assertEqual(statistics.received, 101)
+        self.assertEqual(statistics.dropped, 99)
+        self.assertEqual(self.observer.deliverPending(), 0)
+
+    def testBatchDeliversEverythingAsOneList(self):
+        batches = []
+        self.observer = ThrottledObserver(batches.append, policy=DeliveryPolicy.batch)
+        self.observer.observe(Ping.ping)
+        self.observer.observe(Ping.pong)
+        for i in range(10):
+            NotificationCenter().post_notification(Ping.ping, self, i)
+        NotificationCenter().post_notification(Ping.pong, self, "pong")
+
+        self.observer.deliverPending()
+        self.assertEqual(len(batches), 1)
+        self.assertEqual([n.user_info for n in batches[0]], list(range(10)) + ["pong"])
+
+    def testRateLimit(self):
+        delivered = []
+        self.observer = ThrottledObserver(delivered.append, minInterval=0.2)
+        self.observer.observe(Ping.ping)
+        NotificationCenter().post_notification(Ping.ping, self, 1)
+        self.assertEqual(self.observer.deliverPending(), 1)
+        NotificationCenter().post_notification(Ping.ping, self, 2)
+        self.assertEqual(self.observer.deliverPending(), 0)
+        time.sleep(0.25)
+        self.assertEqual(self.observer.deliverPending(), 1)
+        self.assertEqual([n.user_info for n in delivered], [1, 2])
+
+    def testDeliveryThread(self):
+        done = Event()
+        batches = []
+
+        def collect(notifications):
+            batches.append(len(notifications))
+            if sum(batches) == 200:
+                done.set()
+
+        self.observer = ThrottledObserver(collect, policy=DeliveryPolicy.batch, minInterval=0.05)
+        self.observer.observe(Ping.ping)
+        self.observer.start()
+        for i in range(200):
+            NotificationCenter().post_notification(Ping.ping, self, i)
+            time.sleep(0.0005)
+        self.assertTrue(done.wait(2.0))
+        self.assertLess(len(batches), 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
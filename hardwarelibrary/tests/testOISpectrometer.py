@@ -1,12 +1,75 @@
 import env
 import unittest
 import time
+import array
+
+import numpy as np
+from struct import unpack
 
 from hardwarelibrary.spectrometers.oceaninsight import (
-    OISpectrometer, SpectrumRequestTimeoutError,
+    OISpectrometer, SpectrumRequestTimeoutError, USB2000, UnableToCommunicate,
+    USB4000, USB2000Plus,
 )
 
 
+class MockBulkEndpoint:
+    """Stands in for a pyusb input endpoint: replays the same bytes for every
+    spectrum, at most maxTransfer bytes per read, like Endpoint.read()."""
+
+    def __init__(self, data, maxTransfer=None):
+        self.data = bytes(data)
+        self.maxTransfer = maxTransfer
+        self.position = 0
+        self.reads = 0
+
+    def read(self, size_or_buffer, timeout=None):
+        self.reads += 1
+        isBuffer = isinstance(size_or_buffer, array.array)
+        size = len(size_or_buffer)*size_or_buffer.itemsize if isBuffer else size_or_buffer
+        if self.maxTransfer is not None:
+            size = min(size, self.maxTransfer)
+        chunk = self.data[self.position:self.position+size]
+        self.position = (self.position + len(chunk)) % len(self.data)
+        if isBuffer:
+            memoryview(size_or_buffer).cast('B')[:len(chunk)] = chunk
+            return len(chunk)
+        return array.array('B', chunk)
+
+
+def usb2000Transfer(values, syncByte=0x69):
+    """The bytes a USB2000 sends for a 2048-pixel spectrum."""
+    values = np.asarray(values, dtype=np.uint16).reshape(32, 64)
+    packets = np.empty((32, 2, 64), dtype=np.uint8)
+    packets[:, 0, :] = values & 0xFF
+    packets[:, 1, :] = values >> 8
+    return packets.tobytes() + bytes([syncByte])
+
+
+def legacyUSB2000Decoding(endpoint):
+    """The per-packet decoding USB2000.getSpectrumData used to do."""
+    spectrum = []
+    for packet in range(32):
+        bytesReadLow = endpoint.read(size_or_buffer=64, timeout=200)
+        bytesReadHi = endpoint.read(size_or_buffer=64, timeout=200)
+        spectrum.extend(np.array(bytesReadLow, dtype=np.uint16)+256*np.array(bytesReadHi, dtype=np.uint16))
+    endpoint.read(size_or_buffer=1, timeout=200)
+    spectrum[0] = spectrum[1]
+    return np.array(spectrum)
+
+
+def legacyUSB4000Decoding(device):
+    """The per-packet decoding USB4000_2000Plus.getSpectrumData used to do."""
+    spectrum = []
+    for packet in range(device.lastStatus.packetCount):
+        inputEndpoint = device.inputEndpoints[0]
+        if device.idProduct == USB4000.classIdProduct and packet <= 3:
+            inputEndpoint = device.inputEndpoints[1]
+        values = unpack('<'+'H'*256, inputEndpoint.read(size_or_buffer=512, timeout=200))
+        spectrum.extend(np.array(values))
+    inputEndpoint.read(size_or_buffer=1, timeout=200)
+    return np.array(spectrum[5:-173])
+
+
 class MockOISpectrometer(OISpectrometer):
     """Hardware-free OISpectrometer for exercising getSpectrum() without USB.
 
@@ -28,6 +91,33 @@ class MockOISpectrometer(OISpectrometer):
         return "spectrum"
 
 
+class TimedUSB2000(USB2000):
+    """USB2000 whose status reports the spectrum ready integrationTime
+    (plus latency) after the 0x09 request, as the real spectrometer does."""
+
+    def __init__(self, integrationTime, latency=0.0):
+        super().__init__()
+        self.integration = integrationTime
+        self.latency = latency
+        self.requested = None
+        self.epCommandOut = self
+
+    def write(self, data):
+        if bytes(data) == b'\x09':
+            self.requested = time.monotonic()
+
+    def sendCommand(self, cmdBytes, payloadBytes=None):
+        pass
+
+    def readReply(self, inputEndpoint, size=None, unpackingFormat=None, timeout=None):
+        elapsed = time.monotonic() - self.requested
+        isReady = elapsed >= self.integration/1000 + self.latency
+        return (2048, self.integration, False, 0, not isReady, False, isReady)
+
+    def getSpectrumData(self):
+        return np.zeros(2048, dtype=np.uint16)
+
+
 class TestGetSpectrumBounded(unittest.TestCase):
     def testRaisesInsteadOfBlockingWhenNeverReady(self):
         device = MockOISpectrometer(spectrumReady=False)
@@ -49,5 +139,169 @@ class TestGetSpectrumBounded(unittest.TestCase):
         self.assertEqual(device.requestCount, 1)
 
 
+class TestIntegrationAwareWaiting(unittest.TestCase):
+    def testSleepsThroughIntegration(self):
+        device = TimedUSB2000(integrationTime=200)
+        start = time.monotonic()
+        device.getSpectrum()
+        elapsed = time.monotonic() - start
+
+        self.assertLess(elapsed, 0.25)
+        # Polling every ms would have taken ~200 status transactions
+        self.assertLessEqual(device.statusTransactionsPerSpectrum, 5)
+        self.assertEqual(device.statusTransactions, device.statusTransactionsPerSpectrum)
+
+    def testReadoutLatencyIsLearned(self):
+        device = TimedUSB2000(integrationTime=20, latency=0.03)
+        device.getSpectrum()
+        first = device.statusTransactionsPerSpectrum
+        self.assertGreaterEqual(device.readoutLatency, 0.03)
+
+        device.getSpectrum()
+        self.assertLessEqual(device.statusTransactionsPerSpectrum, first)
+        self.assertLessEqual(device.statusTransactionsPerSpectrum, 3)
+
+    def testWaitIsBounded(self):
+        device = TimedUSB2000(integrationTime=5000)
+        device.requestSpectrum()
+        start = time.monotonic()
+        self.assertFalse(device.waitForSpectrum(maxWait=0.1))
+        self.assertLess(time.monotonic() - start, 0.5)
+
+
+class TestUSB2000SpectrumDecoding(unittest.TestCase):
+    def setUp(self):
+        self.values = np.random.default_rng(1).integers(0, 65536, 2048, dtype=np.uint16)
+        self.device = USB2000()
+
+    def testSingleTransferDecoding(self):
+        self.device.epMainIn = MockBulkEndpoint(usb2000Transfer(self.values))
+        spectrum = self.device.getSpectrumData()
+        self.assertEqual(self.device.epMainIn.reads, 1)
+        self.assertEqual(spectrum.dtype, np.uint16)
+        self.assertTrue(np.array_equal(spectrum[1:], self.values[1:]))
+        self.assertEqual(spectrum[0], self.values[1])
+
+    def testPacketsSpreadOverSeveralTransfers(self):
+        self.device.epMainIn = MockBulkEndpoint(usb2000Transfer(self.values), maxTransfer=64)
+        spectrum = self.device.getSpectrumData()
+        self.assertTrue(np.array_equal(spectrum[1:], self.values[1:]))
+
+    def testSpectrumBufferIsReused(self):
+        self.device.epMainIn = MockBulkEndpoint(usb2000Transfer(self.values))
+        first = self.device.getSpectrumData(copy=False)
+        copied = self.device.getSpectrumData()
+        second = self.device.getSpectrumData(copy=False)
+        self.assertTrue(np.shares_memory(first, second))
+        self.assertFalse(np.shares_memory(copied, second))
+        self.assertTrue(np.array_equal(copied, second))
+
+    def testMissingSyncByteIsAnError(self):
+        self.device.epMainIn = MockBulkEndpoint(usb2000Transfer(self.values, syncByte=0x00))
+        with self.assertRaises(UnableToCommunicate):
+            self.device.getSpectrumData()
+
+    def testWavelengthIsComputedAsAnArray(self):
+        self.device.a0, self.device.a1, self.device.a2, self.device.a3 = 340.0, 0.38, -1.5e-5, 1.2e-10
+        self.device.pixels = 2048
+        self.device.computeWavelength()
+        x = 1000
+        self.assertAlmostEqual(self.device.wavelength[x], 340.0 + 0.38*x - 1.5e-5*x*x + 1.2e-10*x*x*x)
+        self.assertEqual(len(self.device.wavelength), 2048)
+
+    def testBenchmarkAgainstPerPacketDecoding(self):
+        transfer = usb2000Transfer(self.values)
+        count = 200
+
+        legacyEndpoint = MockBulkEndpoint(transfer)
+        startTime = time.perf_counter()
+        for i in range(count):
+            reference = legacyUSB2000Decoding(legacyEndpoint)
+        legacyDuration = time.perf_counter() - startTime
+
+        self.device.epMainIn = MockBulkEndpoint(transfer)
+        startTime = time.perf_counter()
+        for i in range(count):
+            spectrum = self.device.getSpectrumData()
+        duration = time.perf_counter() - startTime
+
+        self.assertTrue(np.array_equal(spectrum, reference))
+        self.assertLess(duration, legacyDuration)
+        print("\nUSB2000 decoding: {0:.0f} spectra/s (per-packet: {1:.0f} spectra/s)".format(
+              count/duration, count/legacyDuration))
+
+
+class TestUSB4000SpectrumReadout(unittest.TestCase):
+    def setUp(self):
+        self.values = np.random.default_rng(2).integers(0, 65536, 15*256, dtype=np.uint16)
+        self.device = USB4000()
+        self.device.discardLeadingSamples = 5
+        self.device.discardTrailingSamples = 173
+        self.device.lastStatus = USB4000.Status(pixels=3840, integrationTime=100, acquisitionStatus=4,
+                                                packetCount=15, isHighSpeed=True)
+
+    def connectEndpoints(self, syncByte=0x69, maxTransfer=None):
+        # First 4 packets on the secondary endpoint, the others and the sync byte on the main one
+        head = self.values[:4*256].astype('<u2').tobytes()
+        tail = self.values[4*256:].astype('<u2').tobytes() + bytes([syncByte])
+        self.device.inputEndpoints = [MockBulkEndpoint(tail, maxTransfer), MockBulkEndpoint(head, maxTransfer)]
+
+    def testEndpointSplitAndValues(self):
+        self.connectEndpoints()
+        spectrum = self.device.getSpectrumData()
+        self.assertEqual(spectrum.dtype, np.uint16)
+        self.assertTrue(np.array_equal(spectrum, self.values[5:-173]))
+        self.assertEqual(self.device.inputEndpoints[1].reads, 1)
+        self.assertEqual(self.device.inputEndpoints[0].reads, 2)   # data, then sync byte
+
+    def testUSB2000PlusReadsEverythingFromMainEndpoint(self):
+        device = USB2000Plus()
+        device.lastStatus = self.device.lastStatus
+        device.inputEndpoints = [MockBulkEndpoint(self.values.astype('<u2').tobytes() + b'\x69'), None]
+        spectrum = device.getSpectrumData()
+        self.assertTrue(np.array_equal(spectrum, self.values))
+
+    def testPacketsSpreadOverSeveralTransfers(self):
+        self.connectEndpoints(maxTransfer=512)
+        spectrum = self.device.getSpectrumData()
+        self.assertTrue(np.array_equal(spectrum, self.values[5:-173]))
+
+    def testBuffersAreReused(self):
+        self.connectEndpoints()
+        first = self.device.getSpectrumData(copy=False)
+        buffers = [segment[1] for segment in self.device.spectrumSegments]
+        copied = self.device.getSpectrumData()
+        second = self.device.getSpectrumData(copy=False)
+        self.assertTrue(np.shares_memory(first, second))
+        self.assertFalse(np.shares_memory(copied, second))
+        self.assertEqual(buffers, [segment[1] for segment in self.device.spectrumSegments])
+
+    def testMissingSyncByteIsAnError(self):
+        self.connectEndpoints(syncByte=0x00)
+        self.device.flushEndpoints = lambda: None
+        with self.assertRaises(RuntimeError):
+            self.device.getSpectrumData()
+
+    def testBenchmarkAgainstPerPacketDecoding(self):
+        count = 200
+
+        self.connectEndpoints()
+        startTime = time.perf_counter()
+        for i in range(count):
+            reference = legacyUSB4000Decoding(self.device)
+        legacyDuration = time.perf_counter() - startTime
+
+        self.connectEndpoints()
+        startTime = time.perf_counter()
+        for i in range(count):
+            spectrum = self.device.getSpectrumData()
+        duration = time.perf_counter() - startTime
+
+        self.assertTrue(np.array_equal(spectrum, reference))
+        self.assertLess(duration, legacyDuration)
+        print("\nUSB4000 readout: {0:.0f} spectra/s (per-packet: {1:.0f} spectra/s)".format(
+              count/duration, count/legacyDuration))
+
+
 if __name__ == "__main__":
     unittest.main()
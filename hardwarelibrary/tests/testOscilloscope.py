@@ -4,10 +4,13 @@ import unittest
 import time
 import struct
 
+import numpy as np
+
 from hardwarelibrary.communication.serialport import SerialPort
 from hardwarelibrary.physicaldevice import *
 from notificationcenter import NotificationCenter, Notification
 from hardwarelibrary.oscilloscope import *
+from hardwarelibrary.ringbuffer import OverflowPolicy
 
 class TestTektronik(unittest.TestCase):
     def setUp(self) -> None:
@@ -32,6 +35,269 @@ class TestTektronik(unittest.TestCase):
         self.device.displayWaveforms([Channels.CH1, Channels.CH2])
 
 
+class TestDebugOscilloscope(unittest.TestCase):
+    def setUp(self) -> None:
+        self.device = OscilloscopeDevice(portPath="debug")
+        self.device.initializeDevice()
+        self.received = self.device.port.received
+
+    def tearDown(self) -> None:
+        self.device.shutdownDevice()
+
+    def testWaveformIsScaledArray(self):
+        waveform = self.device.getWaveform(Channels.CH1)
+        self.assertEqual(waveform.voltage.shape, (2500,))
+        self.assertAlmostEqual(waveform.voltage.max(), 1.5, delta=0.05)
+        self.assertAlmostEqual(waveform.time[0], -2.5e-3)
+        self.assertAlmostEqual(waveform.time[1] - waveform.time[0], 2e-6)
+        self.assertEqual(len(list(waveform)), 2500)
+
+    def testChannelNames(self):
+        waveform = self.device.getWaveform("CH2")
+        self.assertEqual(waveform.channel, Channels.CH2)
+        self.assertAlmostEqual(waveform.voltage.min(), -0.5, delta=0.05)
+
+    def testRepeatedCapturesOnlyTransferTheCurve(self):
+        self.device.getWaveform(Channels.CH1)
+        self.received.clear()
+        for i in range(10):
+            self.device.getWaveform(Channels.CH1)
+        self.assertEqual(dict(self.received), {"GET_CURVE": 10})
+
+    def testPreambleIsQueriedOncePerChannel(self):
+        for i in range(3):
+            self.device.getWaveform(Channels.CH1)
+            self.device.getWaveform(Channels.CH2)
+        self.assertEqual(self.received["GET_PREAMBLE"], 2)
+        self.assertEqual(self.received["SET_DATA_SOURCE"], 6)
+
+    def testSettersInvalidatePreamble(self):
+        before = self.device.getWaveform(Channels.CH1)
+        self.device.getWaveform(Channels.CH2)
+        self.device.setVerticalScale(Channels.CH1, 0.5)
+        after = self.device.getWaveform(Channels.CH1)
+        self.device.getWaveform(Channels.CH2)
+        self.assertEqual(self.received["GET_PREAMBLE"], 3)
+        self.assertAlmostEqual(after.preamble.yMultiplier, before.preamble.yMultiplier/2)
+        self.assertAlmostEqual(after.voltage.max(), 1.5, delta=0.05)
+
+        self.device.setHorizontalScale(1e-3)
+        waveform = self.device.getWaveform(Channels.CH2)
+        self.assertEqual(self.received["GET_PREAMBLE"], 4)
+        self.assertAlmostEqual(waveform.time[-1] - waveform.time[0], 1e-2, delta=1e-5)
+
+    def testPreambleWithHeaders(self):
+        reply = (':WFMPRE:BYT_NR 2;BIT_NR 16;ENCDG BIN;BN_FMT RI;BYT_OR LSB;NR_PT 2500;'
+                 ':WFMPRE:CH1:WFID "Ch1, DC coupling, 2.0E0 V/div";PT_FMT Y;XINCR 4.0E-6;'
+                 'PT_OFF 0;XZERO -5.0E-3;XUNIT "s";YMULT 3.125E-4;YZERO 0.0E0;YOFF 256;YUNIT "Volts"\n')
+        preamble = WaveformPreamble.fromReply(reply)
+        self.assertEqual(preamble.bytesPerPoint, 2)
+        self.assertEqual(preamble.dtype, "<i2")
+        self.assertEqual(preamble.waveformId, "Ch1, DC coupling, 2.0E0 V/div")
+        self.assertEqual(preamble.xIncrement, 4e-6)
+        self.assertEqual(preamble.yOffset, 256)
+
+    def testIncompletePreamble(self):
+        with self.assertRaises(ValueError):
+            WaveformPreamble.fromReply("1;8;BIN;RI;MSB\n")
+
+    def testConfigurationTakesOneErrorQuery(self):
+        self.received.clear()
+        self.device.getWaveform(Channels.CH2)
+        self.assertEqual(self.received["SELECT_CHANNEL"], 1)
+        self.assertEqual(self.received["SET_DATA_SOURCE"], 1)
+        self.assertEqual(self.received["GET_EVENT_STATUS"], 1)
+        self.assertEqual(self.received["GET_EVENT_QUANTITY"], 0)
+
+    def testImmediatePolicyChecksEachCommand(self):
+        self.device.errorCheckPolicy = ErrorCheckPolicy.immediate
+        self.received.clear()
+        with self.device.commandBatch():
+            self.device.getWaveform(Channels.CH2)
+        self.assertEqual(self.received["GET_EVENT_STATUS"], 2)
+
+        with self.assertRaises(TektronikException) as context:
+            self.device.setVerticalScale(Channels.CH1, 100)
+        self.assertEqual(context.exception.code, 222)
+        self.assertEqual(context.exception.commands, ["CH1:VOLTS 100"])
+
+    def testBatchErrorsAreAttributedToTheBatch(self):
+        self.received.clear()
+        with self.assertRaises(TektronikException) as context:
+            with self.device.commandBatch():
+                self.device.setVerticalScale(Channels.CH1, 0.5)
+                self.device.setVerticalScale(Channels.CH2, 100)
+                self.device.setHorizontalScale(1e-3)
+        self.assertEqual(self.received["GET_ALL_EVENTS"], 1)
+        self.assertEqual(context.exception.code, 222)
+        self.assertEqual(context.exception.commands,
+                         ["CH1:VOLTS 0.5", "CH2:VOLTS 100", "HORIZONTAL:MAIN:SCALE 0.001"])
+        self.assertEqual(self.device.port.horizontalScale, 1e-3)
+
+        self.received.clear()
+        with self.device.commandBatch():
+            self.device.setVerticalScale(Channels.CH1, 1)
+            self.device.setHorizontalScale(5e-4)
+        self.assertEqual(self.received["GET_EVENT_STATUS"], 1)
+
+    def testErrorsOnDemand(self):
+        self.device.errorCheckPolicy = ErrorCheckPolicy.onDemand
+        self.device.getWaveform(Channels.CH1)
+        self.device.uncheckedCommands.clear()
+        self.received.clear()
+        self.device.doSendCommand("INVALID\n")
+        self.device.setVerticalScale(Channels.CH1, 0.5)
+        self.assertEqual(self.received["GET_EVENT_STATUS"], 0)
+
+        with self.assertRaises(TektronikException) as context:
+            self.device.checkErrors()
+        self.assertEqual(context.exception.code, 113)
+        self.assertEqual(context.exception.commands, ["INVALID", "CH1:VOLTS 0.5"])
+        self.assertEqual(self.device.preambles, {})
+        self.device.checkErrors()
+
+    def testCaptureChannelsIntoArray(self):
+        out = np.zeros((2, 2500))
+        voltages = self.device.captureWaveforms([Channels.CH1, Channels.CH2], out=out)
+        self.assertIs(voltages, out)
+        self.assertAlmostEqual(out[0].max(), 1.5, delta=0.05)
+        self.assertAlmostEqual(out[1].max(), 0.5, delta=0.05)
+
+        self.received.clear()
+        self.device.captureWaveforms(out=out)
+        self.assertEqual(dict(self.received), {"SET_DATA_SOURCE": 2, "GET_CURVE": 2, "GET_EVENT_STATUS": 1})
+
+        with self.assertRaises(ValueError):
+            self.device.captureWaveforms(out=np.zeros((3, 2500)))
+
+    def testSixteenBitData(self):
+        eightBits = self.device.captureWaveforms([Channels.CH1])
+        self.device.setDataWidth(2)
+        sixteenBits = self.device.captureWaveforms([Channels.CH1])
+        self.assertEqual(self.device.getPreamble(Channels.CH1).dtype, ">i2")
+        self.assertAlmostEqual(sixteenBits.max(), 1.5, delta=0.001)
+        self.assertLess(np.diff(np.unique(sixteenBits)).min(), np.diff(np.unique(eightBits)).min()/100)
+
+        with self.assertRaises(ValueError):
+            self.device.setDataWidth(4)
+
+    def testContinuousCapture(self):
+        acquisition = WaveformAcquisition(self.device, capacity=4, policy=OverflowPolicy.block)
+        acquisition.start()
+        frames = []
+        for i in range(10):
+            frame = acquisition.get(timeout=1)
+            frames.append((frame.index, frame.timestamp, frame.data.copy()))
+            acquisition.release()
+        acquisition.stop()
+
+        self.assertEqual([index for index, _, _ in frames], list(range(10)))
+        timestamps = [timestamp for _, timestamp, _ in frames]
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertEqual(frames[-1][2].shape, (2, 2500))
+        self.assertEqual(len(acquisition.time), 2500)
+        statistics = acquisition.statistics()
+        self.assertEqual(statistics.errors, 0)
+        self.assertEqual(statistics.dropped, 0)
+        self.assertLessEqual(statistics.acquired, 10 + 4 + 1)
+
+    def muteReplies(self, name, count):
+        # The next count replies to the command name are lost
+        port = self.device.port
+        processCommand = port.process_command
+        lost = [count]
+
+        def process_command(commandName, params, endPointIndex):
+            reply = processCommand(commandName, params, endPointIndex)
+            if commandName == name and lost[0] > 0:
+                lost[0] -= 1
+                return None
+            return reply
+        port.process_command = process_command
+
+    def testContinuousCaptureSurvivesErrors(self):
+        acquisition = WaveformAcquisition(self.device, policy=OverflowPolicy.block)
+        acquisition.start()
+        timeAxis = acquisition.time
+        self.muteReplies("GET_EVENT_STATUS", 1)
+        for i in range(10):
+            self.assertIsNotNone(acquisition.get(timeout=1))
+            acquisition.release()
+        self.assertIs(acquisition.time, timeAxis)
+        acquisition.stop()
+
+        self.assertEqual(acquisition.statistics().errors, 1)
+        self.assertIsInstance(acquisition.lastError, TektronikException)
+        self.assertIsNone(acquisition.lastError.code)
+        self.assertIsNone(acquisition.failure)
+
+    def testContinuousCaptureFailure(self):
+        acquisition = WaveformAcquisition(self.device, maxConsecutiveErrors=3)
+        acquisition.start()
+        self.muteReplies("GET_CURVE", 1000)
+        while acquisition.get(timeout=1) is not None:
+            pass
+        self.assertFalse(acquisition.isRunning)
+        self.assertEqual(acquisition.statistics().errors, 3)
+        self.assertIs(acquisition.failure, acquisition.lastError)
+        acquisition.stop()
+
+    def testUnreadableStatusKeepsTheCommandError(self):
+        self.muteReplies("GET_HORIZONTAL_SCALE", 1)
+        self.muteReplies("GET_EVENT_STATUS", 1)
+        with self.assertRaises(TektronikException) as context:
+            self.device.getHorizontalScale()
+        error = context.exception
+        self.assertIsNone(error.code)
+        self.assertEqual(len(error.underlyingErrors), 2)
+        commandError, statusError = error.underlyingErrors
+        self.assertNotIsInstance(commandError, TektronikException)
+        self.assertNotIsInstance(statusError, TektronikException)
+        self.assertAlmostEqual(self.device.getHorizontalScale(), 5e-4)
+
+    def testUncheckedCommandsAreBounded(self):
+        self.device.errorCheckPolicy = ErrorCheckPolicy.onDemand
+        out = np.empty((2, 2500))
+        for i in range(100):
+            self.device.captureWaveforms(out=out)
+        self.assertEqual(len(self.device.uncheckedCommands), self.device.maxUncheckedCommands)
+        self.assertEqual(self.device.uncheckedCommands[-1], "DATA:SOURCE CH2")
+
+        self.device.doSendCommand("INVALID\n")
+        with self.assertRaises(TektronikException) as context:
+            self.device.checkErrors()
+        self.assertEqual(context.exception.commands[-1], "INVALID")
+        self.assertEqual(len(self.device.uncheckedCommands), 0)
+
+    def testBenchmarkRepeatedCaptures(self):
+        self.device.getWaveform(Channels.CH1)
+        startTime = time.perf_counter()
+        for i in range(100):
+            self.device.getWaveform(Channels.CH1)
+        duration = (time.perf_counter() - startTime)/100
+        print("\nDebug scope: {0:.2f} ms per 2500-point capture".format(duration*1000))
+
+    def testBenchmarkCaptureModes(self):
+        out = np.empty((2, 2500))
+        for width in (1, 2):
+            self.device.setDataWidth(width)
+            self.device.captureWaveforms(out=out)
+            startTime = time.perf_counter()
+            for i in range(50):
+                self.device.captureWaveforms(out=out)
+            duration = (time.perf_counter() - startTime)/50
+            print("\nDebug scope, CH1+CH2 at DATA:WIDTH {0}: {1:.2f} ms per capture".format(width, duration*1000))
+
+        acquisition = WaveformAcquisition(self.device)
+        acquisition.start()
+        time.sleep(0.3)
+        acquisition.stop()
+        statistics = acquisition.statistics()
+        self.assertEqual(statistics.errors, 0)
+        self.assertGreater(statistics.acquired, 10)
+        print("Debug scope, continuous CH1+CH2: {0:.0f} captures/s".format(statistics.rate))
+
+
 @unittest.skip("For understanding earlier on, not necessary anymore")
 class TestTektronikSerialCommands(unittest.TestCase):
     idVendor = 0x0403
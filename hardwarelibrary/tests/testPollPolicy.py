@@ -0,0 +1,110 @@
+import env
+import unittest
+import time
+
+from hardwarelibrary.pollpolicy import AdaptivePollPolicy
+from hardwarelibrary.physicaldevice import PhysicalDeviceNotification
+from hardwarelibrary.scheduler import DeviceScheduler
+from hardwarelibrary.sources.millennia import DebugMillenniaDevice
+from notificationcenter import NotificationCenter
+
+
+class TestAdaptivePollPolicy(unittest.TestCase):
+    def testBacksOffWhileUnchanged(self):
+        policy = AdaptivePollPolicy(minInterval=0.1, maxInterval=1.0, backoffFactor=2)
+        self.assertTrue(policy.update({"power": 1.0}))
+        self.assertEqual(policy.effectiveInterval, 0.1)
+
+        intervals = []
+        for i in range(6):
+            self.assertFalse(policy.update({"power": 1.0}))
+            intervals.append(policy.effectiveInterval)
+        self.assertEqual(intervals, [0.2, 0.4, 0.8, 1.0, 1.0, 1.0])
+        self.assertEqual(policy.effectiveRate, 1.0)
+
+    def testChangeOrResetSnapsBack(self):
+        policy = AdaptivePollPolicy(minInterval=0.1, maxInterval=1.0)
+        policy.update({"power": 1.0, "isLaserOn": True})
+        policy.update({"power": 1.0, "isLaserOn": True})
+        self.assertGreater(policy.effectiveInterval, 0.1)
+        self.assertTrue(policy.update({"power": 1.0, "isLaserOn": False}))
+        self.assertEqual(policy.effectiveInterval, 0.1)
+
+        policy.update({"power": 1.0, "isLaserOn": False})
+        policy.reset()
+        self.assertEqual(policy.effectiveInterval, 0.1)
+        self.assertFalse(policy.update({"power": 1.0, "isLaserOn": False}))
+        policy.reset(forgetStatus=True)
+        self.assertTrue(policy.update({"power": 1.0, "isLaserOn": False}))
+
+    def testThresholdIsMeasuredFromTheLastReportedValue(self):
+        policy = AdaptivePollPolicy(thresholds={"power": 0.05})
+        policy.update({"power": 1.00})
+        self.assertFalse(policy.update({"power": 1.03}))
+        self.assertFalse(policy.update({"power": 1.04}))
+        self.assertTrue(policy.update({"power": 1.06}))
+
+    def testInvalidIntervals(self):
+        with self.assertRaises(ValueError):
+            AdaptivePollPolicy(minInterval=2, maxInterval=1)
+
+
+class TestAdaptiveBackgroundStatusUpdates(unittest.TestCase):
+    def testOnlyChangesArePostedAndPollSoonWakesUp(self):
+        device = DebugMillenniaDevice()
+        device.initializeDevice()
+        device.pollPolicy = AdaptivePollPolicy(minInterval=0.02, maxInterval=5.0)
+        received = []
+        NotificationCenter().add_observer(self, lambda notification: received.append(notification.user_info),
+                                          PhysicalDeviceNotification.status, device)
+        try:
+            device.startBackgroundStatusUpdates()
+            time.sleep(0.3)
+            self.assertEqual(len(received), 1)
+            self.assertGreater(device.statusUpdateInterval, 0.1)
+
+            device.turnOn()
+            device.pollSoon()
+            time.sleep(0.1)
+            self.assertEqual(len(received), 2)
+            self.assertTrue(received[-1]["isLaserOn"])
+
+            startTime = time.time()
+            device.stopBackgroundStatusUpdates()
+            self.assertLess(time.time() - startTime, 1.0)
+        finally:
+            NotificationCenter().remove_observer(self)
+            device.shutdownDevice()
+
+    def testSetterResetsTheScheduledInterval(self):
+        scheduler = DeviceScheduler(maxWorkers=2)
+        device = DebugMillenniaDevice()
+        device.initializeDevice()
+        device.pollPolicy = AdaptivePollPolicy(minInterval=0.02, maxInterval=5.0)
+        received = []
+        NotificationCenter().add_observer(self, lambda notification: received.append(notification.user_info),
+                                          PhysicalDeviceNotification.status, device)
+        try:
+            device.startBackgroundStatusUpdates(scheduler=scheduler)
+            deadline = time.monotonic() + 3
+            while device.monitoring.interval < 1.0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(len(received), 1)
+            backedOffInterval = device.monitoring.interval
+            self.assertGreaterEqual(backedOffInterval, 1.0)
+
+            device.turnOn()     # no explicit pollSoon()
+            time.sleep(0.1)
+            self.assertEqual(len(received), 2)
+            self.assertTrue(received[-1]["isLaserOn"])
+            # Backing off again from the fastest rate
+            self.assertLess(device.monitoring.interval, backedOffInterval)
+            self.assertLessEqual(device.monitoring.interval, 0.1)
+        finally:
+            NotificationCenter().remove_observer(self)
+            device.shutdownDevice()
+            scheduler.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
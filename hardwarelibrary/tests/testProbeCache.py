@@ -0,0 +1,157 @@
+import env
+import unittest
+import os
+import tempfile
+
+from hardwarelibrary.probecache import ProbeCache
+from hardwarelibrary.devicemanager import DeviceManager, USBDeviceDescriptor
+from hardwarelibrary.spectrometers.oceaninsight import USB2000
+
+
+class CountingUSB2000(USB2000):
+    """A USB2000 that answers parameter and status queries without USB and
+    counts how many of them were sent."""
+
+    def __init__(self, serialNumber="USB2E1234"):
+        super().__init__(serialNumber=serialNumber)
+        self.eepromSerialNumber = serialNumber
+        self.parameterReads = 0
+        self.statusReads = 0
+
+    def getParameter(self, index):
+        self.parameterReads += 1
+        if index == 0:
+            return self.eepromSerialNumber
+        return ["", "340.5", "0.38", "-1.5e-5", "1.2e-10"][index]
+
+    def getStatus(self):
+        self.statusReads += 1
+        self.lastStatus = self.Status(pixels=2048, integrationTime=10)
+        return self.lastStatus
+
+
+class TestProbeCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "probecache.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testEntriesSurviveAReload(self):
+        cache = ProbeCache(self.path)
+        self.assertTrue(cache.update(0x2457, 0x1002, "ABC", driverClass=USB2000,
+                                     identity={"serialNumber": "ABC"},
+                                     calibration={"pixels": 2048}))
+
+        reloaded = ProbeCache(self.path)
+        self.assertEqual(reloaded.driverClassName(0x2457, 0x1002, "ABC"), ProbeCache.className(USB2000))
+        self.assertEqual(reloaded.identity(0x2457, 0x1002, "ABC"), {"serialNumber": "ABC"})
+        self.assertEqual(reloaded.calibration(0x2457, 0x1002, "ABC"), {"pixels": 2048})
+
+    def testDevicesWithoutSerialNumberAreNotCached(self):
+        cache = ProbeCache(self.path)
+        self.assertFalse(cache.update(0x2457, 0x1002, None, driverClass=USB2000))
+        self.assertFalse(cache.update(0x2457, 0x1002, ".*", driverClass=USB2000))
+        self.assertEqual(len(cache), 0)
+        self.assertFalse(os.path.exists(self.path))
+
+    def testInvalidateAndClear(self):
+        cache = ProbeCache(self.path)
+        cache.update(0x2457, 0x1002, "ABC", driverClass=USB2000)
+        cache.update(0x2457, 0x1002, "DEF", driverClass=USB2000)
+        cache.invalidate(0x2457, 0x1002, "ABC")
+        self.assertIsNone(ProbeCache(self.path).entry(0x2457, 0x1002, "ABC"))
+        self.assertIsNotNone(ProbeCache(self.path).entry(0x2457, 0x1002, "DEF"))
+        cache.clear()
+        self.assertEqual(len(ProbeCache(self.path)), 0)
+
+    def testCorruptedCacheIsIgnored(self):
+        with open(self.path, "w") as cacheFile:
+            cacheFile.write("{not json")
+        cache = ProbeCache(self.path)
+        self.assertEqual(len(cache), 0)
+        cache.update(0x2457, 0x1002, "ABC", driverClass=USB2000)
+        self.assertEqual(len(ProbeCache(self.path)), 1)
+
+    def testMemoryOnlyCacheWritesNothing(self):
+        cache = ProbeCache(path=False)
+        cache.update(0x2457, 0x1002, "ABC", driverClass=USB2000)
+        self.assertEqual(len(cache), 1)
+        self.assertFalse(os.path.exists(self.path))
+
+
+class TestDeviceManagerProbeCache(unittest.TestCase):
+    def setUp(self):
+        DeviceManager._instance = None
+
+    def tearDown(self):
+        DeviceManager._instance = None
+
+    def testCachedDriverIsTriedFirst(self):
+        class FirstDriver:
+            pass
+        class SecondDriver:
+            pass
+
+        dm = DeviceManager()
+        dm.candidateClassesForAutoDiscovery = lambda idVendor, idProduct: [FirstDriver, SecondDriver]
+        descriptor = USBDeviceDescriptor(serialNumber="ABC", idProduct=0x1002, idVendor=0x2457)
+        self.assertEqual(dm.orderedCandidateClasses(descriptor), [FirstDriver, SecondDriver])
+
+        dm.probeCache = ProbeCache(path=False)
+        dm.probeCache.update(0x2457, 0x1002, "ABC", driverClass=SecondDriver)
+        self.assertEqual(dm.orderedCandidateClasses(descriptor), [SecondDriver, FirstDriver])
+
+
+class TestSpectrometerCalibrationCache(unittest.TestCase):
+    def testSecondConnectionOnlyVerifiesTheSerialNumber(self):
+        cache = ProbeCache(path=False)
+
+        first = CountingUSB2000()
+        first.probeCache = cache
+        self.assertFalse(first.restoreCachedCalibration())
+        first.getCalibration()
+        first.cacheCalibration()
+
+        second = CountingUSB2000()
+        second.probeCache = cache
+        self.assertTrue(second.restoreCachedCalibration())
+        self.assertEqual(second.parameterReads, 1)
+        self.assertEqual(second.statusReads, 0)
+        self.assertEqual(list(second.wavelength), list(first.wavelength))
+
+    def testSerialNumberIsReadOncePerConnection(self):
+        cache = ProbeCache(path=False)
+        first = CountingUSB2000()
+        first.probeCache = cache
+        first.getCalibration()
+        first.cacheCalibration()
+        self.assertEqual(first.parameterReads, 4 + 1)
+        first.cacheCalibration()
+        self.assertEqual(first.parameterReads, 4 + 1)
+
+        second = CountingUSB2000()
+        second.probeCache = cache
+        self.assertTrue(second.restoreCachedCalibration())
+        second.cacheCalibration()
+        self.assertEqual(second.parameterReads, 1)
+        self.assertEqual(cache.identity(second.idVendor, second.idProduct, "USB2E1234")["serialNumber"],
+                         "USB2E1234")
+
+    def testIdentityMismatchInvalidatesTheEntry(self):
+        cache = ProbeCache(path=False)
+        first = CountingUSB2000()
+        first.probeCache = cache
+        first.getCalibration()
+        first.cacheCalibration()
+
+        impostor = CountingUSB2000()
+        impostor.eepromSerialNumber = "SOMETHINGELSE"
+        impostor.probeCache = cache
+        self.assertFalse(impostor.restoreCachedCalibration())
+        self.assertIsNone(cache.entry(impostor.idVendor, impostor.idProduct, "USB2E1234"))
+
+
+if __name__ == "__main__":
+    unittest.main()
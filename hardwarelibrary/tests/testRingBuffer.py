@@ -0,0 +1,92 @@
+import env
+import unittest
+import time
+from threading import Thread
+
+import numpy as np
+
+from hardwarelibrary.ringbuffer import RingBuffer, OverflowPolicy
+
+
+class TestRingBuffer(unittest.TestCase):
+    def testFramesComeOutInOrderWithTimestamps(self):
+        ring = RingBuffer(shape=4, dtype=np.uint16)
+        ring.write(np.full(4, 1), timestamp=10.0)
+        ring.write(np.full(4, 2), timestamp=11.0)
+
+        frame = ring.get(timeout=0)
+        self.assertEqual((frame.index, frame.timestamp), (0, 10.0))
+        self.assertTrue(np.array_equal(frame.data, [1, 1, 1, 1]))
+        frame = ring.get(timeout=0)
+        self.assertEqual(frame.index, 1)
+        self.assertIsNone(ring.get(timeout=0.01))
+
+    def testSlotsArePreallocatedAndReused(self):
+        ring = RingBuffer(shape=(2, 3), dtype=np.float64, capacity=3)
+        seen = set()
+        for i in range(10):
+            ring.write(np.full((2, 3), i))
+            frame = ring.get(timeout=0)
+            self.assertTrue(np.shares_memory(frame.data, ring.slots))
+            seen.add(frame.data.__array_interface__['data'][0])
+        self.assertLessEqual(len(seen), 3)
+
+    def testDropOldestKeepsTheNewestFrames(self):
+        ring = RingBuffer(shape=1, dtype=np.int32, capacity=3)
+        for i in range(10):
+            ring.write([i])
+        self.assertEqual(ring.statistics().dropped, 7)
+        self.assertEqual([frame.data[0] for frame in (ring.get(0), ring.get(0), ring.get(0))], [7, 8, 9])
+
+    def testHeldFrameIsNeverOverwritten(self):
+        ring = RingBuffer(shape=1, dtype=np.int32, capacity=3)
+        ring.write([-1])
+        held = ring.get(timeout=0)
+        for i in range(10):
+            ring.write([i])
+        self.assertEqual(held.data[0], -1)
+
+    def testLatestSkipsOlderFrames(self):
+        ring = RingBuffer(shape=1, dtype=np.int32, capacity=4)
+        for i in range(3):
+            ring.write([i])
+        frame = ring.latest(timeout=0)
+        self.assertEqual(frame.index, 2)
+        self.assertEqual(ring.statistics().dropped, 2)
+        self.assertEqual(ring.statistics().queued, 0)
+
+    def testBlockPolicyWaitsForConsumer(self):
+        ring = RingBuffer(shape=1, dtype=np.int32, capacity=2, policy=OverflowPolicy.block)
+        ring.write([0])
+        ring.write([1])
+        self.assertIsNone(ring.write([2], timeout=0.01))
+
+        ring.get(timeout=0)
+        ring.release()
+        self.assertIsNotNone(ring.write([2], timeout=0.01))
+        self.assertEqual(ring.statistics().dropped, 0)
+
+    def testCloseEndsIteration(self):
+        ring = RingBuffer(shape=1, dtype=np.int32)
+        received = []
+
+        def consume():
+            for frame in ring:
+                received.append(int(frame.data[0]))
+
+        consumer = Thread(target=consume)
+        consumer.start()
+        for i in range(3):
+            while ring.statistics().queued > 0:
+                time.sleep(0.001)
+            ring.write([i])
+        while ring.statistics().queued > 0:
+            time.sleep(0.001)
+        ring.close()
+        consumer.join(timeout=2)
+        self.assertFalse(consumer.is_alive())
+        self.assertEqual(received, [0, 1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
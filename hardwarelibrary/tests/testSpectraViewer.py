@@ -0,0 +1,134 @@
+import env
+import unittest
+import time
+import threading
+
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from hardwarelibrary.spectrometers.viewer import SpectraViewer
+
+
+class IntegratingSpectrometer:
+    """A spectrometer whose getSpectrum() takes the integration time."""
+    model = "Integrating"
+
+    def __init__(self, integrationTime=10, value=1000):
+        self.wavelength = np.linspace(400, 800, 512)
+        self.integrationTime = integrationTime
+        self.value = value
+        self.spectra = 0
+
+    def getSerialNumber(self):
+        return "INT-0001"
+
+    def getIntegrationTime(self):
+        return self.integrationTime
+
+    def setIntegrationTime(self, value):
+        self.integrationTime = value
+        self.settingThread = threading.current_thread()
+
+    def getSpectrum(self):
+        time.sleep(self.integrationTime/1000)
+        self.spectra += 1
+        return np.full(len(self.wavelength), self.value*self.integrationTime/10, dtype=np.uint16)
+
+
+class CountingAxes:
+    """Counts the calls to axes.relim()."""
+    def __init__(self, axes):
+        self.relims = 0
+        relim = axes.relim
+
+        def countingRelim(*args, **kwargs):
+            self.relims += 1
+            return relim(*args, **kwargs)
+        axes.relim = countingRelim
+
+
+class TestSpectraViewer(unittest.TestCase):
+    def setUp(self):
+        self.spectrometer = IntegratingSpectrometer()
+        self.viewer = SpectraViewer(self.spectrometer, maxRedrawRate=10)
+        self.viewer.setupDisplay()
+        self.axes = CountingAxes(self.viewer.axes)
+
+    def tearDown(self):
+        self.viewer.stopAcquisition()
+        plt.close("all")
+
+    def redrawUntilNewSpectrum(self, timeout=2.0):
+        timestamp = self.viewer.lastTimestamp
+        deadline = time.monotonic() + timeout
+        while self.viewer.lastTimestamp == timestamp and time.monotonic() < deadline:
+            self.viewer.redraw()
+            time.sleep(0.005)
+        self.assertNotEqual(self.viewer.lastTimestamp, timestamp)
+
+    def testRedrawNeverWaitsForTheSpectrometer(self):
+        self.spectrometer.setIntegrationTime(300)
+        self.redrawUntilNewSpectrum()
+        startTime = time.perf_counter()
+        self.viewer.redraw()
+        self.assertLess(time.perf_counter() - startTime, 0.05)
+
+    def testLineIsBlittedWithoutRescaling(self):
+        self.redrawUntilNewSpectrum()
+        self.assertEqual(self.axes.relims, 1)   # first spectrum
+        self.viewer.figure.canvas.draw()
+        self.assertIsNotNone(self.viewer.background)
+
+        for i in range(3):
+            self.redrawUntilNewSpectrum()
+        self.assertEqual(self.axes.relims, 1)
+        self.assertTrue(np.all(self.viewer.line.get_ydata() == 1000))
+
+    def testAutoscaleOnDemand(self):
+        self.redrawUntilNewSpectrum()
+        self.viewer.clickAutoscale(None)
+        self.assertEqual(self.axes.relims, 2)
+
+    def testRescaleAfterNewIntegrationTime(self):
+        self.redrawUntilNewSpectrum()
+        self.viewer.integrationTimeBox.set_val("20")
+        self.viewer.submitTime(None)
+        self.assertEqual(self.axes.relims, 1)
+        time.sleep(0.1)
+        self.redrawUntilNewSpectrum()
+        # Set by the reader thread, not by the GUI thread
+        self.assertEqual(self.spectrometer.getIntegrationTime(), 20)
+        self.assertIsNot(self.spectrometer.settingThread, threading.main_thread())
+        self.assertEqual(self.axes.relims, 2)
+        self.assertGreater(self.viewer.axes.get_ylim()[1], 1500)
+
+    def testDarkReferenceIsTakenFromTheAcquisition(self):
+        self.redrawUntilNewSpectrum()
+        self.viewer.clickDarkReference(None)
+        self.assertIsNone(self.viewer.darkReference)
+        time.sleep(0.05)
+        self.redrawUntilNewSpectrum()
+        self.assertTrue(np.all(self.viewer.darkReference == 1000))
+        self.redrawUntilNewSpectrum()
+        self.assertTrue(np.all(self.viewer.lastSpectrum == 0))
+
+    def testAcquisitionIsNotThrottledByTheDisplay(self):
+        self.spectrometer.setIntegrationTime(2)
+        startTime = time.monotonic()
+        while time.monotonic() - startTime < 0.5:
+            self.viewer.redraw()
+            time.sleep(1/self.viewer.maxRedrawRate)
+        statistics = self.viewer.acquisition.statistics()
+        self.assertGreater(statistics.acquired, 50)
+        self.assertLessEqual(statistics.consumed, 6)
+
+    def testQuitStopsAcquisition(self):
+        self.viewer.clickQuit(None)
+        self.viewer.redraw()
+        self.assertIsNone(self.viewer.acquisition)
+
+
+if __name__ == '__main__':
+    unittest.main()
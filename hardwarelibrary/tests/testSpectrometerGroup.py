@@ -0,0 +1,130 @@
+import env
+import unittest
+import time
+
+import numpy as np
+
+from hardwarelibrary.spectrometers.oceaninsight import USB2000, USB4000
+from hardwarelibrary.spectrometers.simulator import simulatedSpectrometer
+from hardwarelibrary.spectrometers.group import SpectrometerGroup, GroupSpectra
+
+
+class ConstantSpectrometer:
+    """getSpectrum() only, returning a constant spectrum after a delay."""
+    def __init__(self, wavelength, value, delay=0.0, error=None):
+        self.wavelength = np.asarray(wavelength, dtype=np.float64)
+        self.value = value
+        self.delay = delay
+        self.error = error
+
+    def getSpectrum(self):
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return np.full(len(self.wavelength), self.value, dtype=np.float64)
+
+
+class TestSimulatedGroup(unittest.TestCase):
+    def setUp(self):
+        self.spectrometers = [
+            simulatedSpectrometer(USB2000, serialNumber="UV", coefficients=(180.0, 0.15, 0.0, 0.0), seed=1),
+            simulatedSpectrometer(USB2000, serialNumber="VIS", coefficients=(400.0, 0.2, 0.0, 0.0), seed=2),
+            simulatedSpectrometer(USB4000, serialNumber="NIR", coefficients=(700.0, 0.25, 0.0, 0.0), seed=3)]
+        for spectrometer in self.spectrometers:
+            spectrometer.initializeDevice()
+            spectrometer.setIntegrationTime(40)
+        self.group = SpectrometerGroup(self.spectrometers)
+
+    def tearDown(self):
+        self.group.stop()
+        for spectrometer in self.spectrometers:
+            spectrometer.shutdownDevice()
+
+    def testAcquireReturnsAlignedSpectra(self):
+        spectra = self.group.acquire()
+        self.assertIsInstance(spectra, GroupSpectra)
+        self.assertEqual(len(spectra.spectra), 3)
+        for spectrometer, spectrum in zip(self.spectrometers, spectra.spectra):
+            self.assertEqual(len(spectrum), len(spectrometer.wavelength))
+        self.assertLess(spectra.requestSkew, 0.02)
+        self.assertLess(spectra.skew, 0.03)
+        self.assertEqual(self.group.acquire().index, 1)
+
+    def testCycleTimeIsThatOfTheSlowestSpectrometer(self):
+        self.group.acquire()
+        startTime = time.monotonic()
+        for i in range(5):
+            self.group.acquire()
+        concurrent = (time.monotonic() - startTime)/5
+
+        startTime = time.monotonic()
+        for i in range(5):
+            for spectrometer in self.spectrometers:
+                spectrometer.getSpectrum()
+        sequential = (time.monotonic() - startTime)/5
+
+        self.assertLess(concurrent, 0.75*sequential)
+        statistics = self.group.statistics()
+        self.assertEqual(statistics.acquisitions, 6)
+        self.assertGreater(statistics.meanCycleTime, 0.035)
+        self.assertLessEqual(statistics.meanSkew, statistics.maxSkew)
+
+    def testStitchCoversAllSpectrometers(self):
+        grid, stitched = self.group.stitch(self.group.acquire())
+        self.assertAlmostEqual(grid[0], 180.0)
+        self.assertGreaterEqual(grid[-1], self.spectrometers[2].wavelength[-1] - 0.15)
+        self.assertAlmostEqual(grid[1] - grid[0], 0.15)
+        self.assertEqual(len(stitched), len(grid))
+        self.assertFalse(np.isnan(stitched).any())
+
+
+class TestGroupWithoutRequestProtocol(unittest.TestCase):
+    def testFallsBackOnGetSpectrum(self):
+        group = SpectrometerGroup([ConstantSpectrometer(np.arange(10), 1, delay=0.05),
+                                   ConstantSpectrometer(np.arange(10), 2, delay=0.05)])
+        try:
+            startTime = time.monotonic()
+            spectra = group.acquire()
+            self.assertLess(time.monotonic() - startTime, 0.09)
+            self.assertEqual(spectra.spectra[0][0], 1)
+            self.assertEqual(spectra.spectra[1][0], 2)
+        finally:
+            group.stop()
+
+    def testErrorIsRaisedAndGroupKeepsWorking(self):
+        failing = ConstantSpectrometer(np.arange(10), 2, error=ValueError("disconnected"))
+        group = SpectrometerGroup([ConstantSpectrometer(np.arange(10), 1), failing])
+        try:
+            with self.assertRaises(ValueError):
+                group.acquire()
+            failing.error = None
+            self.assertEqual(group.acquire().spectra[1][0], 2)
+        finally:
+            group.stop()
+
+    def testStitchAveragesOverlapsAndLeavesGapsNaN(self):
+        group = SpectrometerGroup([ConstantSpectrometer(np.arange(0, 10), 1),
+                                   ConstantSpectrometer(np.arange(5, 15), 3),
+                                   ConstantSpectrometer(np.arange(20, 25), 5)])
+        try:
+            grid, stitched = group.stitch(group.acquire())
+            self.assertTrue(np.array_equal(grid, np.arange(0, 25)))
+            self.assertTrue(np.all(stitched[0:5] == 1))
+            self.assertTrue(np.all(stitched[5:10] == 2))
+            self.assertTrue(np.all(stitched[10:15] == 3))
+            self.assertTrue(np.isnan(stitched[15:20]).all())
+            self.assertTrue(np.all(stitched[20:25] == 5))
+        finally:
+            group.stop()
+
+    def testStopEndsThreads(self):
+        group = SpectrometerGroup([ConstantSpectrometer(np.arange(10), 1)])
+        group.acquire()
+        threads = list(group.threads)
+        group.stop()
+        self.assertFalse(group.isRunning)
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import env
+import unittest
+import time
+
+import numpy as np
+import usb.core
+
+from hardwarelibrary.spectrometers.oceaninsight import USB2000, USB4000, USB2000Plus, DebugSpectro
+from hardwarelibrary.spectrometers.simulator import (simulatedSpectrometer, SyntheticSpectrum,
+                                                     SimulatedUSB4000Device)
+from hardwarelibrary.spectrometers.acquisition import SpectrumAcquisition
+
+
+class TestSimulatedSpectrometers(unittest.TestCase):
+    def assertRunsEndToEnd(self, spectrometerClass, pixels):
+        spectrometer = simulatedSpectrometer(spectrometerClass, serialNumber="SIM42", seed=1)
+        spectrometer.initializeDevice()
+        try:
+            self.assertEqual(spectrometer.getSerialNumber(), "SIM42")
+            self.assertAlmostEqual(spectrometer.a1, 0.3767)
+            self.assertEqual(len(spectrometer.wavelength), pixels)
+
+            spectrometer.setIntegrationTime(20)
+            self.assertEqual(spectrometer.getIntegrationTime(), 20)
+            spectrum = spectrometer.getSpectrum()
+            self.assertEqual(spectrum.dtype, np.uint16)
+            self.assertEqual(len(spectrum), pixels)
+            self.assertGreaterEqual(spectrum.min(), 100)
+        finally:
+            spectrometer.shutdownDevice()
+        return spectrometer
+
+    def testUSB2000(self):
+        self.assertRunsEndToEnd(USB2000, 2048)
+
+    def testUSB4000(self):
+        self.assertRunsEndToEnd(USB4000, 3840 - 5 - 173)
+
+    def testUSB2000Plus(self):
+        self.assertRunsEndToEnd(USB2000Plus, 3840 - 5 - 173)
+
+    def testSpectrumFollowsEmittersAndIntegrationTime(self):
+        emitter = SyntheticSpectrum([(600.0, 5.0, 20.0)], background=(100, 100), seed=2)
+        spectrometer = simulatedSpectrometer(USB2000, spectrum=emitter)
+        spectrometer.initializeDevice()
+        peak = np.argmin(np.abs(spectrometer.wavelength - 600))
+
+        spectrometer.setIntegrationTime(10)
+        short = spectrometer.getSpectrum()
+        spectrometer.setIntegrationTime(100)
+        long = spectrometer.getSpectrum()
+        spectrometer.shutdownDevice()
+
+        self.assertAlmostEqual(short[peak], 100 + 200, delta=60)
+        self.assertAlmostEqual(long[peak], 100 + 2000, delta=200)
+        self.assertAlmostEqual(np.median(long), 100, delta=2)
+
+    def testSpectrumIsOnlySentAfterIntegration(self):
+        spectrometer = simulatedSpectrometer(USB4000)
+        spectrometer.initializeDevice()
+        spectrometer.setIntegrationTime(200)
+        spectrometer.getStatus()
+        spectrometer.requestSpectrum()
+        self.assertFalse(spectrometer.isSpectrumReady())
+        with self.assertRaises(usb.core.USBTimeoutError):
+            spectrometer.inputEndpoints[1].read(512, timeout=10)
+        spectrometer.shutdownDevice()
+
+    def testWaitingDoesNotPollDuringIntegration(self):
+        spectrometer = simulatedSpectrometer(USB4000)
+        spectrometer.initializeDevice()
+        spectrometer.setIntegrationTime(100)
+        spectrometer.getSpectrum()
+        spectrometer.getSpectrum()
+        self.assertLessEqual(spectrometer.statusTransactionsPerSpectrum, 4)
+        spectrometer.shutdownDevice()
+
+    def testBenchmarkStreamingAcquisition(self):
+        spectrometer = simulatedSpectrometer(USB4000, readoutTime=0.001)
+        spectrometer.initializeDevice()
+        spectrometer.setIntegrationTime(5)
+        acquisition = SpectrumAcquisition(spectrometer)
+        acquisition.start()
+        time.sleep(0.5)
+        acquisition.stop()
+        spectrometer.shutdownDevice()
+
+        rate = acquisition.statistics().rate
+        self.assertGreater(rate, 0.5/0.006)
+        print("\nSimulated USB4000 streaming: {0:.0f} spectra/s at 5 ms integration".format(rate))
+
+
+class TestDebugSpectro(unittest.TestCase):
+    def testVectorizedSpectrum(self):
+        spectrometer = DebugSpectro()
+        startTime = time.perf_counter()
+        for i in range(100):
+            spectrum = spectrometer.getSpectrum()
+        duration = (time.perf_counter() - startTime)/100
+
+        self.assertEqual(spectrum.shape, (1024,))
+        self.assertLessEqual(spectrum.max(), 32767)
+        self.assertGreaterEqual(spectrum.min(), 0)
+        self.assertLess(duration, 0.005)
+
+    def testEmittersCanBeChanged(self):
+        spectrometer = DebugSpectro()
+        spectrometer.emitters = [DebugSpectro.Emitter(700, 5, 100)]
+        spectrometer.background = (0, 0)
+        spectrum = spectrometer.getSpectrum()
+        self.assertEqual(spectrometer.wavelength[np.argmax(spectrum)].round(-1), 700)
+
+
+if __name__ == "__main__":
+    unittest.main()
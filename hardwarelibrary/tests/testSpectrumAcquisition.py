@@ -0,0 +1,231 @@
+import env
+import unittest
+import time
+
+import numpy as np
+import usb.core
+
+from hardwarelibrary.ringbuffer import OverflowPolicy
+from hardwarelibrary.spectrometers.acquisition import SpectrumAcquisition
+
+
+class IntegratingSpectrometer:
+    """Request/ready/read protocol of an OISpectrometer, with a spectrum ready
+    integrationTime after each request."""
+
+    def __init__(self, integrationTime=0.005, failures=0):
+        self.integrationTime = integrationTime
+        self.failures = failures
+        self.requestTime = None
+        self.requests = 0
+        self.reads = 0
+        self.copies = 0
+        self.settings = []
+        self.spectrum = np.zeros(1024, dtype=np.uint16)
+
+    def setIntegrationTime(self, integrationTime):
+        # Records whether a spectrum was being integrated when it changed
+        self.settings.append((integrationTime, self.requestTime is not None))
+        self.integrationTime = integrationTime
+
+    def requestSpectrum(self):
+        self.requests += 1
+        self.requestTime = time.monotonic()
+
+    def isSpectrumReady(self):
+        if self.failures > 0:
+            self.failures -= 1
+            raise usb.core.USBTimeoutError("timeout")
+        return self.requestTime is not None and time.monotonic() - self.requestTime >= self.integrationTime
+
+    def getSpectrumData(self, copy=True):
+        self.requestTime = None
+        self.reads += 1
+        self.spectrum[:] = self.reads   # reused, like USB4000_2000Plus
+        if copy:
+            self.copies += 1
+            return self.spectrum.copy()
+        return self.spectrum
+
+
+class DesynchronizedSpectrometer(IntegratingSpectrometer):
+    """Fails like a USB4000 out of sync on the readouts after the first."""
+
+    def __init__(self, badReadouts):
+        super().__init__()
+        self.badReadouts = badReadouts
+
+    def getSpectrumData(self, copy=True):
+        spectrum = super().getSpectrumData(copy)
+        if self.reads > 1 and self.badReadouts > 0:
+            self.badReadouts -= 1
+            raise RuntimeError("Spectrometer is desynchronized. Should disconnect")
+        return spectrum
+
+
+class FailingRecorder:
+    def __init__(self, failures):
+        self.failures = failures
+        self.appended = 0
+
+    def append(self, array, timestamp=None):
+        if self.failures > 0:
+            self.failures -= 1
+            raise OSError("No space left on device")
+        self.appended += 1
+        return True
+
+
+class SimpleSpectrometer:
+    def getSpectrum(self):
+        time.sleep(0.001)
+        return np.arange(16, dtype=np.float64)
+
+
+class TestSpectrumAcquisition(unittest.TestCase):
+    def testSpectraAreStreamedInOrder(self):
+        spectrometer = IntegratingSpectrometer()
+        acquisition = SpectrumAcquisition(spectrometer, policy=OverflowPolicy.block)
+        acquisition.start()
+        try:
+            values, timestamps = [], []
+            for i in range(5):
+                frame = acquisition.get(timeout=1)    # data is valid until the next get()
+                values.append(int(frame.data[0]))
+                timestamps.append(frame.timestamp)
+        finally:
+            acquisition.stop()
+
+        self.assertEqual(values, [1, 2, 3, 4, 5])
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertEqual(spectrometer.copies, 0)
+        self.assertEqual(acquisition.statistics().dropped, 0)
+
+    def testThroughputApproachesIntegrationRate(self):
+        spectrometer = IntegratingSpectrometer(integrationTime=0.01)
+        acquisition = SpectrumAcquisition(spectrometer)
+        acquisition.start()
+        time.sleep(0.5)
+        acquisition.stop()
+
+        statistics = acquisition.statistics()
+        self.assertGreater(statistics.rate, 0.6/spectrometer.integrationTime)
+        print("\nAcquisition: {0:.0f} spectra/s for {1:.0f} ms integration".format(
+              statistics.rate, spectrometer.integrationTime*1000))
+
+    def testSlowConsumerDropsOldest(self):
+        acquisition = SpectrumAcquisition(IntegratingSpectrometer(integrationTime=0.002))
+        acquisition.start()
+        time.sleep(0.1)
+        frame = acquisition.get(timeout=1)
+        acquisition.stop()
+
+        statistics = acquisition.statistics()
+        self.assertGreater(statistics.dropped, 0)
+        self.assertGreater(frame.index, 0)
+
+    def testLatestReturnsMostRecent(self):
+        acquisition = SpectrumAcquisition(IntegratingSpectrometer(integrationTime=0.002), capacity=4)
+        acquisition.start()
+        time.sleep(0.05)
+        frame = acquisition.latest(timeout=1)
+        acquisition.stop()
+        self.assertGreaterEqual(frame.index, acquisition.statistics().acquired - 3)
+
+    def testPendingRequestIsReadOutOnStop(self):
+        spectrometer = IntegratingSpectrometer()
+        acquisition = SpectrumAcquisition(spectrometer)
+        acquisition.start()
+        acquisition.get(timeout=1)
+        acquisition.stop()
+        self.assertEqual(spectrometer.requests, spectrometer.reads)
+
+    def testIntegrationTimeIsSetBetweenReadouts(self):
+        spectrometer = IntegratingSpectrometer(integrationTime=0.02)
+        acquisition = SpectrumAcquisition(spectrometer)
+        acquisition.start()
+        try:
+            acquisition.get(timeout=1)
+            acquisition.setIntegrationTime(0.005)
+            deadline = time.monotonic() + 1
+            while not spectrometer.settings and time.monotonic() < deadline:
+                time.sleep(0.005)
+        finally:
+            acquisition.stop()
+
+        self.assertEqual(spectrometer.settings, [(0.005, False)])
+
+    def testIntegrationTimeIsSetDirectlyWhenStopped(self):
+        spectrometer = IntegratingSpectrometer()
+        acquisition = SpectrumAcquisition(spectrometer)
+        acquisition.setIntegrationTime(0.01)
+        self.assertEqual(spectrometer.settings, [(0.01, False)])
+
+    def testTransientErrorsAreRetried(self):
+        spectrometer = IntegratingSpectrometer(failures=0)
+        acquisition = SpectrumAcquisition(spectrometer, policy=OverflowPolicy.block)
+        acquisition.start()
+        spectrometer.failures = 2
+        frames = [acquisition.get(timeout=1) for i in range(3)]
+        acquisition.stop()
+        self.assertNotIn(None, frames)
+        self.assertEqual(acquisition.statistics().errors, 2)
+
+    def testAnyReadoutErrorIsCountedAndRetried(self):
+        spectrometer = DesynchronizedSpectrometer(badReadouts=3)
+        acquisition = SpectrumAcquisition(spectrometer, policy=OverflowPolicy.block)
+        acquisition.start()
+        try:
+            for i in range(3):
+                self.assertIsNotNone(acquisition.get(timeout=1))
+        finally:
+            acquisition.stop()
+
+        self.assertEqual(acquisition.statistics().errors, 3)
+        self.assertIsInstance(acquisition.lastError, RuntimeError)
+        self.assertIsNone(acquisition.failure)
+
+    def testFailedStoreGivesItsSlotBack(self):
+        recorder = FailingRecorder(failures=0)
+        acquisition = SpectrumAcquisition(IntegratingSpectrometer(), policy=OverflowPolicy.block,
+                                          recorder=recorder)
+        acquisition.start()
+        recorder.failures = 5   # more than the slots
+        try:
+            for i in range(6):
+                self.assertIsNotNone(acquisition.get(timeout=1))
+        finally:
+            acquisition.stop()
+
+        self.assertGreaterEqual(acquisition.statistics().errors, 5)
+        self.assertIsInstance(acquisition.lastError, OSError)
+        self.assertIsNone(acquisition.failure)
+
+    def testReaderStopsAfterTooManyErrors(self):
+        spectrometer = DesynchronizedSpectrometer(badReadouts=100)
+        acquisition = SpectrumAcquisition(spectrometer, maxConsecutiveErrors=3)
+        acquisition.start()
+        self.assertIsNotNone(acquisition.get(timeout=1))
+        self.assertIsNone(acquisition.get(timeout=1))
+        self.assertFalse(acquisition.isRunning)
+        self.assertEqual(acquisition.statistics().errors, 3)
+        self.assertIsInstance(acquisition.failure, RuntimeError)
+        acquisition.stop()
+
+    def testSpectrometersWithoutRequestProtocol(self):
+        acquisition = SpectrumAcquisition(SimpleSpectrometer())
+        acquisition.start()
+        frame = acquisition.get(timeout=1)
+        acquisition.stop()
+        self.assertEqual(frame.data.dtype, np.float64)
+        self.assertEqual(len(frame.data), 16)
+
+    def testFramesEndAfterStop(self):
+        acquisition = SpectrumAcquisition(IntegratingSpectrometer(), policy=OverflowPolicy.block)
+        acquisition.start()
+        acquisition.stop()
+        self.assertLessEqual(len(list(acquisition.frames())), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
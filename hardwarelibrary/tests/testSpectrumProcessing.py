@@ -0,0 +1,144 @@
+import env
+import unittest
+
+import numpy as np
+
+from hardwarelibrary.spectrometers.base import Spectrometer
+from hardwarelibrary.spectrometers.oceaninsight import USB2000
+from hardwarelibrary.spectrometers.acquisition import SpectrumAcquisition
+from hardwarelibrary.spectrometers.processing import (SpectrumPipeline, DarkSubtraction,
+    NonlinearityCorrection, WhiteNormalization, ScanAverage, Boxcar, SavitzkyGolay)
+
+
+class SequenceSpectrometer(Spectrometer):
+    """Returns spectra 1, 2, 3... (every pixel equal to the spectrum number)."""
+    classIdVendor = 0xFFFF
+    classIdProduct = 0xFFF0
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def getSerialNumber(self):
+        return "sequence"
+
+    def getSpectrum(self):
+        self.count += 1
+        return np.full(32, self.count, dtype=np.uint16)
+
+    def doInitializeDevice(self):
+        pass
+
+    def doShutdownDevice(self):
+        pass
+
+
+class ParameterUSB2000(USB2000):
+    """USB2000 answering getParameter() from a table, counting the reads."""
+
+    def __init__(self, parameters):
+        super().__init__()
+        self.parameters = parameters
+        self.parameterReads = 0
+
+    def getParameter(self, index):
+        self.parameterReads += 1
+        return self.parameters.get(index, "")
+
+
+class TestProcessingStages(unittest.TestCase):
+    def setUp(self):
+        self.raw = np.random.default_rng(3).integers(100, 4000, 256).astype(np.uint16)
+        self.dark = np.full(256, 90.0)
+        self.white = np.linspace(1000, 5000, 256)
+
+    def testDarkAndWhiteCorrection(self):
+        pipeline = SpectrumPipeline([DarkSubtraction(self.dark), WhiteNormalization(self.white, self.dark)])
+        expected = (self.raw - self.dark) / (self.white - self.dark)
+        self.assertTrue(np.allclose(pipeline.process(self.raw), expected))
+
+    def testZeroWhiteReferenceGivesNaN(self):
+        white = self.white.copy()
+        white[10] = 0
+        processed = SpectrumPipeline([WhiteNormalization(white)]).process(self.raw)
+        self.assertTrue(np.isnan(processed[10]))
+        self.assertEqual(np.count_nonzero(np.isnan(processed)), 1)
+
+    def testDisabledStagesAreSkipped(self):
+        pipeline = SpectrumPipeline([DarkSubtraction(), WhiteNormalization(), ScanAverage(1), Boxcar(0)])
+        self.assertTrue(np.array_equal(pipeline.process(self.raw), self.raw))
+
+    def testNonlinearityPolynomial(self):
+        coefficients = [0.9, 1e-5, -2e-9]
+        counts = self.raw.astype(np.float64)
+        expected = counts / (0.9 + 1e-5*counts - 2e-9*counts**2)
+        processed = SpectrumPipeline([NonlinearityCorrection(coefficients)]).process(self.raw)
+        self.assertTrue(np.allclose(processed, expected))
+
+    def testScanAverageOfConsecutiveScans(self):
+        pipeline = SpectrumPipeline([ScanAverage(scans=3)])
+        outputs = [pipeline.process(np.full(4, value))[0] for value in (3, 6, 9, 12)]
+        self.assertEqual(outputs, [3, 4.5, 6, 9])
+
+    def testBoxcar(self):
+        spectrum = np.array([0, 0, 3, 0, 0, 6], dtype=np.float64)
+        processed = SpectrumPipeline([Boxcar(halfWidth=1)]).process(spectrum)
+        self.assertTrue(np.allclose(processed, [0, 1, 1, 1, 2, 3]))
+
+    def testSavitzkyGolayPreservesPolynomials(self):
+        x = np.linspace(-1, 1, 101)
+        cubic = 2 - x + 3*x**2 - 5*x**3
+        processed = SpectrumPipeline([SavitzkyGolay(windowLength=9, polyOrder=3)]).process(cubic)
+        self.assertTrue(np.allclose(processed, cubic))
+
+    def testSavitzkyGolaySmoothsNoise(self):
+        x = np.linspace(0, 1, 500)
+        signal = np.sin(2*np.pi*x)
+        noisy = signal + np.random.default_rng(4).normal(0, 0.1, len(x))
+        processed = SpectrumPipeline([SavitzkyGolay(windowLength=21, polyOrder=2)]).process(noisy)
+        self.assertLess(np.std(processed - signal), 0.5*np.std(noisy - signal))
+
+    def testBuffersAreReused(self):
+        pipeline = SpectrumPipeline([DarkSubtraction(self.dark), Boxcar(2), SavitzkyGolay(7, 2)])
+        first = pipeline.process(self.raw)
+        second = pipeline.process(self.raw)
+        self.assertIs(first, second)
+
+        out = np.empty(256)
+        self.assertIs(pipeline.process(self.raw, out=out), out)
+
+
+class TestSpectrometerProcessing(unittest.TestCase):
+    def testProcessedSpectrumAveragesNewScans(self):
+        spectrometer = SequenceSpectrometer()
+        spectrometer.processing.add(ScanAverage(scans=4))
+        self.assertEqual(spectrometer.getProcessedSpectrum()[0], 2.5)
+        self.assertEqual(spectrometer.getProcessedSpectrum()[0], 6.5)
+
+    def testNonlinearityCoefficientsAreReadOnce(self):
+        parameters = {5: "0.01", 6: "0.95", 7: "1.2e-05", 8: "-3.0e-09", 14: "2"}
+        spectrometer = ParameterUSB2000(parameters)
+        self.assertEqual(spectrometer.getNonlinearityCoefficients(), [0.95, 1.2e-05, -3.0e-09])
+        reads = spectrometer.parameterReads
+        stage = NonlinearityCorrection.fromSpectrometer(spectrometer)
+        self.assertEqual(spectrometer.parameterReads, reads)
+        self.assertTrue(stage.isEnabled)
+        self.assertEqual(spectrometer.strayLight, 0.01)
+
+    def testMissingNonlinearityCalibration(self):
+        spectrometer = ParameterUSB2000({})
+        self.assertEqual(spectrometer.getNonlinearityCoefficients(), [])
+        self.assertFalse(NonlinearityCorrection.fromSpectrometer(spectrometer).isEnabled)
+
+    def testStreamingAcquisitionWithPipeline(self):
+        spectrometer = SequenceSpectrometer()
+        acquisition = SpectrumAcquisition(spectrometer, pipeline=SpectrumPipeline([DarkSubtraction(np.ones(32))]))
+        acquisition.start()
+        frame = acquisition.get(timeout=1)
+        acquisition.stop()
+        self.assertEqual(frame.data.dtype, np.float64)
+        self.assertEqual(frame.data[0], frame.index)   # spectrum index+1, minus the dark
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import env
+import unittest
+import time
+
+from hardwarelibrary.statuscache import StatusCache
+from hardwarelibrary.sources.millennia import DebugMillenniaDevice
+from hardwarelibrary.sources.verdig import DebugVerdiGDevice
+
+
+class CountingMillennia(DebugMillenniaDevice):
+    def __init__(self):
+        super().__init__()
+        self.powerReads = 0
+
+    def doGetPower(self):
+        self.powerReads += 1
+        return super().doGetPower()
+
+
+class TestStatusCache(unittest.TestCase):
+    def testTTLAndMaxAge(self):
+        cache = StatusCache(ttls={"power": 0.2})
+        cache.store("power", 1.0)
+        cache.store("isLaserOn", True)
+        self.assertEqual(cache.lookup("power"), 1.0)
+        self.assertIs(cache.lookup("isLaserOn"), StatusCache.missing)
+        self.assertEqual(cache.lookup("isLaserOn", maxAge=1), True)
+        time.sleep(0.25)
+        self.assertIs(cache.lookup("power"), StatusCache.missing)
+
+    def testReadingStartedBeforeAnInvalidationIsDropped(self):
+        cache = StatusCache(defaultTTL=10)
+
+        def slowGetter():
+            cache.invalidate("power")  # a setter runs meanwhile
+            return 1.0
+
+        self.assertEqual(cache.read("power", slowGetter), 1.0)
+        self.assertIsNone(cache.age("power"))
+
+
+class TestCachedCapabilityGetters(unittest.TestCase):
+    def setUp(self):
+        self.device = CountingMillennia()
+        self.device.initializeDevice()
+
+    def tearDown(self):
+        self.device.shutdownDevice()
+
+    def testGettersReadTheDeviceByDefault(self):
+        self.device.power()
+        self.device.power()
+        self.assertEqual(self.device.powerReads, 2)
+
+    def testPollServesGettersWithinMaxAge(self):
+        self.device.getStatusUserInfo()
+        readsAfterPoll = self.device.powerReads
+        for i in range(10):
+            self.device.power(maxAge=1.0)
+            self.device.isLaserOn(maxAge=1.0)
+        self.assertEqual(self.device.powerReads, readsAfterPoll)
+
+    def testSettersInvalidate(self):
+        self.device.statusCache.defaultTTL = 10
+        self.device.setPower(2.0)
+        self.assertEqual(self.device.power(), 2.0)
+        self.device.setPower(3.0)
+        self.assertEqual(self.device.power(), 3.0)
+
+        self.assertFalse(self.device.isLaserOn())
+        self.device.turnOn()
+        self.assertTrue(self.device.isLaserOn())
+
+    def testRenamedStatusFieldFillsTheGetter(self):
+        verdi = DebugVerdiGDevice()
+        verdi.initializeDevice()
+        try:
+            verdi.getStatusUserInfo()
+            self.assertIsNotNone(verdi.statusCache.age("interlock"))
+        finally:
+            verdi.shutdownDevice()
+
+
+if __name__ == "__main__":
+    unittest.main()